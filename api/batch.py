@@ -0,0 +1,101 @@
+#
+#  Code for translating a batch of DSET JSON files, serially or with a pool of worker processes.
+#
+import heapq
+import multiprocessing
+import os.path
+from functools import partial
+
+import api.inputjson as dset_input
+import api.translate.dset as dset_translate
+import api.output as dset_output
+import api.timing as timing
+import api.util.xml as xml
+
+# Number of chunks handed to each worker process, so workers that finish early can pick up more work.
+CHUNKS_PER_WORKER = 4
+
+
+def translateFile(inputFile, inputDir, outputDir, templatePath, prettyPrint=True, stripTemplate=False):
+    """ Translate one DSET JSON file and write the ISO XML output file as UTF-8.  Return the output file path. """
+    recordStartTime = startTime = timing.startStage()
+    with open(inputFile, 'r') as myfile:
+        inputText = myfile.read()
+    startTime = timing.endStage('read', startTime)
+    jsonData = dset_input.getJSONData(inputText)
+    timing.endStage('decode', startTime)
+
+    root = dset_translate.transformDSETToISOTree(jsonData, templatePath, stripTemplate)
+
+    startTime = timing.startStage()
+    outputFile = dset_output.prepareOutputFile(inputFile, inputDir, outputDir)
+    xml.writeFile(root, outputFile, prettyPrint)
+    timing.endStage('serialize+write', startTime)
+
+    if recordStartTime is not None:
+        timing.endRecord(inputFile, timing.getRecordShape(jsonData, len(inputText)), recordStartTime)
+    return outputFile
+
+
+def getSizeBalancedChunks(filePaths, chunkCount):
+    """ Split a list of file paths into at most chunkCount chunks with roughly equal total file size.
+        Files are placed largest first, each into the chunk with the smallest total so far.
+    """
+    chunkCount = max(1, min(chunkCount, len(filePaths)))
+    chunks = [[] for _ in range(chunkCount)]
+    chunkSizes = [(0, chunkIndex) for chunkIndex in range(chunkCount)]
+
+    filesBySize = sorted(filePaths, key=os.path.getsize, reverse=True)
+    for filePath in filesBySize:
+        chunkSize, chunkIndex = heapq.heappop(chunkSizes)
+        chunks[chunkIndex].append(filePath)
+        heapq.heappush(chunkSizes, (chunkSize + os.path.getsize(filePath), chunkIndex))
+
+    return [chunk for chunk in chunks if chunk]
+
+
+def _initializeWorker(templatePath, stripTemplate):
+    """ Load the ISO template once per worker.  Forked workers find it already parsed by the parent. """
+    dset_translate.compileTemplate(templatePath, stripTemplate)
+
+
+def _translateChunk(inputDir, outputDir, templatePath, prettyPrint, stripTemplate, chunk):
+    """ Translate every file in a chunk.  Return a list of (inputFile, outputFile, errorMessage) tuples, and
+        the chunk's timing snapshot if timing is enabled.
+    """
+    timing.reset()
+    statusList = []
+    for inputFile in chunk:
+        try:
+            outputFile = translateFile(inputFile, inputDir, outputDir, templatePath, prettyPrint, stripTemplate)
+            statusList.append((inputFile, outputFile, None))
+        except Exception as error:
+            statusList.append((inputFile, None, '%s: %s' % (type(error).__name__, error)))
+    return statusList, timing.getSnapshot() if timing.isEnabled() else None
+
+
+def translateFilesInParallel(inputFiles, inputDir, outputDir, templatePath, jobs, statusCallback=None,
+                             prettyPrint=True, stripTemplate=False):
+    """ Translate DSET JSON files using a pool of worker processes that write their own output files.
+        Return a list of (inputFile, outputFile, errorMessage) tuples in the same order as inputFiles.
+        If given, statusCallback is called in the parent process with each status tuple as soon as its chunk finishes.
+        Timings collected by the workers are merged into the parent's timings.
+    """
+    # Parse the template before starting workers, so forked workers share it copy-on-write.
+    dset_translate.compileTemplate(templatePath, stripTemplate)
+
+    chunks = getSizeBalancedChunks(inputFiles, jobs * CHUNKS_PER_WORKER)
+    translateChunk = partial(_translateChunk, inputDir, outputDir, templatePath, prettyPrint, stripTemplate)
+
+    statusByInput = {}
+    context = multiprocessing.get_context('fork')
+    with context.Pool(jobs, initializer=_initializeWorker, initargs=(templatePath, stripTemplate)) as pool:
+        for statusList, timingSnapshot in pool.imap_unordered(translateChunk, chunks):
+            if timingSnapshot:
+                timing.mergeSnapshot(timingSnapshot)
+            for status in statusList:
+                statusByInput[status[0]] = status
+                if statusCallback:
+                    statusCallback(status)
+
+    return [statusByInput[inputFile] for inputFile in inputFiles]
@@ -0,0 +1,225 @@
+#
+#  Code for publishing ISO 19139 records to a CSW 2.0.2 server, such as GeoNetwork, and deleting them again,
+#  with batched Transactions.
+#
+#  Each Transaction request carries many csw:Insert elements, or a csw:Delete whose filter matches many record
+#  identifiers, so that a large collection of records is handled in a few thousand requests rather than one
+#  request per record.  Batches are sent concurrently over the pooled keep-alive connections of one requests Session.
+#
+import os
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, as_completed, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.auth import HTTPBasicAuth
+from lxml import etree as ElementTree
+
+import api.util.xml as xml
+
+CSW_NAMESPACE_MAP = {'csw': 'http://www.opengis.net/cat/csw/2.0.2',
+                     'ogc': 'http://www.opengis.net/ogc',
+                     'ows': 'http://www.opengis.net/ows',
+                     'dc': 'http://purl.org/dc/elements/1.1/',
+                     'gmd': 'http://www.isotc211.org/2005/gmd',
+                     'gco': 'http://www.isotc211.org/2005/gco'}
+
+INSERT_TEMPLATE = './templates_ISO19139/insertCSW.xml'
+DELETE_TEMPLATE = './templates_ISO19139/deleteCSW.xml'
+
+DEFAULT_CSW_URL = 'https://geonetwork.prototype.ucar.edu/geonetwork/srv/eng/csw-publication'
+
+# Number of records packed into one Transaction.
+DEFAULT_BATCH_SIZE = 100
+
+# Seconds to wait for the CSW server to accept a connection, and to answer a Transaction.
+CSW_TIMEOUT = (10, 600)
+
+_fileIdentifierXPath = ElementTree.XPath('gmd:fileIdentifier/gco:CharacterString/text()', namespaces=CSW_NAMESPACE_MAP)
+_insertXPath = ElementTree.XPath('csw:Insert', namespaces=CSW_NAMESPACE_MAP)
+_filterXPath = ElementTree.XPath('csw:Delete/csw:Constraint/ogc:Filter', namespaces=CSW_NAMESPACE_MAP)
+_literalXPath = ElementTree.XPath('ogc:Literal', namespaces=CSW_NAMESPACE_MAP)
+
+
+def getCSWSession(user=None, password=None, poolSize=1):
+    """ Return a requests Session for posting Transactions, keeping poolSize connections open. """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=poolSize)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers['Content-Type'] = 'text/xml'
+    if user:
+        session.auth = HTTPBasicAuth(user, password or '')
+    return session
+
+
+def getISORecordFiles(dirPath):
+    """ Return a sorted list of paths to ISO XML files, found by recursive search in a given directory. """
+    matches = []
+    for root, dirnames, filenames in os.walk(dirPath):
+        for filename in filenames:
+            if filename.endswith('.xml'):
+                matches.append(os.path.join(root, filename))
+    return sorted(matches)
+
+
+def getRecordID(recordRoot):
+    """ Return the fileIdentifier of an ISO record, or None if it has none. """
+    identifiers = _fileIdentifierXPath(recordRoot)
+    return identifiers[0].strip() if identifiers else None
+
+
+def buildInsertTransaction(recordRoots, templateFilePath=INSERT_TEMPLATE):
+    """ Return a CSW Transaction, as UTF-8 bytes, with one csw:Insert element per ISO record root.
+        The Transaction element is taken from the template, whose example record is discarded.
+    """
+    transaction = xml.getTemplateCopy(templateFilePath, stripTemplate=True)
+    for insert in _insertXPath(transaction):
+        transaction.remove(insert)
+
+    for recordRoot in recordRoots:
+        insert = ElementTree.SubElement(transaction, '{%s}Insert' % CSW_NAMESPACE_MAP['csw'])
+        recordID = getRecordID(recordRoot)
+        if recordID:
+            insert.set('handle', recordID)
+        insert.append(recordRoot)
+    return ElementTree.tostring(transaction, encoding='UTF-8', xml_declaration=True)
+
+
+def parseTransactionResponse(responseText):
+    """ Return the totals reported by a CSW TransactionResponse, and the identifiers of inserted records, as a
+        dictionary with keys 'totalInserted', 'totalUpdated', 'totalDeleted' and 'insertedIDs'.
+        Raise OSError if the server answered with an exception report.
+    """
+    if isinstance(responseText, str):
+        responseText = responseText.encode('utf-8')
+    root = ElementTree.fromstring(responseText)
+
+    if root.tag.endswith('ExceptionReport'):
+        messages = root.xpath('.//ows:ExceptionText/text()', namespaces=CSW_NAMESPACE_MAP)
+        raise OSError('CSW exception: ' + ('; '.join(message.strip() for message in messages) or 'no details'))
+    if root.tag != '{%s}TransactionResponse' % CSW_NAMESPACE_MAP['csw']:
+        raise OSError('Unexpected CSW response: ' + root.tag)
+
+    summary = {}
+    for total in ['totalInserted', 'totalUpdated', 'totalDeleted']:
+        values = root.xpath('csw:TransactionSummary/csw:%s/text()' % total, namespaces=CSW_NAMESPACE_MAP)
+        summary[total] = int(values[0]) if values else 0
+    summary['insertedIDs'] = [identifier.strip() for identifier in
+                              root.xpath('csw:InsertResult/csw:BriefRecord/dc:identifier/text()',
+                                         namespaces=CSW_NAMESPACE_MAP)]
+    return summary
+
+
+def postTransaction(session, url, transactionXML):
+    """ Post a CSW Transaction and return its parsed TransactionResponse.  Raise OSError if it failed. """
+    response = session.post(url, data=transactionXML, timeout=CSW_TIMEOUT)
+    if response.status_code != 200:
+        raise OSError('Response ' + str(response.status_code) + ': ' + response.text[:500])
+    return parseTransactionResponse(response.content)
+
+
+def publishRecordBatch(session, url, filePaths, templateFilePath=INSERT_TEMPLATE):
+    """ Insert the ISO records in a list of files with one Transaction, and return the identifiers of the inserted
+        records.  If the server lists no identifiers but reports that every record was inserted, the records'
+        fileIdentifiers are returned.  Raise OSError if the Transaction failed or inserted only some records.
+    """
+    parser = ElementTree.XMLParser(remove_blank_text=True)
+    recordRoots = [ElementTree.parse(filePath, parser).getroot() for filePath in filePaths]
+    summary = postTransaction(session, url, buildInsertTransaction(recordRoots, templateFilePath))
+
+    if summary['insertedIDs']:
+        return summary['insertedIDs']
+    if summary['totalInserted'] != len(recordRoots):
+        raise OSError('CSW server inserted %d of %d records' % (summary['totalInserted'], len(recordRoots)))
+    return [getRecordID(recordRoot) or os.path.basename(filePath) for recordRoot, filePath in
+            zip(recordRoots, filePaths)]
+
+
+def publishRecordFiles(filePaths, url, session=None, batchSize=DEFAULT_BATCH_SIZE, jobs=1,
+                       templateFilePath=INSERT_TEMPLATE):
+    """ Publish ISO record files to a CSW server in batches of batchSize records, with up to `jobs` Transactions
+        in flight at once.  Yield (batchFilePaths, insertedIDs, errorMessage) as each batch finishes, with
+        errorMessage None for successful batches and insertedIDs empty for failed ones.
+    """
+    if session is None:
+        session = getCSWSession(poolSize=jobs)
+    for batch, insertedIDs, errorMessage in runBatches(publishRecordBatch, filePaths, batchSize, jobs,
+                                                       session, url, templateFilePath):
+        yield batch, insertedIDs or [], errorMessage
+
+
+def buildDeleteTransaction(recordIDs, templateFilePath=DELETE_TEMPLATE):
+    """ Return a CSW Transaction, as UTF-8 bytes, that deletes every record with one of the given identifiers.
+        The template's identifier comparison is repeated for each identifier, inside an ogc:Or when there are
+        several.  Wildcard characters in identifiers are escaped, so that a PropertyIsLike comparison only
+        matches the identifier itself.
+    """
+    transaction = xml.getTemplateCopy(templateFilePath, stripTemplate=True)
+    filterElement = _filterXPath(transaction)[0]
+    comparison = filterElement[0]
+    filterElement.remove(comparison)
+
+    parent = filterElement
+    if len(recordIDs) > 1:
+        parent = ElementTree.SubElement(filterElement, '{%s}Or' % CSW_NAMESPACE_MAP['ogc'])
+    for recordID in recordIDs:
+        recordComparison = xml.copyElement(comparison)
+        _literalXPath(recordComparison)[0].text = _escapeLikePattern(recordID, recordComparison)
+        parent.append(recordComparison)
+    return ElementTree.tostring(transaction, encoding='UTF-8', xml_declaration=True)
+
+
+def _escapeLikePattern(recordID, comparison):
+    """ Return recordID with the wildcard characters of an ogc:PropertyIsLike comparison escaped. """
+    if not comparison.tag.endswith('PropertyIsLike'):
+        return recordID
+    escape = comparison.get('escape', '\\')
+    specialCharacters = {escape, comparison.get('wildCard', '*'), comparison.get('singleChar', '?')}
+    return ''.join(escape + character if character in specialCharacters else character for character in recordID)
+
+
+def deleteRecordBatch(session, url, recordIDs, templateFilePath=DELETE_TEMPLATE):
+    """ Delete the records with the given identifiers with one Transaction, and return the number deleted. """
+    summary = postTransaction(session, url, buildDeleteTransaction(recordIDs, templateFilePath))
+    return summary['totalDeleted']
+
+
+def deleteRecordIDs(recordIDs, url, session=None, batchSize=DEFAULT_BATCH_SIZE, jobs=1,
+                    templateFilePath=DELETE_TEMPLATE):
+    """ Delete records from a CSW server in batches of batchSize identifiers, with up to `jobs` Transactions in
+        flight at once.  Yield (batchRecordIDs, deletedCount, errorMessage) as each batch finishes, with
+        errorMessage None for successful batches.
+    """
+    if session is None:
+        session = getCSWSession(poolSize=jobs)
+    for batch, deletedCount, errorMessage in runBatches(deleteRecordBatch, recordIDs, batchSize, jobs,
+                                                        session, url, templateFilePath):
+        yield batch, deletedCount or 0, errorMessage
+
+
+def runBatches(batchFunction, items, batchSize, jobs, session, url, templateFilePath):
+    """ Call batchFunction(session, url, batch, templateFilePath) for each batch of batchSize items, with up to
+        `jobs` calls running at once.  Yield (batch, result, errorMessage) as each call finishes, with result
+        None and an errorMessage for calls that raised OSError or an XML syntax error.
+    """
+    batches = (items[start:start + batchSize] for start in range(0, len(items), batchSize))
+
+    with ThreadPoolExecutor(max_workers=jobs) as workers:
+        futures = {}
+        for batch in batches:
+            futures[workers.submit(batchFunction, session, url, batch, templateFilePath)] = batch
+            # Submit more batches only as earlier ones finish, so that batches are prepared as needed.
+            while len(futures) >= 2 * jobs:
+                doneFutures, pendingFutures = wait(futures, return_when=FIRST_COMPLETED)
+                for future in doneFutures:
+                    yield _getBatchResult(future, futures.pop(future))
+        for future in as_completed(list(futures)):
+            yield _getBatchResult(future, futures.pop(future))
+
+
+def _getBatchResult(future, batch):
+    """ Return (batch, result, errorMessage) for a finished batch future. """
+    try:
+        return batch, future.result(), None
+    except (OSError, ElementTree.XMLSyntaxError) as error:
+        return batch, None, '%s: %s' % (type(error).__name__, error)
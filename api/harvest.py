@@ -0,0 +1,86 @@
+#
+#  Code for harvesting DataCite DOI records over pooled keep-alive HTTP connections.
+#
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import api.ratelimit as ratelimit
+
+DATACITE_API_URL = 'https://api.datacite.org/dois'
+
+# Largest page size allowed by the DataCite REST API.
+DATACITE_PAGE_SIZE = 1000
+
+# Seconds to wait for the DataCite API to accept a connection, and to send a response.
+DATACITE_TIMEOUT = (10, 120)
+
+
+def getDataCiteSession(poolSize=1):
+    """ Return a requests Session, so that requests to the DataCite API reuse keep-alive connections.
+        poolSize is the number of connections kept open, which should match the number of threads sharing the session.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=poolSize)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers['Accept'] = 'application/vnd.api+json'
+    return session
+
+
+def sendDataCiteRequest(session, url, limiter=None, **kwargs):
+    """ Send a GET request to the DataCite API, paced by a RateLimiter if one is given, and return the response.
+        Throttled and temporarily failed requests, including connection errors and timeouts, raise
+        ratelimit.RetryableError, with the requests exception, if any, as its cause.
+    """
+    if limiter:
+        limiter.acquire()
+    try:
+        response = session.get(url, timeout=DATACITE_TIMEOUT, **kwargs)
+    except requests.Timeout as error:
+        raise ratelimit.RetryableError('DataCite request timed out: %s' % error) from error
+    except requests.ConnectionError as error:
+        raise ratelimit.RetryableError('Could not connect to DataCite: %s' % error) from error
+
+    if response.status_code in ratelimit.RETRYABLE_STATUS_CODES:
+        retryAfter = ratelimit.parseRetryAfter(response.headers.get('Retry-After'))
+        if limiter and response.status_code == 429:
+            limiter.recordThrottle(retryAfter)
+        raise ratelimit.RetryableError('DataCite returned HTTP %d for %s' % (response.status_code, url), retryAfter)
+    if limiter:
+        limiter.recordSuccess()
+    return response
+
+
+def getDataCitePage(session, url, params=None, limiter=None):
+    """ Return one page of DataCite API results as a dictionary. """
+    response = sendDataCiteRequest(session, url, limiter, params=params)
+    response.raise_for_status()
+    return response.json()
+
+
+def getDataCitePrefixPages(prefix, session=None, apiURL=DATACITE_API_URL, pageSize=DATACITE_PAGE_SIZE, limiter=None):
+    """ Yield the list of DOI records in each page of DataCite results for a DOI prefix, such as '10.5065'.
+        Pages are walked with cursor pagination.  Each page's 'next' link is requested in the background
+        while the caller processes the page.  Throttled and temporarily failed page requests are retried,
+        as set by the RateLimiter.
+    """
+    if session is None:
+        session = getDataCiteSession()
+    if limiter is None:
+        limiter = ratelimit.RateLimiter()
+    params = {'prefix': prefix, 'page[cursor]': '1', 'page[size]': str(pageSize)}
+
+    with ThreadPoolExecutor(max_workers=1) as prefetcher:
+        nextPage = prefetcher.submit(ratelimit.callWithRetries, limiter, getDataCitePage, session, apiURL, params, limiter)
+        while nextPage is not None:
+            page = nextPage.result()
+            records = page.get('data', [])
+            nextURL = page.get('links', {}).get('next')
+            if records and nextURL:
+                nextPage = prefetcher.submit(ratelimit.callWithRetries, limiter, getDataCitePage, session, nextURL,
+                                             None, limiter)
+            else:
+                nextPage = None
+            yield records
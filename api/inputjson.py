@@ -2,7 +2,6 @@
 
 import os.path
 import json
-from urllib.request import urlopen
 
 #import sys
 #import pprint
@@ -16,6 +15,15 @@ def getJSONData(jsonText):
     return jsonData
 
 
+def getJSONLines(textStream):
+    """ Yield (line number, JSON text) pairs from a stream of newline-delimited JSON records.
+        Lines are read one at a time, and blank lines are skipped.
+    """
+    for lineNumber, line in enumerate(textStream, start=1):
+        if line.strip():
+            yield lineNumber, line
+
+
 def getJSONFileNames(dirPath):
     """ Return a list of paths to files containing JSON records, found by recursive search in a given directory. """
     jsonExtension = '.txt'
@@ -43,40 +51,72 @@ def getTemplateFilePath(templateArgument, defaultTemplate):
 #  Functions for pulling DataCite records and converting them to JSON.
 #
 
-def getDataCiteRecords(doi):
-    """ Return a list of JSON records obtained from the DataCite DOI website. """
-    dataCiteURL = 'https://api.datacite.org/dois/'
-    filterQuery = '&fq=prefix:10.5065&fq=is_active:true&wt=json'
-    filterResult = '&fl=doi,relatedIdentifier,resourceTypeGeneral,title,description,publicationYear,subject,creator,contributor,contributorType,publisher,rights,rightsURI'
-
-    if doi:
-        textFilter =  doi
-    else:
-        textFilter = '?q=*'
-
-    #fullQuery = dataCiteURL + textFilter + filterQuery + filterResult
-    fullQuery = dataCiteURL + textFilter 
-
-    #print(f'fullQuery == {fullQuery}')
-    #sys.stderr.write('fullQuery: %s\n' % fullQuery)
-
-    ## Determine number of records
-    #with urlopen(fullQuery + '&rows=0') as url:
-    #    response = url.read()
-    #jsonData = json.load(response)
-    #response = jsonData["response"]
-    #numRecords = response["numFound"]
-
-
-    # Get the records
-    #with urlopen(fullQuery + '&rows=' + str(numRecords)) as url:
-    with urlopen(fullQuery) as url:
-        response = url.read()
-    #sys.stderr.write('response: %s\n' % response)
-    jsonData = json.loads(response.decode('utf-8'))
-
-    #pprint.pprint(jsonData)
-
-    response = jsonData['data']['attributes']
-    return response
-
+DATACITE_DOI_URL = 'https://api.datacite.org/dois/'
+
+
+def getDOIList(textStream):
+    """ Return the DOIs in a text stream with one DOI per line, in order and without duplicates.
+        Blank lines and lines starting with '#' are skipped.
+    """
+    dois = []
+    seenDOIs = set()
+    for line in textStream:
+        doi = line.strip()
+        if doi and not doi.startswith('#') and doi.lower() not in seenDOIs:
+            seenDOIs.add(doi.lower())
+            dois.append(doi)
+    return dois
+
+
+def getDataCiteRecords(doi, cache=None, session=None, apiURL=DATACITE_DOI_URL, limiter=None):
+    """ Return the JSON record for a DOI obtained from the DataCite DOI website, or an empty dictionary if the
+        DOI is not found.
+
+        If a ResponseCache is given, fresh cached responses are used without contacting DataCite, and expired
+        ones are revalidated with a conditional request.  In offline mode only cached responses are used, and
+        LookupError is raised for DOIs that are not cached.
+
+        Requests are paced by the RateLimiter, if one is given.  Throttled and temporarily failed requests
+        raise ratelimit.RetryableError, for the caller to retry.
+    """
+    entry = cache.get(doi) if cache else None
+    if entry and (cache.offline or cache.isFresh(entry)):
+        return getDataCiteAttributes(entry['body'])
+    if cache and cache.offline:
+        raise LookupError('DOI %s is not in the response cache, and the cache is offline' % doi)
+
+    # Imported here, so that DSET translation does not pay for importing requests.
+    import api.harvest as harvest
+    if session is None:
+        session = harvest.getDataCiteSession()
+
+    headers = {}
+    if entry and entry['etag']:
+        headers['If-None-Match'] = entry['etag']
+    if entry and entry['lastModified']:
+        headers['If-Modified-Since'] = entry['lastModified']
+
+    try:
+        response = harvest.sendDataCiteRequest(session, apiURL + doi, limiter, headers=headers)
+    except harvest.ratelimit.RetryableError as error:
+        # Serve an expired response rather than nothing when DataCite cannot be reached.
+        if entry and isinstance(error.__cause__, harvest.requests.ConnectionError):
+            return getDataCiteAttributes(entry['body'])
+        raise
+
+    if response.status_code == 304 and entry:
+        cache.markRevalidated(doi)
+        return getDataCiteAttributes(entry['body'])
+    if response.status_code == 404:
+        return {}
+    response.raise_for_status()
+
+    if cache:
+        cache.put(doi, response.text, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+    return getDataCiteAttributes(response.text)
+
+
+def getDataCiteAttributes(responseText):
+    """ Return the record attributes from the text of a DataCite API response. """
+    jsonData = json.loads(responseText)
+    return jsonData['data']['attributes']
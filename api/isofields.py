@@ -0,0 +1,358 @@
+#
+#  Code for extracting the values reported by xpath.py from ISO 19139 records.
+#
+#  Two engines extract the same fields.  The "tree" engine parses a whole record into an lxml tree and queries it
+#  with XPaths.  The "stream" engine reads the record with iterparse, matches the same XPaths as elements go by,
+#  clears each element once it has been read, and stops as soon as every requested field is known.  Every field lies
+#  in or before gmd:identificationInfo, so the stream engine also stops at the first element following the
+#  identificationInfo elements, relying on the element order required by the ISO 19139 schema.  A record that is
+#  malformed after that point is therefore read by the stream engine without an error.
+#
+import io
+from functools import lru_cache
+
+from lxml import etree as ElementTree  # ISO XML parser
+
+# We need XML namespace mappings in order to search the ISO element tree
+ISO_NAMESPACES = {'gmd': 'http://www.isotc211.org/2005/gmd',
+                  'xlink': 'http://www.w3.org/1999/xlink',
+                  'gco': 'http://www.isotc211.org/2005/gco',
+                  'gml': 'http://www.opengis.net/gml'}
+
+xpaths = {"resourceType": ('/gmd:MD_Metadata/gmd:identificationInfo/gmd:MD_DataIdentification/gmd:descriptiveKeywords' +
+                           '/gmd:MD_Keywords/gmd:thesaurusName/gmd:CI_Citation/gmd:title/gco:CharacterString'),
+          "geoExtent": ('/gmd:MD_Metadata/gmd:identificationInfo/gmd:MD_DataIdentification/gmd:extent' +
+                        '/gmd:EX_Extent/gmd:geographicElement/gmd:EX_GeographicBoundingBox'),
+          "timeExtent": ('/gmd:MD_Metadata/gmd:identificationInfo/gmd:MD_DataIdentification/gmd:extent' +
+                         '/gmd:EX_Extent/gmd:temporalElement/gmd:EX_TemporalExtent'),
+          "resourceFormat": '/gmd:MD_Metadata/gmd:identificationInfo/gmd:MD_DataIdentification/gmd:resourceFormat',
+          "keywords": ('/gmd:MD_Metadata/gmd:identificationInfo/gmd:MD_DataIdentification/gmd:descriptiveKeywords' +
+                       '/gmd:MD_Keywords'),
+          "fileIdentifier": '/gmd:MD_Metadata/gmd:fileIdentifier/gco:CharacterString',
+          "citedContact": ('/gmd:MD_Metadata/gmd:identificationInfo/gmd:MD_DataIdentification/gmd:citation' +
+                           '/gmd:CI_Citation/gmd:citedResponsibleParty/gmd:CI_ResponsibleParty'),
+          }
+
+childXPaths = {
+    'individual': 'gmd:individualName/gco:CharacterString',
+    'organisation': 'gmd:organisationName/gco:CharacterString',
+    'roleCode': 'gmd:role/gmd:CI_RoleCode',
+    'keyword': 'gmd:keyword/gco:CharacterString',
+    'formatName': 'gmd:MD_Format/gmd:name/gco:CharacterString'
+}
+
+# Fields that can be extracted, and the value each one has when it is absent from a record:
+#   resourceType     the first DataCite resource type keyword, lowercase, with 'text' replaced by 'publication'
+#   publisher        the individual or organisation name of the first cited contact with role 'publisher'
+#   resourceFormats  the resource format names, in document order
+#   geoExtent        whether a geographic bounding box exists
+#   timeExtent       whether a temporal extent exists
+#   fileIdentifier   the record's file identifier
+#   keywords         the descriptive keywords, including the resource type, in document order
+FIELD_DEFAULTS = {'resourceType': '', 'publisher': '', 'resourceFormats': [], 'geoExtent': False, 'timeExtent': False,
+                  'fileIdentifier': '', 'keywords': []}
+
+ENGINES = ['tree', 'stream']
+
+
+def getFields(source, fieldNames, engine='tree'):
+    """ Return a dictionary of the named fields of an ISO record, read from a file path or from the bytes of a file.
+        Return None if the record cannot be parsed.
+    """
+    try:
+        if engine == 'stream':
+            if isinstance(source, bytes):
+                return getStreamFields(io.BytesIO(source), fieldNames)
+            with open(source, 'rb') as fileObject:
+                return getStreamFields(fileObject, fieldNames)
+        if isinstance(source, bytes):
+            root = ElementTree.fromstring(source)
+        else:
+            root = ElementTree.parse(source).getroot()
+    except Exception:
+        return None
+    return getTreeFields(root, fieldNames)
+
+
+#
+# Tree engine
+#
+def getElementsMatchingRole(roleString, contactXPath, roleCodeXPath, xml_tree):
+    """ Get all XML contact elements matching a specific role for the given contact XPath.
+    """
+    matchingContactElements = []
+    contactElements = xml_tree.xpath(contactXPath, namespaces=ISO_NAMESPACES)
+
+    for contactElement in contactElements:
+        roleCodeElements = contactElement.xpath(roleCodeXPath, namespaces=ISO_NAMESPACES)
+
+        if roleCodeElements and roleCodeElements[0].get('codeListValue') == roleString:
+            matchingContactElements.append(contactElement)
+
+    return matchingContactElements
+
+
+def getFirstChildTextForRole(roleString, contactXPath, childXPath, roleCodeXPath, xml_tree):
+    """ Get child string from the first matching role found at the given contact XPath.
+    """
+    foundTextValue = ''
+
+    matchingContactElements = getElementsMatchingRole(roleString, contactXPath, roleCodeXPath, xml_tree)
+
+    if matchingContactElements:
+        foundText = matchingContactElements[0].findtext(childXPath, namespaces=ISO_NAMESPACES)
+
+        if foundText:
+            foundTextValue = foundText
+
+    return foundTextValue
+
+
+def getChildTextList(parentXPath, childXPath, xml_tree):
+    """ Loop over children of a parent XPath and return the text associated with all child elements.
+        If no children are found or no child element has text, return the empty list.
+    """
+    childTextList = []
+    parentElements = xml_tree.xpath(parentXPath, namespaces=ISO_NAMESPACES)
+
+    for parentElement in parentElements:
+        childElements = parentElement.xpath(childXPath, namespaces=ISO_NAMESPACES)
+
+        for childElement in childElements:
+            if childElement.text:
+                childTextList.append(childElement.text)
+
+    return childTextList
+
+
+def getResourceTypeKeyword(keywordText):
+    """ Strip whitespace from a resource type keyword, lowercase it, and replace ambiguous keywords. """
+    resourceType = keywordText.strip().lower()
+    # Substitute ambiguous keywords with more understandable versions.
+    if resourceType == 'text':
+        resourceType = 'publication'
+    return resourceType
+
+
+def getDataCiteResourceType(thesaurusXPath, keywordXPath, xml_tree):
+    """ Get the first resource type keyword by searching thesaurus titles containing "Resource Type".
+        Strip whitespace and return lowercase version of string.
+    """
+    resourceType = ''
+    for thesaurus in xml_tree.xpath(thesaurusXPath, namespaces=ISO_NAMESPACES):
+        if "Resource Type" in thesaurus.text:
+            keywordElement = thesaurus.getparent().getparent().getparent().getparent()
+
+            for keyword in keywordElement.xpath(keywordXPath, namespaces=ISO_NAMESPACES):
+                if keyword.text:
+                    # Return the first match found.
+                    return getResourceTypeKeyword(keyword.text)
+
+    return resourceType
+
+
+def getTreeFields(root, fieldNames):
+    """ Return a dictionary of the named fields, queried from the root element of a parsed ISO record. """
+    fields = {}
+    if 'resourceType' in fieldNames:
+        fields['resourceType'] = getDataCiteResourceType(xpaths['resourceType'], childXPaths['keyword'], root)
+    if 'publisher' in fieldNames:
+        fields['publisher'] = ''
+        for element in [childXPaths['individual'], childXPaths['organisation']]:
+            fields['publisher'] = getFirstChildTextForRole('publisher', xpaths['citedContact'], element,
+                                                           childXPaths['roleCode'], root)
+            if fields['publisher']:
+                break
+    if 'resourceFormats' in fieldNames:
+        fields['resourceFormats'] = getChildTextList(xpaths['resourceFormat'], childXPaths['formatName'], root)
+    for fieldName in ['geoExtent', 'timeExtent']:
+        if fieldName in fieldNames:
+            fields[fieldName] = bool(root.xpath(xpaths[fieldName], namespaces=ISO_NAMESPACES))
+    if 'fileIdentifier' in fieldNames:
+        identifiers = root.xpath(xpaths['fileIdentifier'], namespaces=ISO_NAMESPACES)
+        fields['fileIdentifier'] = (identifiers[0].text or '') if identifiers else ''
+    if 'keywords' in fieldNames:
+        fields['keywords'] = getChildTextList(xpaths['keywords'], childXPaths['keyword'], root)
+    return fields
+
+
+#
+# Stream engine
+#
+def getClarkPath(xpath):
+    """ Return an XPath made of element steps, such as 'gmd:name/gco:CharacterString', as a tuple of element tags
+        in Clark notation, such as ('{http://www.isotc211.org/2005/gmd}name', ...).
+    """
+    steps = []
+    for step in xpath.strip('/').split('/'):
+        prefix, name = step.split(':')
+        steps.append('{%s}%s' % (ISO_NAMESPACES[prefix], name))
+    return tuple(steps)
+
+
+CHARACTER_STRING_TAG = getClarkPath('gco:CharacterString')[0]
+IDENTIFICATION_TAG = getClarkPath('gmd:identificationInfo')[0]
+
+# Child elements of gmd:MD_Metadata, in schema order, and of gmd:MD_DataIdentification, with the cited contacts of
+# its citation.  iterparse reports them so that each one is freed once it has been read, and so that the end of the
+# identificationInfo elements is seen.
+METADATA_CHILD_TAGS = getClarkPath('gmd:fileIdentifier/gmd:language/gmd:characterSet/gmd:parentIdentifier' +
+                                   '/gmd:hierarchyLevel/gmd:hierarchyLevelName/gmd:contact/gmd:dateStamp' +
+                                   '/gmd:metadataStandardName/gmd:metadataStandardVersion/gmd:dataSetURI/gmd:locale' +
+                                   '/gmd:spatialRepresentationInfo/gmd:referenceSystemInfo' +
+                                   '/gmd:metadataExtensionInfo/gmd:identificationInfo/gmd:contentInfo' +
+                                   '/gmd:distributionInfo/gmd:dataQualityInfo/gmd:portrayalCatalogueInfo' +
+                                   '/gmd:metadataConstraints/gmd:applicationSchemaInfo/gmd:metadataMaintenance' +
+                                   '/gmd:series/gmd:describes/gmd:propertyType/gmd:featureType/gmd:featureAttribute')
+IDENTIFICATION_CHILD_TAGS = getClarkPath('gmd:citation/gmd:abstract/gmd:purpose/gmd:credit/gmd:status' +
+                                         '/gmd:pointOfContact/gmd:resourceMaintenance/gmd:graphicOverview' +
+                                         '/gmd:resourceFormat/gmd:descriptiveKeywords/gmd:resourceSpecificUsage' +
+                                         '/gmd:resourceConstraints/gmd:aggregationInfo' +
+                                         '/gmd:spatialRepresentationType/gmd:spatialResolution/gmd:language' +
+                                         '/gmd:characterSet/gmd:topicCategory/gmd:environmentDescription' +
+                                         '/gmd:extent/gmd:supplementalInformation/gmd:citedResponsibleParty')
+
+KEYWORDS_PATH = getClarkPath(xpaths['keywords'])
+CONTACT_PATH = getClarkPath(xpaths['citedContact'])
+
+# The elements each field needs, and the action taken when each element starts or ends.  Text values are read
+# from the gco:CharacterString children of an element when it ends, so that gco:CharacterString elements, which
+# are everywhere, need not be followed.
+STREAM_TARGETS = {
+    'resourceType': [(KEYWORDS_PATH, 'keywords'),
+                     (KEYWORDS_PATH + getClarkPath(childXPaths['keyword'])[:-1], 'keyword'),
+                     (getClarkPath(xpaths['resourceType'])[:-1], 'thesaurus')],
+    'publisher': [(CONTACT_PATH, 'contact'),
+                  (CONTACT_PATH + getClarkPath(childXPaths['roleCode']), 'role'),
+                  (CONTACT_PATH + getClarkPath(childXPaths['individual'])[:-1], 'individual'),
+                  (CONTACT_PATH + getClarkPath(childXPaths['organisation'])[:-1], 'organisation')],
+    'resourceFormats': [(getClarkPath(xpaths['resourceFormat']) + getClarkPath(childXPaths['formatName'])[:-1],
+                         'format')],
+    'geoExtent': [(getClarkPath(xpaths['geoExtent']), 'geoExtent')],
+    'timeExtent': [(getClarkPath(xpaths['timeExtent']), 'timeExtent')],
+    'fileIdentifier': [(getClarkPath(xpaths['fileIdentifier'])[:-1], 'fileIdentifier')],
+    'keywords': [(KEYWORDS_PATH + getClarkPath(childXPaths['keyword'])[:-1], 'keyword')],
+}
+
+
+@lru_cache(maxsize=None)
+def getStreamTargets(fieldNames):
+    """ Return (targetTree, tags) for a frozenset of field names.  targetTree holds the elements the fields need,
+        as nested dictionaries keyed by element tag, with the action for an element stored under the key None.
+        tags is the set of element tags iterparse reports.
+    """
+    targetTree = {}
+    tags = set(METADATA_CHILD_TAGS + IDENTIFICATION_CHILD_TAGS)
+    for fieldName in fieldNames:
+        for path, action in STREAM_TARGETS[fieldName]:
+            node = targetTree
+            for tag in path:
+                node = node.setdefault(tag, {})
+            node[None] = action
+            tags.update(path)
+    return targetTree, tags
+
+
+def getCharacterStrings(element):
+    """ Return the text of each gco:CharacterString child of an element, with None for empty ones. """
+    return [child.text for child in element.iterchildren(CHARACTER_STRING_TAG)]
+
+
+def getStreamFields(fileObject, fieldNames):
+    """ Return a dictionary of the named fields, read from an open ISO record file with iterparse.
+        Raise lxml.etree.XMLSyntaxError if the part of the record that was read is not well formed.
+    """
+    pendingFields = set(fieldNames)
+    fields = {fieldName: FIELD_DEFAULTS[fieldName] for fieldName in fieldNames}
+    formats, keywords = [], []
+    keywordTexts, thesaurusTitles = [], []
+    role = individual = organisation = None
+    identificationSeen = False
+
+    # iterparse only reports elements with the target tags, but builds every element.  An element matches a target
+    # node only if its parent is the element of the enclosing target node; other elements get the node None.
+    targetTree, tags = getStreamTargets(frozenset(fieldNames))
+    openElements = [None]
+    openNodes = [targetTree]
+
+    for event, element in ElementTree.iterparse(fileObject, events=('start', 'end'), tag=tags):
+        if event == 'start':
+            parent = element.getparent()
+            node = openNodes[-1]
+            if node is not None and parent is openElements[-1]:
+                node = node.get(element.tag)
+                if parent is not None:
+                    # Earlier siblings of a target element have been read, and are no longer needed.
+                    while element.getprevious() is not None:
+                        del parent[0]
+            else:
+                node = None
+            openElements.append(element)
+            openNodes.append(node)
+
+            if len(openElements) == 3 and parent is openElements[1]:
+                # Stop at the first element after the identificationInfo elements.
+                if element.tag == IDENTIFICATION_TAG:
+                    identificationSeen = True
+                elif identificationSeen:
+                    break
+            action = node.get(None) if node is not None else None
+            if action == 'contact':
+                role = individual = organisation = None
+            elif action == 'keywords':
+                keywordTexts, thesaurusTitles = [], []
+            elif action == 'role':
+                if role is None:
+                    role = element.get('codeListValue')
+            elif action in ('geoExtent', 'timeExtent'):
+                fields[action] = True
+                pendingFields.discard(action)
+                if not pendingFields:
+                    break
+            continue
+
+        node = openNodes.pop()
+        openElements.pop()
+        action = node.get(None) if node is not None else None
+        if action == 'format':
+            formats += [text for text in getCharacterStrings(element) if text]
+        elif action == 'keyword':
+            texts = [text for text in getCharacterStrings(element) if text]
+            keywordTexts += texts
+            keywords += texts
+        elif action == 'thesaurus':
+            thesaurusTitles += getCharacterStrings(element)
+        elif action == 'individual':
+            texts = getCharacterStrings(element)
+            if individual is None and texts:
+                individual = texts[0] or ''
+        elif action == 'organisation':
+            texts = getCharacterStrings(element)
+            if organisation is None and texts:
+                organisation = texts[0] or ''
+        elif action == 'fileIdentifier':
+            texts = getCharacterStrings(element)
+            if 'fileIdentifier' in pendingFields and texts:
+                fields['fileIdentifier'] = texts[0] or ''
+                pendingFields.discard('fileIdentifier')
+        elif action == 'keywords' and 'resourceType' in pendingFields:
+            if keywordTexts and any('Resource Type' in (title or '') for title in thesaurusTitles):
+                fields['resourceType'] = getResourceTypeKeyword(keywordTexts[0])
+                pendingFields.discard('resourceType')
+        elif action == 'contact' and 'publisher' in pendingFields:
+            if role == 'publisher':
+                fields['publisher'] = individual or organisation or ''
+                pendingFields.discard('publisher')
+        if not pendingFields:
+            break
+
+        # Free the element and its earlier siblings, which have all been read.
+        element.clear()
+        while element.getprevious() is not None:
+            del element.getparent()[0]
+
+    if 'resourceFormats' in fields:
+        fields['resourceFormats'] = formats
+    if 'keywords' in fields:
+        fields['keywords'] = keywords
+    return fields
@@ -0,0 +1,174 @@
+#
+#  Persistent SQLite index of the fields extracted from a directory of ISO 19139 records by api.isofields.
+#
+#  The index holds each record's publisher, resource type, file identifier, extent flags, resource formats (raw
+#  and standardized) and keywords, with the size and modification time of its file.  Updating the index only
+#  parses files that are new or whose size or modification time changed, and drops files that were removed.
+#  Files are kept in the order a directory scan visits them, so reports read from the index match a scan.
+#
+import functools
+import hashlib
+import json
+import multiprocessing
+import sqlite3
+from pathlib import Path
+
+import api.isofields as isofields
+import utils.harvest_mappings as harvest_mappings
+from utils.harvest_mappings import getStandardResourceFormats
+
+# Files whose fields are written to the index per transaction, so that an interrupted update keeps its progress.
+FILES_PER_COMMIT = 1000
+
+SCHEMA = ['CREATE TABLE IF NOT EXISTS files ('
+          'path TEXT PRIMARY KEY, ordinal INTEGER, size INTEGER, mtime INTEGER, parsed INTEGER, '
+          'fileIdentifier TEXT, publisher TEXT, resourceType TEXT, geoExtent INTEGER, timeExtent INTEGER)',
+          'CREATE INDEX IF NOT EXISTS filesByOrdinal ON files (ordinal)',
+          'CREATE INDEX IF NOT EXISTS filesByIdentifier ON files (fileIdentifier)',
+          'CREATE TABLE IF NOT EXISTS formats ('
+          'path TEXT, position INTEGER, format TEXT, standardFormat TEXT, PRIMARY KEY (path, position))',
+          'CREATE TABLE IF NOT EXISTS keywords ('
+          'path TEXT, position INTEGER, keyword TEXT, PRIMARY KEY (path, position))',
+          'CREATE TABLE IF NOT EXISTS settings (name TEXT PRIMARY KEY, value TEXT)']
+
+INDEXED_FIELDS = ['fileIdentifier', 'publisher', 'resourceType', 'geoExtent', 'timeExtent', 'resourceFormats',
+                  'keywords']
+
+
+def getFormatMappingVersion():
+    """ Return a digest of the resource format mapping, which changes when the mapping is edited. """
+    return hashlib.md5(json.dumps(list(harvest_mappings.RESOURCE_FORMAT_MAPPING.items())).encode('utf-8')).hexdigest()
+
+
+def extractFields(filePath, engine):
+    """ Return (filePath, fields) for one record file, with fields None if it cannot be parsed. """
+    return filePath, isofields.getFields(filePath, INDEXED_FIELDS, engine)
+
+
+class FieldIndex:
+    """ An index of the fields of the ISO records in one directory tree. """
+
+    def __init__(self, indexPath):
+        self._connection = sqlite3.connect(indexPath)
+        for statement in SCHEMA:
+            self._connection.execute(statement)
+        self._updateStandardFormats()
+        self._connection.commit()
+
+    def update(self, inputDir, jobs=1, engine='tree'):
+        """ Bring the index up to date with the '*.xml' files under inputDir, parsing new and changed files with
+            `jobs` worker processes.  Return (parsedCount, removedCount).
+        """
+        indexedFiles = {path: (ordinal, size, mtime) for path, ordinal, size, mtime in
+                        self._connection.execute('SELECT path, ordinal, size, mtime FROM files')}
+        scannedFiles = {}
+        for ordinal, path in enumerate(Path(inputDir).rglob('*.xml')):
+            fileStat = path.stat()
+            scannedFiles[path.as_posix()] = (ordinal, fileStat.st_size, fileStat.st_mtime_ns)
+
+        changedPaths = [path for path, (ordinal, size, mtime) in scannedFiles.items()
+                        if indexedFiles.get(path, (None,))[1:] != (size, mtime)]
+        extract = functools.partial(extractFields, engine=engine)
+        if jobs > 1:
+            with multiprocessing.get_context('fork').Pool(jobs) as pool:
+                self._storeFields(pool.imap(extract, changedPaths, chunksize=64), scannedFiles)
+        else:
+            self._storeFields(map(extract, changedPaths), scannedFiles)
+
+        removedPaths = [(path,) for path in indexedFiles if path not in scannedFiles]
+        self._deleteFiles(removedPaths)
+        self._connection.executemany('UPDATE files SET ordinal = ? WHERE path = ?',
+                                     [(ordinal, path) for path, (ordinal, size, mtime) in scannedFiles.items()
+                                      if path in indexedFiles and indexedFiles[path][0] != ordinal])
+        self._connection.commit()
+        return len(changedPaths), len(removedPaths)
+
+    def getFields(self, fieldNames):
+        """ Yield (filePath, fields) for every indexed file in scan order, where fields is a dictionary of the named
+            fields, as returned by api.isofields.getFields, or None if the file could not be parsed.  When
+            'resourceFormats' is requested, the standardized formats are given as 'standardResourceFormats'.
+        """
+        withFormats = 'resourceFormats' in fieldNames
+        withKeywords = 'keywords' in fieldNames
+        formats = self._getLists('SELECT path, format, standardFormat FROM formats ORDER BY path, position') \
+            if withFormats else {}
+        keywords = self._getLists('SELECT path, keyword FROM keywords ORDER BY path, position') \
+            if withKeywords else {}
+
+        columns = [fieldName for fieldName in INDEXED_FIELDS if fieldName in fieldNames and
+                   fieldName not in ('resourceFormats', 'keywords')]
+        query = 'SELECT path, parsed%s FROM files ORDER BY ordinal' % ''.join(', ' + column for column in columns)
+        for row in self._connection.execute(query):
+            path, parsed = row[:2]
+            if not parsed:
+                yield path, None
+                continue
+            fields = dict(zip(columns, row[2:]))
+            for fieldName in ('geoExtent', 'timeExtent'):
+                if fieldName in fields:
+                    fields[fieldName] = bool(fields[fieldName])
+            if withFormats:
+                pathFormats = formats.get(path, [])
+                fields['resourceFormats'] = [format for format, standardFormat in pathFormats]
+                fields['standardResourceFormats'] = [standardFormat for format, standardFormat in pathFormats]
+            if withKeywords:
+                fields['keywords'] = [keyword for (keyword,) in keywords.get(path, [])]
+            yield path, fields
+
+    def getDuplicateIdentifiers(self):
+        """ Return a list of (fileIdentifier, filePaths) for identifiers shared by more than one file, in scan order. """
+        duplicates = {}
+        for fileIdentifier, path in self._connection.execute(
+                'SELECT fileIdentifier, path FROM files WHERE fileIdentifier IN '
+                "(SELECT fileIdentifier FROM files WHERE parsed AND fileIdentifier != '' "
+                'GROUP BY fileIdentifier HAVING COUNT(*) > 1) ORDER BY ordinal'):
+            duplicates.setdefault(fileIdentifier, []).append(path)
+        return list(duplicates.items())
+
+    def close(self):
+        self._connection.close()
+
+    def _getLists(self, query):
+        """ Return a dictionary mapping each path to the list of the other columns of its rows, in query order. """
+        lists = {}
+        for row in self._connection.execute(query):
+            lists.setdefault(row[0], []).append(row[1:])
+        return lists
+
+    def _storeFields(self, results, scannedFiles):
+        """ Write (filePath, fields) results to the index, committing every FILES_PER_COMMIT files. """
+        for count, (path, fields) in enumerate(results, start=1):
+            ordinal, size, mtime = scannedFiles[path]
+            self._deleteFiles([(path,)])
+            if fields is None:
+                self._connection.execute('INSERT INTO files (path, ordinal, size, mtime, parsed) VALUES (?, ?, ?, ?, 0)',
+                                         (path, ordinal, size, mtime))
+            else:
+                self._connection.execute('INSERT INTO files VALUES (?, ?, ?, ?, 1, ?, ?, ?, ?, ?)',
+                                         (path, ordinal, size, mtime, fields['fileIdentifier'], fields['publisher'],
+                                          fields['resourceType'], fields['geoExtent'], fields['timeExtent']))
+                formats = zip(fields['resourceFormats'], getStandardResourceFormats(fields['resourceFormats']))
+                self._connection.executemany('INSERT INTO formats VALUES (?, ?, ?, ?)',
+                                              [(path, position, format, standardFormat)
+                                               for position, (format, standardFormat) in enumerate(formats)])
+                self._connection.executemany('INSERT INTO keywords VALUES (?, ?, ?)',
+                                              [(path, position, keyword)
+                                               for position, keyword in enumerate(fields['keywords'])])
+            if count % FILES_PER_COMMIT == 0:
+                self._connection.commit()
+
+    def _deleteFiles(self, paths):
+        """ Delete a list of (path,) tuples from every table. """
+        for table in ('files', 'formats', 'keywords'):
+            self._connection.executemany('DELETE FROM %s WHERE path = ?' % table, paths)
+
+    def _updateStandardFormats(self):
+        """ Re-standardize the indexed formats if the resource format mapping changed since they were indexed. """
+        mappingVersion = getFormatMappingVersion()
+        row = self._connection.execute("SELECT value FROM settings WHERE name = 'formatMapping'").fetchone()
+        if row and row[0] == mappingVersion:
+            return
+        formats = [format for (format,) in self._connection.execute('SELECT DISTINCT format FROM formats')]
+        self._connection.executemany('UPDATE formats SET standardFormat = ? WHERE format = ?',
+                                     zip(getStandardResourceFormats(formats), formats))
+        self._connection.execute("INSERT OR REPLACE INTO settings VALUES ('formatMapping', ?)", (mappingVersion,))
@@ -0,0 +1,104 @@
+#
+#  Counts of the values reported by xpath.py, summarized over a corpus of ISO 19139 records.
+#
+#  A FieldSummary holds, for each report type, how many times each value occurs, broken down by the resource type
+#  of the records it occurs in: a histogram of formats or publishers, or the number of records with and without an
+#  extent.  Summaries of separate parts of a corpus, such as the chunks scanned by worker processes, are combined
+#  with merge(), so only the counts, and not the reported values of every record, are passed between processes.
+#
+from collections import Counter
+
+# Report types whose values are flags, summarized as the share of records having them.
+FLAG_REPORTS = ['geoExtent', 'timeExtent']
+
+# How a missing value (an empty publisher, a record with no formats, or no resource type) is shown.
+NO_VALUE = '(none)'
+
+
+class FieldSummary:
+    """ Counts of the reported values of a set of records, for the given report types. """
+
+    def __init__(self, reportTypes):
+        self.reportTypes = list(reportTypes)
+        self.unparsedCount = 0
+        self.recordCounts = Counter()
+        self.valueCounts = {reportType: Counter() for reportType in self.reportTypes}
+
+    def add(self, resourceType, values):
+        """ Count one record of the given resource type, where values maps each report type to the record's value,
+            or to a list of values, each of which is counted.
+        """
+        self.recordCounts[resourceType] += 1
+        for reportType in self.reportTypes:
+            value = values[reportType]
+            if not isinstance(value, list):
+                value = [value]
+            elif not value:
+                value = [None]
+            self.valueCounts[reportType].update((resourceType, item) for item in value)
+
+    def addUnparsed(self):
+        """ Count one record that could not be parsed. """
+        self.unparsedCount += 1
+
+    def merge(self, other):
+        """ Add the counts of another summary, of the same report types, to this one. """
+        self.unparsedCount += other.unparsedCount
+        self.recordCounts.update(other.recordCounts)
+        for reportType in self.reportTypes:
+            self.valueCounts[reportType].update(other.valueCounts[reportType])
+
+    def getCounts(self, reportType, resourceType=None):
+        """ Return a Counter of the values of one report type, over all records or those of one resource type. """
+        counts = Counter()
+        for (valueResourceType, value), count in self.valueCounts[reportType].items():
+            if resourceType is None or valueResourceType == resourceType:
+                counts[value] += count
+        return counts
+
+    def getLines(self):
+        """ Return the summary as lines of text: record counts by resource type, then for each report type, its
+            counts over all records and for each resource type.  Counts are listed from the most frequent value.
+        """
+        lines = ['# records']
+        lines += getCountLines(Counter({'parsed': sum(self.recordCounts.values()), 'unparsed': self.unparsedCount}))
+        lines.append('# resourceType')
+        lines += getCountLines(self.recordCounts)
+
+        resourceTypes = sorted(self.recordCounts, key=getValueName)
+        for reportType in self.reportTypes:
+            for resourceType in [None] + resourceTypes:
+                heading = '# ' + reportType
+                recordCount = sum(self.recordCounts.values())
+                if resourceType is not None:
+                    heading += ', resourceType ' + getValueName(resourceType)
+                    recordCount = self.recordCounts[resourceType]
+                lines.append(heading)
+                counts = self.getCounts(reportType, resourceType)
+                if reportType in FLAG_REPORTS:
+                    lines += getShareLines(reportType, counts[True], recordCount)
+                else:
+                    lines += getCountLines(counts)
+        return lines
+
+
+def getValueName(value):
+    """ Return how a counted value is shown in a summary. """
+    return NO_VALUE if value is None or value == '' else str(value)
+
+
+def getCountLines(counts):
+    """ Return lines giving each count and its value, from the most frequent value, like "sort | uniq -c". """
+    names = Counter()
+    for value, count in counts.items():
+        names[getValueName(value)] += count
+    return [f'{count:>8}  {name}' for name, count in sorted(names.items(), key=lambda item: (-item[1], item[0]))]
+
+
+def getShareLines(reportType, flagCount, recordCount):
+    """ Return lines giving the number and percentage of records with and without a flag. """
+    lines = []
+    for label, count in (('with', flagCount), ('without', recordCount - flagCount)):
+        percent = 100.0 * count / recordCount if recordCount else 0.0
+        lines.append(f'{count:>8}  {percent:5.1f}%  {label} {reportType}')
+    return lines
@@ -0,0 +1,132 @@
+#
+#  Code for the incremental rebuild manifest kept in a batch output directory.
+#
+#  The manifest is a journal of JSON lines.  Each line records one translated input file:
+#
+#      {"input": <path relative to inputDir>, "output": <path relative to outputDir>,
+#       "inputHash": ..., "templateHash": ..., "codeVersion": ..., "outputOptions": {...}}
+#
+#  or the removal of an input file that no longer exists:
+#
+#      {"input": <path relative to inputDir>, "deleted": true}
+#
+#  Later lines override earlier ones.  Lines are appended as each file finishes, so an interrupted
+#  run can resume where it stopped.  At the end of a run the journal is rewritten in compact form.
+#
+import glob
+import hashlib
+import json
+import os
+import os.path
+
+MANIFEST_FILE_NAME = '.dset2iso_manifest.jsonl'
+
+# Entry fields that must match for an earlier output to be reused.
+ENTRY_VERSION_KEYS = ('inputHash', 'templateHash', 'codeVersion', 'outputOptions')
+
+# Source folders whose contents determine the translation output.
+CODE_FOLDERS = ['translate', 'translate/dset_tiers', 'util']
+
+
+def getFileHash(filePath):
+    """ Return the SHA-256 hex digest of a file's contents. """
+    fileHash = hashlib.sha256()
+    with open(filePath, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            fileHash.update(block)
+    return fileHash.hexdigest()
+
+
+def getCodeVersion():
+    """ Return a hash of the translator source code, so that code changes invalidate earlier outputs. """
+    apiFolder = os.path.dirname(os.path.abspath(__file__))
+    codeHash = hashlib.sha256()
+    for codeFolder in CODE_FOLDERS:
+        for sourcePath in sorted(glob.glob(os.path.join(apiFolder, codeFolder, '*.py'))):
+            codeHash.update(os.path.relpath(sourcePath, apiFolder).encode('utf-8'))
+            codeHash.update(getFileHash(sourcePath).encode('ascii'))
+    return codeHash.hexdigest()
+
+
+def getManifestPath(outputDir):
+    return os.path.join(outputDir, MANIFEST_FILE_NAME)
+
+
+def loadManifest(outputDir):
+    """ Return a dictionary of manifest entries keyed by relative input path.
+        A truncated final line, left by an interrupted run, is ignored.
+    """
+    entries = {}
+    manifestPath = getManifestPath(outputDir)
+    if not os.path.isfile(manifestPath):
+        return entries
+
+    with open(manifestPath, 'r') as manifestFile:
+        for line in manifestFile:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if entry.get('deleted'):
+                entries.pop(entry['input'], None)
+            else:
+                entries[entry['input']] = entry
+    return entries
+
+
+def writeManifest(outputDir, entries):
+    """ Replace the manifest journal with one line per entry. """
+    manifestPath = getManifestPath(outputDir)
+    temporaryPath = manifestPath + '.tmp'
+    with open(temporaryPath, 'w') as manifestFile:
+        for inputKey in sorted(entries):
+            manifestFile.write(json.dumps(entries[inputKey], sort_keys=True) + '\n')
+    os.replace(temporaryPath, manifestPath)
+
+
+def openManifestJournal(outputDir):
+    """ Open the manifest journal for appending entries during a run. """
+    return open(getManifestPath(outputDir), 'a')
+
+
+def appendManifestEntry(journal, entry):
+    """ Append one entry to the manifest journal, and flush it so it survives a crash. """
+    journal.write(json.dumps(entry, sort_keys=True) + '\n')
+    journal.flush()
+
+
+def planRebuild(inputFiles, inputDir, outputDir, templatePath, outputOptions=None):
+    """ Compare input files against the manifest in outputDir.
+        Outputs written with a different template, translator code version, or outputOptions are stale.
+        Return (staleFiles, removedEntries, currentEntries, newEntries) where:
+          * staleFiles are the input files that must be translated,
+          * removedEntries are manifest entries whose input files no longer exist,
+          * currentEntries is the loaded manifest,
+          * newEntries maps each stale input file to the manifest entry to record once it is translated.
+    """
+    currentEntries = loadManifest(outputDir)
+    templateHash = getFileHash(templatePath)
+    codeVersion = getCodeVersion()
+
+    staleFiles = []
+    newEntries = {}
+    inputKeys = set()
+    for inputFile in inputFiles:
+        inputKey = os.path.relpath(inputFile, inputDir)
+        inputKeys.add(inputKey)
+        entry = {'input': inputKey,
+                 'inputHash': getFileHash(inputFile),
+                 'templateHash': templateHash,
+                 'codeVersion': codeVersion,
+                 'outputOptions': outputOptions or {}}
+
+        previousEntry = currentEntries.get(inputKey)
+        isCurrent = previousEntry is not None and \
+            all(previousEntry.get(key) == entry[key] for key in ENTRY_VERSION_KEYS) and \
+            os.path.isfile(os.path.join(outputDir, previousEntry['output']))
+        if not isCurrent:
+            staleFiles.append(inputFile)
+            newEntries[inputFile] = entry
+
+    removedEntries = [entry for inputKey, entry in sorted(currentEntries.items()) if inputKey not in inputKeys]
+    return staleFiles, removedEntries, currentEntries, newEntries
@@ -1,11 +1,54 @@
 import os.path
+import re
 
 def prepareOutputFile(inputFile, inputDir, outputDir):
     outputFile = inputFile.replace(inputDir,outputDir,1)
     outputFile = os.path.splitext(outputFile)[0] + '.xml'
 
     outputFileDir = os.path.dirname(outputFile)
-    if not os.path.exists(outputFileDir):
-        os.makedirs(outputFileDir)
+    os.makedirs(outputFileDir, exist_ok=True)
 
     return outputFile
+
+
+def getFileNameForID(recordID):
+    """ Return a file name, without extension, for a record identifier of any type.
+        Characters that are unsafe in file names are replaced by underscores.
+    """
+    return re.sub(r'[^A-Za-z0-9._-]', '_', str(recordID))
+
+
+def prepareOutputFileForID(recordID, outputDir, usedNames=None):
+    """ Return an output file path in outputDir named by a record identifier.
+        If usedNames, the set of file names already given out, is passed, a name already in it gets a numeric suffix,
+        so records whose identifiers map to the same name do not overwrite each other; the name used is added to it.
+    """
+    baseName = getFileNameForID(recordID)
+    fileName = baseName
+    if usedNames is not None:
+        suffix = 1
+        while fileName in usedNames:
+            suffix += 1
+            fileName = '%s_%d' % (baseName, suffix)
+        usedNames.add(fileName)
+    outputFile = os.path.join(outputDir, fileName + '.xml')
+    return outputFile
+
+
+def createOutputFileForID(recordID, outputDir):
+    """ Create an empty output file in outputDir named by a record identifier, and return its path.
+        The file is created only if no file of that name exists, so a name already taken in outputDir, by an
+        earlier record or an earlier run, gets a numeric suffix, and existing files are never overwritten.
+        Nothing is kept per record, since the output directory itself records the names in use.
+    """
+    baseName = getFileNameForID(recordID)
+    fileName = baseName
+    suffix = 1
+    while True:
+        outputFile = os.path.join(outputDir, fileName + '.xml')
+        try:
+            os.close(os.open(outputFile, os.O_WRONLY | os.O_CREAT | os.O_EXCL))
+            return outputFile
+        except FileExistsError:
+            suffix += 1
+            fileName = '%s_%d' % (baseName, suffix)
@@ -0,0 +1,155 @@
+#
+#  Code for pacing requests to a rate-limited web service, and for scheduling retries.
+#
+#  A RateLimiter is a token bucket shared by all threads that send requests to one service.  When the service
+#  answers "429 Too Many Requests", the limiter pauses all requests for the Retry-After time and halves its rate;
+#  each later success raises the rate again, up to the configured maximum.  Retries of failed requests wait for a
+#  jittered exponential backoff, unless the service gave a Retry-After time.
+#
+import email.utils
+import random
+import threading
+import time
+
+# HTTP status codes for which a request is worth retrying.
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# DataCite allows 3000 requests per 5 minutes from one address.
+DEFAULT_RATE = 10.0
+
+DEFAULT_MAX_RETRIES = 5
+
+# Backoff delays, in seconds, for the first retry and for any retry.
+DEFAULT_BASE_DELAY = 1.0
+DEFAULT_MAX_DELAY = 60.0
+
+
+class RetryableError(Exception):
+    """ A request failed in a way that may succeed later.  retryAfter is the delay requested by the server, if any. """
+
+    def __init__(self, message, retryAfter=None):
+        super().__init__(message)
+        self.retryAfter = retryAfter
+
+
+def parseRetryAfter(value):
+    """ Return the delay in seconds given by a Retry-After header, either a number of seconds or an HTTP date.
+        Return None if the header is missing or malformed.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retryTime = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retryTime is None:
+        return None
+    return max(0.0, retryTime.timestamp() - time.time())
+
+
+class RateLimiter:
+    """ A thread-safe, adaptive token bucket, with retry settings and request metrics. """
+
+    def __init__(self, rate=DEFAULT_RATE, burst=None, maxRetries=DEFAULT_MAX_RETRIES,
+                 baseDelay=DEFAULT_BASE_DELAY, maxDelay=DEFAULT_MAX_DELAY):
+        self.maxRate = rate
+        self.rate = rate
+        self.minRate = rate / 64
+        self.burst = burst or max(1.0, rate)
+        self.maxRetries = maxRetries
+        self.baseDelay = baseDelay
+        self.maxDelay = maxDelay
+
+        self._lock = threading.Lock()
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._pausedUntil = 0.0
+        self._startTime = self._updated
+
+        self.requestCount = 0
+        self.retryCount = 0
+        self.throttleCount = 0
+        self.throttleWaitSeconds = 0.0
+
+    def acquire(self):
+        """ Wait until a request may be sent, and count it.  Return the number of seconds waited. """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now > self._updated:
+                    self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                    self._updated = now
+                if now >= self._pausedUntil and self._tokens >= 1:
+                    self._tokens -= 1
+                    self.requestCount += 1
+                    self.throttleWaitSeconds += waited
+                    return waited
+                delay = max(self._pausedUntil - now, (1 - self._tokens) / self.rate)
+            time.sleep(delay)
+            waited += delay
+
+    def recordSuccess(self):
+        """ Raise the rate a step after a successful request. """
+        with self._lock:
+            self.rate = min(self.maxRate, self.rate + self.maxRate / 20)
+
+    def recordThrottle(self, retryAfter=None):
+        """ Pause all requests after a "429 Too Many Requests" response, and halve the rate.
+            Responses to requests sent before the pause started only extend the pause.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.throttleCount += 1
+            if now >= self._pausedUntil:
+                self.rate = max(self.minRate, self.rate / 2)
+            pause = retryAfter if retryAfter is not None else 1.0 / self.rate
+            self._pausedUntil = max(self._pausedUntil, now + pause)
+            # No tokens accumulate during the pause.
+            self._tokens = 0.0
+            self._updated = self._pausedUntil
+
+    def getRetryDelay(self, attempt, retryAfter=None):
+        """ Return the delay before retry number `attempt` (starting at 0), and count the retry.
+            A Retry-After time from the server is honored; otherwise the delay is a jittered exponential backoff.
+        """
+        with self._lock:
+            self.retryCount += 1
+        if retryAfter is not None:
+            return retryAfter
+        return random.uniform(0, min(self.maxDelay, self.baseDelay * 2 ** attempt))
+
+    def getMetrics(self):
+        """ Return a dictionary of request metrics since the limiter was created. """
+        with self._lock:
+            elapsed = max(time.monotonic() - self._startTime, 1e-9)
+            return {'requests': self.requestCount,
+                    'requestsPerSecond': self.requestCount / elapsed,
+                    'retries': self.retryCount,
+                    'throttled': self.throttleCount,
+                    'throttleWaitSeconds': self.throttleWaitSeconds,
+                    'currentRate': self.rate}
+
+
+def formatMetrics(metrics):
+    """ Return a one-line summary of the metrics returned by RateLimiter.getMetrics(). """
+    return ('%d requests (%.1f/s), %d retries, %d throttled, %.1f s waiting for the rate limit'
+            % (metrics['requests'], metrics['requestsPerSecond'], metrics['retries'], metrics['throttled'],
+               metrics['throttleWaitSeconds']))
+
+
+def callWithRetries(limiter, function, *args):
+    """ Call function(*args), retrying it after a delay when it raises RetryableError, up to limiter.maxRetries times. """
+    attempt = 0
+    while True:
+        try:
+            return function(*args)
+        except RetryableError as error:
+            if attempt >= limiter.maxRetries:
+                raise
+            time.sleep(limiter.getRetryDelay(attempt, error.retryAfter))
+            attempt += 1
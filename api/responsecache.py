@@ -0,0 +1,115 @@
+#
+#  Persistent on-disk cache of DataCite API responses, keyed by DOI.
+#
+#  Entries hold the response body with its ETag and Last-Modified headers, so that expired entries can be
+#  revalidated with conditional requests.  The cache is an SQLite database; when it grows past its size cap,
+#  the least recently used entries are evicted.  The total size of the bodies, in UTF-8 bytes, is kept as a running
+#  total, so storing an entry does not scan the table.  Reading an entry only notes when it was used, in memory;
+#  those times are written with the next change to the cache, or when it is closed, so hits cost no disk writes.
+#
+import os
+import sqlite3
+import threading
+import time
+
+CACHE_FILE_NAME = 'datacite_responses.sqlite'
+
+# Entries younger than this are used without contacting DataCite.
+DEFAULT_TTL_SECONDS = 24 * 60 * 60
+
+# Total size of cached response bodies above which least recently used entries are evicted.
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# Eviction frees space down to this fraction of the size cap, so that it runs once per many stored entries.
+EVICTION_TARGET = 0.9
+
+
+class ResponseCache:
+    """ A thread-safe DOI -> response cache.  In offline mode, callers should serve only cached entries. """
+
+    def __init__(self, cacheDir, ttlSeconds=DEFAULT_TTL_SECONDS, maxBytes=DEFAULT_MAX_BYTES, offline=False):
+        os.makedirs(cacheDir, exist_ok=True)
+        self.ttlSeconds = ttlSeconds
+        self.maxBytes = maxBytes
+        self.offline = offline
+        self._lock = threading.Lock()
+        # Times entries were last read, by DOI key, not yet written to the database.
+        self._pendingLastUsed = {}
+        self._connection = sqlite3.connect(os.path.join(cacheDir, CACHE_FILE_NAME), check_same_thread=False)
+        self._connection.execute('CREATE TABLE IF NOT EXISTS responses ('
+                                 'doi TEXT PRIMARY KEY, body TEXT, etag TEXT, lastModified TEXT, '
+                                 'fetchedAt REAL, lastUsed REAL, size INTEGER)')
+        self._connection.execute('CREATE INDEX IF NOT EXISTS responsesByLastUsed ON responses (lastUsed)')
+        self._connection.commit()
+        self._totalBytes = self._connection.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+    def get(self, doi):
+        """ Return the cached entry for a DOI as a dictionary, or None.  The entry becomes the most recently used. """
+        key = doi.lower()
+        with self._lock:
+            row = self._connection.execute('SELECT body, etag, lastModified, fetchedAt FROM responses WHERE doi = ?',
+                                           (key,)).fetchone()
+            if row is None:
+                return None
+            self._pendingLastUsed[key] = time.time()
+        body, etag, lastModified, fetchedAt = row
+        return {'body': body, 'etag': etag, 'lastModified': lastModified, 'fetchedAt': fetchedAt}
+
+    def isFresh(self, entry):
+        """ Return True if an entry is young enough to be used without revalidation. """
+        return time.time() - entry['fetchedAt'] < self.ttlSeconds
+
+    def put(self, doi, body, etag=None, lastModified=None):
+        """ Store a response body for a DOI, then evict least recently used entries if the cache is too large. """
+        key = doi.lower()
+        size = len(body.encode('utf-8'))
+        now = time.time()
+        with self._lock:
+            self._pendingLastUsed.pop(key, None)
+            self._writeLastUsed()
+            row = self._connection.execute('SELECT size FROM responses WHERE doi = ?', (key,)).fetchone()
+            self._connection.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                     (key, body, etag, lastModified, now, now, size))
+            self._totalBytes += size - (row[0] if row else 0)
+            if self._totalBytes > self.maxBytes:
+                self._evict()
+            self._connection.commit()
+
+    def markRevalidated(self, doi):
+        """ Restart the TTL of an entry that the server reported as unchanged. """
+        with self._lock:
+            self._writeLastUsed()
+            self._connection.execute('UPDATE responses SET fetchedAt = ? WHERE doi = ?', (time.time(), doi.lower()))
+            self._connection.commit()
+
+    def getTotalBytes(self):
+        """ Return the total size of the cached response bodies, in UTF-8 bytes. """
+        with self._lock:
+            return self._totalBytes
+
+    def close(self):
+        """ Write the times entries were last read, and close the database. """
+        with self._lock:
+            self._writeLastUsed()
+            self._connection.commit()
+            self._connection.close()
+
+    def _writeLastUsed(self):
+        """ Write the times entries were last read into the current transaction.  Call with the lock held. """
+        if self._pendingLastUsed:
+            self._connection.executemany('UPDATE responses SET lastUsed = ? WHERE doi = ?',
+                                         [(lastUsed, key) for key, lastUsed in self._pendingLastUsed.items()])
+            self._pendingLastUsed.clear()
+
+    def _evict(self):
+        """ Delete least recently used entries until the total size is within EVICTION_TARGET of maxBytes.
+            Call with the lock held.
+        """
+        targetBytes = self.maxBytes * EVICTION_TARGET
+        evictedKeys = []
+        for key, size in self._connection.execute('SELECT doi, size FROM responses ORDER BY lastUsed'):
+            if self._totalBytes <= targetBytes:
+                break
+            evictedKeys.append((key,))
+            self._totalBytes -= size
+        self._connection.executemany('DELETE FROM responses WHERE doi = ?', evictedKeys)
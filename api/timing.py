@@ -0,0 +1,154 @@
+#
+#  Optional per-stage timing of translation runs.
+#
+#  Instrumented code brackets each stage like this:
+#
+#      startTime = timing.startStage()
+#      ... stage work ...
+#      startTime = timing.endStage('stageName', startTime)
+#
+#  When timing is disabled, startStage and endStage return None immediately, so the overhead is two function
+#  calls per stage.
+#
+import heapq
+import json
+import sys
+import time
+from array import array
+
+# Stage names, in the order they happen for one record.
+STAGES = ['read', 'decode', 'template', 'required', 'recommended', 'optional', 'serialize', 'serialize+write']
+
+_enabled = False
+_slowestCount = 10
+
+# Per-stage durations in seconds, one entry per record that went through the stage.
+_stageTimes = {}
+
+# Min-heap of (seconds, recordName, shape) holding the slowest records seen so far.
+_slowestRecords = []
+
+
+def enable(slowestCount=10):
+    """ Turn on timing, keeping the slowestCount slowest records. """
+    global _enabled, _slowestCount
+    _enabled = True
+    _slowestCount = slowestCount
+
+
+def isEnabled():
+    return _enabled
+
+
+def reset():
+    """ Forget all collected timings. """
+    _stageTimes.clear()
+    del _slowestRecords[:]
+
+
+def startStage():
+    """ Return the start time of a stage, or None if timing is disabled. """
+    if not _enabled:
+        return None
+    return time.perf_counter()
+
+
+def endStage(stage, startTime):
+    """ Record the time since startTime for a stage, and return the current time as the start of the next stage. """
+    if startTime is None:
+        return None
+    endTime = time.perf_counter()
+    stageTimes = _stageTimes.get(stage)
+    if stageTimes is None:
+        stageTimes = _stageTimes[stage] = array('d')
+    stageTimes.append(endTime - startTime)
+    return endTime
+
+
+def getRecordShape(record, inputSize):
+    """ Return the sizes that most affect translation time for a DSET record. """
+    return {'authors': len(record.get('author', [])),
+            'keywords': len(record.get('keywords', [])),
+            'inputBytes': inputSize}
+
+
+def endRecord(recordName, shape, startTime):
+    """ Record the total time of one record, keeping it if it is among the slowest. """
+    if startTime is None:
+        return
+    recordTime = time.perf_counter() - startTime
+    entry = (recordTime, recordName, shape)
+    if len(_slowestRecords) < _slowestCount:
+        heapq.heappush(_slowestRecords, entry)
+    elif recordTime > _slowestRecords[0][0]:
+        heapq.heapreplace(_slowestRecords, entry)
+
+
+def getSnapshot():
+    """ Return the collected timings in a form that can be sent between processes. """
+    return {'stageTimes': {stage: stageTimes.tobytes() for stage, stageTimes in _stageTimes.items()},
+            'slowestRecords': list(_slowestRecords)}
+
+
+def mergeSnapshot(snapshot):
+    """ Add timings collected by another process. """
+    for stage, stageBytes in snapshot['stageTimes'].items():
+        stageTimes = _stageTimes.get(stage)
+        if stageTimes is None:
+            stageTimes = _stageTimes[stage] = array('d')
+        stageTimes.frombytes(stageBytes)
+    for recordTime, recordName, shape in snapshot['slowestRecords']:
+        entry = (recordTime, recordName, shape)
+        if len(_slowestRecords) < _slowestCount:
+            heapq.heappush(_slowestRecords, entry)
+        elif recordTime > _slowestRecords[0][0]:
+            heapq.heapreplace(_slowestRecords, entry)
+
+
+def getPercentile(sortedTimes, percent):
+    """ Return the nearest-rank percentile of a sorted sequence. """
+    rank = max(0, min(len(sortedTimes) - 1, int(round(percent / 100.0 * len(sortedTimes))) - 1))
+    return sortedTimes[rank]
+
+
+def getStatistics():
+    """ Return per-stage totals and latency percentiles in seconds, and the slowest records. """
+    stageNames = [stage for stage in STAGES if stage in _stageTimes]
+    stageNames += sorted(stage for stage in _stageTimes if stage not in STAGES)
+
+    stages = {}
+    for stage in stageNames:
+        sortedTimes = sorted(_stageTimes[stage])
+        stages[stage] = {'count': len(sortedTimes),
+                         'total': sum(sortedTimes),
+                         'p50': getPercentile(sortedTimes, 50),
+                         'p90': getPercentile(sortedTimes, 90),
+                         'p99': getPercentile(sortedTimes, 99),
+                         'max': sortedTimes[-1]}
+
+    slowestRecords = [{'record': recordName, 'seconds': recordTime, 'shape': shape}
+                      for recordTime, recordName, shape in sorted(_slowestRecords, reverse=True)]
+    return {'stages': stages, 'slowestRecords': slowestRecords}
+
+
+def writeReport(statsFilePath=None):
+    """ Print per-stage statistics and the slowest records to stderr, or write them to a JSON stats file. """
+    statistics = getStatistics()
+    if statsFilePath:
+        with open(statsFilePath, 'w') as statsFile:
+            json.dump(statistics, statsFile, indent=2)
+        return
+
+    print('%-16s %8s %10s %9s %9s %9s %9s' % ('stage', 'count', 'total s', 'p50 ms', 'p90 ms', 'p99 ms', 'max ms'),
+          file=sys.stderr)
+    for stage, stats in statistics['stages'].items():
+        print('%-16s %8d %10.3f %9.3f %9.3f %9.3f %9.3f' %
+              (stage, stats['count'], stats['total'], 1000 * stats['p50'], 1000 * stats['p90'],
+               1000 * stats['p99'], 1000 * stats['max']), file=sys.stderr)
+
+    print('Slowest records:', file=sys.stderr)
+    for slowRecord in statistics['slowestRecords']:
+        shape = slowRecord['shape']
+        print('  %9.3f ms  %s  (authors=%d, keywords=%d, inputBytes=%d)' %
+              (1000 * slowRecord['seconds'], slowRecord['record'], shape['authors'], shape['keywords'],
+               shape['inputBytes']), file=sys.stderr)
@@ -1,9 +1,20 @@
+import heapq
+import os.path
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime
 
+import api.harvest as harvest
+import api.inputjson as inputjson
+import api.output as output
+import api.ratelimit as ratelimit
 import api.util.xml as xml
 import api.util.iso19139 as iso
 
+# DOI fetches in flight or waiting for a retry, per fetching thread, with translateDataCiteDOIs.
+FETCHES_PER_THREAD = 4
+
 roleMappingDataCiteToISO = {
     "Creator": "author",
     "Publisher": "publisher",
@@ -55,30 +66,129 @@ parentXPaths = {
     'temporalExtentCutElement': '/gmd:MD_Metadata/gmd:identificationInfo/gmd:MD_DataIdentification/gmd:extent/gmd:EX_Extent/gmd:temporalElement',
 }
 
+# Compile the XPaths above once, at import time.
+xml.registerXPaths(parentXPaths)
 
-def translateDataCiteRecords():
-    """ batch translate DataCite Records and save to output directory. """
+# Template elements located by the translation.  They are resolved once per template into a slot plan.
+slotTables = {'datacite': parentXPaths}
 
-    # Get records
-    records = getDataCiteRecords()
 
+def translateDataCiteRecords(prefix, templateFile, outputDir, apiURL=harvest.DATACITE_API_URL, session=None,
+                             limiter=None):
+    """ Harvest all DataCite records for a DOI prefix, translate each page of records as it arrives,
+        and save the ISO records to an output directory.  Return (translatedCount, failedDOIs).
+    """
     print("##", file=sys.stderr)
-    print(("## Translating " + str(len(records)) + " Records..."), file=sys.stderr)
+    print(("## Translating Records for DOI prefix " + prefix + "..."), file=sys.stderr)
     print("##", file=sys.stderr)
 
-    # Loop over DataCite Records
-    for record in records:
-        xmlOutput = translateDataCiteRecord(record)
+    translatedCount = 0
+    failedDOIs = []
+    for records in harvest.getDataCitePrefixPages(prefix, session, apiURL, limiter=limiter):
+        # Loop over DataCite Records
+        for record in records:
+            attributes = record['attributes']
+            recordID = attributes['doi']
+            try:
+                translateDataCiteRecordToFile(attributes, templateFile, outputDir)
+            except Exception as error:
+                print(("  Failed to translate DOI " + recordID + ": " + repr(error)), file=sys.stderr)
+                failedDOIs.append(recordID)
+                continue
+            translatedCount += 1
+
+        print(("  Translated " + str(translatedCount) + " Records."), file=sys.stderr)
+
+    print('...Finished Translating Records.', file=sys.stderr)
+    return translatedCount, failedDOIs
 
-        # Isolate the second part of a DOI identifier for the output file name
-        uniqueID = recordID.split('/')[1]
 
-        outputFilePath = 'defaultOutputRecords/' + uniqueID + '.xml'
-        f = open(outputFilePath, 'w')
-        f.write(xmlOutput)
-        f.close()
+def translateDataCiteDOIs(dois, templateFile, outputDir, jobs, cache=None, apiURL=inputjson.DATACITE_DOI_URL,
+                          limiter=None):
+    """ Fetch the DataCite records for a list of DOIs using a pool of `jobs` threads, and save each ISO record to
+        an output directory.  Records are translated in the calling thread as soon as they arrive, while other
+        fetches are still in flight.  Return (translatedCount, failures), where failures is a list of
+        (doi, errorMessage) tuples in the order of the given DOIs.
 
-    print('...Finished Translating Records.', file=sys.stderr)
+        Fetches are paced by a RateLimiter shared by all threads.  Throttled and temporarily failed fetches are
+        put in a retry queue until their backoff delay has passed, so that no thread sits idle while waiting.
+        At most jobs * FETCHES_PER_THREAD DOIs are in flight or waiting for a retry at a time, so memory use does
+        not grow with the length of the DOI list.
+    """
+    if limiter is None:
+        limiter = ratelimit.RateLimiter()
+    session = harvest.getDataCiteSession(poolSize=jobs)
+    translatedCount = 0
+    failures = {}
+    retryQueue = []     # heap of (retry time, DOI, attempt number)
+    # Output file names written so far, so that DOIs with the same suffix in different prefixes do not collide.
+    usedNames = set()
+    remainingDOIs = iter(dois)
+    maxFetches = jobs * FETCHES_PER_THREAD
+    with ThreadPoolExecutor(max_workers=jobs) as fetchers:
+        futures = {}
+
+        def submitFetch(doi, attempt):
+            future = fetchers.submit(inputjson.getDataCiteRecords, doi, cache, session, apiURL, limiter)
+            futures[future] = (doi, attempt)
+
+        def submitNewFetches():
+            while len(futures) + len(retryQueue) < maxFetches:
+                doi = next(remainingDOIs, None)
+                if doi is None:
+                    return
+                submitFetch(doi, 0)
+
+        submitNewFetches()
+        while futures or retryQueue:
+            # Resubmit the fetches whose backoff delay has passed.
+            now = time.monotonic()
+            while retryQueue and retryQueue[0][0] <= now:
+                retryTime, doi, attempt = heapq.heappop(retryQueue)
+                submitFetch(doi, attempt)
+            timeout = retryQueue[0][0] - now if retryQueue else None
+            if not futures:
+                time.sleep(timeout)
+                continue
+
+            doneFutures, pendingFutures = wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in doneFutures:
+                doi, attempt = futures.pop(future)
+                try:
+                    record = future.result()
+                    if not record:
+                        raise LookupError('DOI was not found')
+                    translateDataCiteRecordToFile(record, templateFile, outputDir, usedNames)
+                    translatedCount += 1
+                except Exception as error:
+                    if isinstance(error, ratelimit.RetryableError) and attempt < limiter.maxRetries:
+                        retryTime = time.monotonic() + limiter.getRetryDelay(attempt, error.retryAfter)
+                        heapq.heappush(retryQueue, (retryTime, doi, attempt + 1))
+                        continue
+                    failures[doi] = '%s: %s' % (type(error).__name__, error)
+                    print(("  Failed to translate DOI " + doi + ": " + failures[doi]), file=sys.stderr)
+            submitNewFetches()
+
+    return translatedCount, [(doi, failures[doi]) for doi in dois if doi in failures]
+
+
+def translateDataCiteRecordToFile(record, templateFile, outputDir, usedNames=None):
+    """ Translate a single DataCite record and save it to an output directory, in a file named by the DOI suffix.
+        If usedNames, the set of file names already written, is given, a DOI whose suffix names an earlier file
+        gets a numeric suffix instead of overwriting it, with a warning.  Return the output file path.
+    """
+    xmlOutput = translateDataCiteRecord(record, templateFile)
+
+    # Isolate the second part of a DOI identifier for the output file name
+    uniqueID = record['doi'].split('/', 1)[-1]
+
+    outputFilePath = output.prepareOutputFileForID(uniqueID, outputDir, usedNames)
+    if os.path.basename(outputFilePath) != output.getFileNameForID(uniqueID) + '.xml':
+        print(("  Warning: DOI " + record['doi'] + " has the file name of an earlier DOI; writing " + outputFilePath),
+              file=sys.stderr)
+    with open(outputFilePath, 'w') as f:
+        f.write(xmlOutput)
+    return outputFilePath
 
 
 def translateDataCiteRecord(record, templateFile):
@@ -91,46 +201,46 @@ def translateDataCiteRecord(record, templateFile):
 
 
 def transformDataCiteToISO(record, templateFileISO, roleMapping):
-    # Load the ISO template file as an XML element tree
-    root = xml.getXMLTree(templateFileISO)
+    # Get a private copy of the ISO template file as an XML element tree, with the elements named in parentXPaths
+    root, slots = xml.getTemplateCopyWithSlots(templateFileISO, 'datacite', slotTables)
+    slots = slots['datacite']
 
     # Put DOI in fileIdentifier
     assert 'doi' in record
-    xml.setElementValue(root, parentXPaths['fileIdentifier'], record['doi'])
+    xml.setElementValue(root, slots['fileIdentifier'], record['doi'])
 
     # Put current time in dateStamp
     currentTime = datetime.now().isoformat()
-    xml.setElementValue(root, parentXPaths['metadataDate'], currentTime)
+    xml.setElementValue(root, slots['metadataDate'], currentTime)
 
     # Put resourceTypeGeneral in hierarchyLevelName
     assert 'resourceTypeGeneral' in record['types']
-    xml.setElementValue(root, parentXPaths['resourceType'], record['types']['resourceTypeGeneral'])
+    xml.setElementValue(root, slots['resourceType'], record['types']['resourceTypeGeneral'])
 
     # Put title in title
     assert 'title' in record['titles'][0]
     titleValue = record['titles'][0]['title']
-    xml.setElementValue(root, parentXPaths['title'], titleValue)
+    xml.setElementValue(root, slots['title'], titleValue)
 
     # Put description in abstract
     if 'description' in record['descriptions'][0]:
-        fullXPath = parentXPaths['abstract'] + '/gco:CharacterString'
         descriptionValue = record['descriptions'][0]['description']
-        xml.setElementValue(root, fullXPath, descriptionValue)
+        xml.setElementValue(slots['abstract'], 'gco:CharacterString', descriptionValue)
     else:
-        xml.cutElement(parentXPaths['abstract'])
+        xml.cutElement(root, slots['abstract'])
 
     # Put rights in legalConstraints
     if 'rightsList' in record and len(record['rightsList']) > 0:
         legalRightsText, accessRightsText = getRightsText(record['rightsList'])
-        xml.setElementValue(root, parentXPaths['legalConstraints'], legalRightsText)
-        xml.setElementValue(root, parentXPaths['accessConstraints'], accessRightsText)
+        xml.setElementValue(root, slots['legalConstraints'], legalRightsText)
+        xml.setElementValue(root, slots['accessConstraints'], accessRightsText)
 
     # Put publicationYear in CI_Citation/date
-    xml.setElementValue(root, parentXPaths['publicationDate'], record["publicationYear"])
+    xml.setElementValue(root, slots['publicationDate'], record["publicationYear"])
 
     # Make DOI URL the Landing Page
     url = "https://doi.org/" + record["doi"]
-    xml.setElementValue(root, parentXPaths['landingPage'], url)
+    xml.setElementValue(root, slots['landingPage'], url)
 
     # Add relatedIdentifier as online resource if it is a URL
     relatedIdentifierList = record.get("relatedIdentifiers", [])
@@ -138,7 +248,7 @@ def transformDataCiteToISO(record, templateFileISO, roleMapping):
     relatedLinks = []
     for url in relatedURLs:
         relatedLinks.append({"name": "Unknown URL title", "linkage": url, "description": "Unknown URL description"})
-    iso.addRelatedLinks(root, parentXPaths['relatedLink'], relatedLinks)
+    iso.addRelatedLinks(root, slots['relatedLink'], relatedLinks)
 
     # Add "subject" keywords.  Fill existing element first, then create copies.   If no keywords are present, cut XML element.
     keywords = []
@@ -146,14 +256,14 @@ def transformDataCiteToISO(record, templateFileISO, roleMapping):
         keywords = [s['subject'] for s in record['subjects']]
 
     # Call this even if keywords are empty, so any unpopulated keyword XML elements are removed. 
-    iso.addKeywords(root, parentXPaths['keyword'], keywords)
+    iso.addKeywords(root, slots['keyword'], keywords)
 
     formats = []
     if 'formats' in record:
         formats = record['formats']
 
     # Call this even if no formats exist, so the template XML element for resourceFormat is removed.
-    createResourceFormats(formats, root)
+    createResourceFormats(formats, root, slots['resourceFormat'])
 
     # Create list of cited contacts from three keys: "creators", "publisher", and "contributors".
     # Also obtain a list of support contacts from "contributors".
@@ -171,13 +281,13 @@ def transformDataCiteToISO(record, templateFileISO, roleMapping):
         metadataContacts = []
 
     # Fill in cited contacts.
-    createResponsibleParties(root, parentXPaths['citedContact'], citedContacts)
+    createResponsibleParties(root, slots['citedContact'], citedContacts)
 
     # Fill in Resource Support contacts.
-    createResponsibleParties(root, parentXPaths['supportContact'], supportContacts)
+    createResponsibleParties(root, slots['supportContact'], supportContacts)
 
     # Fill in Metadata contacts.
-    createResponsibleParties(root, parentXPaths['metadataContact'], metadataContacts)
+    createResponsibleParties(root, slots['metadataContact'], metadataContacts)
 
     # Fill in geographical bounding box if provided. Otherwise, delete the empty XML element to keep the XML valid.
     if ('geoLocations' in record) and (len(record['geoLocations']) > 0) and (
@@ -188,9 +298,9 @@ def transformDataCiteToISO(record, templateFileISO, roleMapping):
                     'north': bbox['northBoundLatitude'],
                     'south': bbox['southBoundLatitude']
                     }
-        iso.modifyBoundingBox(root, parentXPaths['geoExtent'], bbox_new)
+        iso.modifyBoundingBox(root, slots['geoExtent'], bbox_new)
     else:
-        xml.cutElement(root, parentXPaths['geoExtentCutElement'])
+        xml.cutElement(root, slots['geoExtentCutElement'])
 
     # Fill in temporal extent if provided.  Otherwise, delete the empty XML element to keep the XML valid.
     temporalExtentExists = False
@@ -199,10 +309,10 @@ def transformDataCiteToISO(record, templateFileISO, roleMapping):
         if beginDate or endDate:
             temporalExtentExists = True
             extentRecord = {'start': beginDate, 'end': endDate}
-            iso.modifyTemporalExtent(root, parentXPaths['temporalExtent'], extentRecord)
+            iso.modifyTemporalExtent(root, slots['temporalExtent'], extentRecord)
 
     if not temporalExtentExists:
-        xml.cutElement(root, parentXPaths['temporalExtentCutElement'])
+        xml.cutElement(root, slots['temporalExtentCutElement'])
 
     # Return ISO record and record identifier
     recordAsISO = xml.toString(root)
@@ -314,23 +424,13 @@ def getRightsText(rightsList):
 def createResponsibleParties(root, contactXPath, contactList):
     """ Insert XML elements for a list of contact records. """
     contactTemplate, contactParent, contactIndex = xml.cutElement(root, contactXPath, True)
-    insertCounter = 0
-    for contactRecord in contactList:
-        contactElement = xml.copyElement(contactTemplate)
-        iso.modifyContactDataSelectively(contactElement, contactRecord)
-        contactParent.insert(contactIndex + insertCounter, contactElement)
-        insertCounter += 1
+    xml.insertCopies(contactTemplate, contactParent, contactIndex, contactList, iso.modifyContactDataSelectively)
 
 
-def createResourceFormats(formats, root):
+def createResourceFormats(formats, root, formatXPath=parentXPaths['resourceFormat']):
     """
     Given a list of format strings and an XML tree, insert a ResourceFormat element for each format string.
     """
-    emptyElement, parent, originalIndex = xml.cutElement(root, parentXPaths['resourceFormat'], True)
-    indexCounter = 0
-    for format in formats:
-        elementCopy = xml.copyElement(emptyElement)
-        xml.setElementValue(elementCopy, 'gmd:MD_Format/gmd:name/gco:CharacterString', format)
-        # "version" entry is optional
-        parent.insert(originalIndex + indexCounter, elementCopy)
-        indexCounter += 1
+    emptyElement, parent, originalIndex = xml.cutElement(root, formatXPath, True)
+    xml.insertCopies(emptyElement, parent, originalIndex, formats,
+                     lambda elementCopy, format: xml.setElementValue(elementCopy, 'gmd:MD_Format/gmd:name/gco:CharacterString', format))
@@ -5,22 +5,51 @@ from api.translate.dset_tiers.required    import transformRequiredFields
 from api.translate.dset_tiers.recommended import transformRecommendedFields
 from api.translate.dset_tiers.optional    import transformOptionalFields
 
+import api.translate.dset_tiers.required    as required
+import api.translate.dset_tiers.recommended as recommended
+import api.translate.dset_tiers.optional    as optional
+
+import api.timing as timing
 import api.util.xml as xml
 
+# Template elements located by each tier.  They are resolved once per template into a slot plan.
+slotTables = {
+    'required'    : required.parentXPaths,
+    'recommended' : recommended.parentXPaths,
+    'optional'    : optional.parentXPaths,
+}
 
-def transformDSETToISO(record, pathToTemplateFileISO):
-    """ Transform a JSON record to ISO 19139 XML using a XML template file. """
-    root = xml.getXMLTree(pathToTemplateFileISO)
 
-    root = transformRequiredFields(root, record)
+def compileTemplate(pathToTemplateFileISO, stripTemplate=False):
+    """ Parse a template and compile its slot plan, raising ValueError if the template is missing any slot. """
+    xml.getTemplateCopyWithSlots(pathToTemplateFileISO, 'dset', slotTables, stripTemplate)
 
-    root = transformRecommendedFields(root, record)
 
-    root = transformOptionalFields(root, record)
+def transformDSETToISOTree(record, pathToTemplateFileISO, stripTemplate=False):
+    """ Transform a JSON record to an ISO 19139 XML element tree using a XML template file.
+        If stripTemplate is True, the template's comments and whitespace-only text are removed when it is loaded.
+    """
+    startTime = timing.startStage()
+    root, slots = xml.getTemplateCopyWithSlots(pathToTemplateFileISO, 'dset', slotTables, stripTemplate)
+    startTime = timing.endStage('template', startTime)
 
-    recordAsISO = xml.toString(root)
-    return recordAsISO
+    root = transformRequiredFields(root, record, slots['required'])
+    startTime = timing.endStage('required', startTime)
+
+    root = transformRecommendedFields(root, record, slots['recommended'])
+    startTime = timing.endStage('recommended', startTime)
 
+    root = transformOptionalFields(root, record, slots['optional'])
+    timing.endStage('optional', startTime)
 
+    return root
 
 
+def transformDSETToISO(record, pathToTemplateFileISO, prettyPrint=True, stripTemplate=False):
+    """ Transform a JSON record to ISO 19139 XML using a XML template file. """
+    root = transformDSETToISOTree(record, pathToTemplateFileISO, stripTemplate)
+
+    startTime = timing.startStage()
+    recordAsISO = xml.toString(root, prettyPrint)
+    timing.endStage('serialize', startTime)
+    return recordAsISO
@@ -7,6 +7,7 @@ parentXPaths = {
      'alternateTitle'      : '/gmd:MD_Metadata/gmd:identificationInfo/gmd:MD_DataIdentification/gmd:citation/gmd:CI_Citation/gmd:alternateTitle',
      'resourceVersion'     : '/gmd:MD_Metadata/gmd:identificationInfo/gmd:MD_DataIdentification/gmd:citation/gmd:CI_Citation/gmd:edition',
      'progressCode'        : '/gmd:MD_Metadata/gmd:identificationInfo/gmd:MD_DataIdentification/gmd:status/gmd:MD_ProgressCode',
+     'progressStatus'      : '/gmd:MD_Metadata/gmd:identificationInfo/gmd:MD_DataIdentification/gmd:status',
      'resourceFormat'      : '/gmd:MD_Metadata/gmd:identificationInfo/gmd:MD_DataIdentification/gmd:resourceFormat',
      'softwareLanguage'    : '/gmd:MD_Metadata/gmd:identificationInfo/gmd:MD_DataIdentification/gmd:environmentDescription/gco:CharacterString',
      'additionalInfo'      : '/gmd:MD_Metadata/gmd:identificationInfo/gmd:MD_DataIdentification/gmd:supplementalInformation',
@@ -15,95 +16,88 @@ parentXPaths = {
      'assetSize'           : '/gmd:MD_Metadata/gmd:distributionInfo/gmd:MD_Distribution/gmd:transferOptions',
 }
 
+# Compile the XPaths above once, at import time.
+xml.registerXPaths(parentXPaths)
 
-def transformOptionalFields(root, record):
+
+def transformOptionalFields(root, record, slots):
 
     # //OPTIONAL FIELDS
     # - Related Link: repeatable
     if 'related_link' in record:
-        iso.addRelatedLinks(root, parentXPaths['relatedLink'], record['related_link'])
+        iso.addRelatedLinks(root, slots['relatedLink'], record['related_link'])
     else:
-        xml.cutElement(root, parentXPaths['relatedLink'])
+        xml.cutElement(root, slots['relatedLink'])
 
     # - Alternate Identifier: repeatable
     if 'alternate_identifier' in record:
-        emptyElement, parent, originalIndex = xml.cutElement(root, parentXPaths['alternateTitle'], True)
-        indexCounter = 0
-        for title in record['alternate_identifier']:
-            elementCopy = xml.copyElement(emptyElement)
-            xml.setElementValue(elementCopy, 'gco:CharacterString', title)
-            parent.insert(originalIndex + indexCounter, elementCopy)
-            indexCounter += 1
+        emptyElement, parent, originalIndex = xml.cutElement(root, slots['alternateTitle'], True)
+        xml.insertCopies(emptyElement, parent, originalIndex, record['alternate_identifier'],
+                         lambda elementCopy, title: xml.setElementValue(elementCopy, 'gco:CharacterString', title))
     else:
-        xml.cutElement(root, parentXPaths['alternateTitle'])
+        xml.cutElement(root, slots['alternateTitle'])
 
     # - Resource Version: not repeatable
     if 'resource_version' in record:
-        fullXPath = parentXPaths['resourceVersion'] + '/gco:CharacterString'
-        xml.setElementValue(root, fullXPath, record['resource_version'])
+        xml.setElementValue(slots['resourceVersion'], 'gco:CharacterString', record['resource_version'])
     else:
-        xml.cutElement(root, parentXPaths['resourceVersion'])
+        xml.cutElement(root, slots['resourceVersion'])
 
     # - Progress: not repeatable
     if 'progress' in record:
-        xml.setElementValue(root, parentXPaths['progressCode'], record['progress'], True)
+        xml.setElementValue(root, slots['progressCode'], record['progress'], True)
     else:
-        xml.cutElement(root, parentXPaths['resourceVersion'])
+        xml.cutElement(root, slots['progressStatus'])
 
     # - Resource Format: repeatable
     if 'resource_format' in record:
-        emptyElement, parent, originalIndex = xml.cutElement(root, parentXPaths['resourceFormat'], True)
-        indexCounter = 0
-        for format in record['resource_format']:
-            elementCopy = xml.copyElement(emptyElement)
+        emptyElement, parent, originalIndex = xml.cutElement(root, slots['resourceFormat'], True)
+
+        def fillResourceFormat(elementCopy, format):
             xml.setElementValue(elementCopy, 'gmd:MD_Format/gmd:name/gco:CharacterString', format['name'])
             # "version" entry is optional
             xml.setElementValue(elementCopy, 'gmd:MD_Format/gmd:version/gco:CharacterString', format.get('version', ''))
-            parent.insert(originalIndex + indexCounter, elementCopy)
-            indexCounter += 1
+
+        xml.insertCopies(emptyElement, parent, originalIndex, record['resource_format'], fillResourceFormat)
     else:
-        xml.cutElement(root, parentXPaths['resourceFormat'])
+        xml.cutElement(root, slots['resourceFormat'])
 
     # - Software Implementation Language: not repeatable
     if 'software_implementation_language' in record:
-        languageElement = xml.getElement(root, parentXPaths['softwareLanguage'])
+        languageElement = xml.getElement(root, slots['softwareLanguage'])
         xml.setTextOrMarkMissing(languageElement, record['software_implementation_language'])
     else:
-        xml.cutElement(root, parentXPaths['softwareLanguage'])
+        xml.cutElement(root, slots['softwareLanguage'])
 
     # - Additional Information: not repeatable
     if 'additional_information' in record:
-        informationElement = xml.getElement(root, parentXPaths['additionalInfo'])
+        informationElement = xml.getElement(root, slots['additionalInfo'])
         xml.setElementValue(informationElement, 'gco:CharacterString', record['additional_information'])
     else:
-        xml.cutElement(root, parentXPaths['additionalInfo'])
+        xml.cutElement(root, slots['additionalInfo'])
 
     # - Distributor: not repeatable
     if 'distributor' in record:
-        distributorElement = xml.getElement(root, parentXPaths['distributor'])
+        distributorElement = xml.getElement(root, slots['distributor'])
         contactElement = xml.getElement(distributorElement, 'gmd:MD_Distributor/gmd:distributorContact/gmd:CI_ResponsibleParty')
         iso.modifyContactData(contactElement, record['distributor'], 'distributor')
     else:
-        xml.cutElement(root, parentXPaths['distributor'])
+        xml.cutElement(root, slots['distributor'])
 
     # - Distribution Format: repeatable
     if 'distribution_format' in record:
-        emptyElement, parent, originalIndex = xml.cutElement(root, parentXPaths['distributionFormat'], True)
-        indexCounter = 0
-        for format in record['distribution_format']:
-            elementCopy = xml.copyElement(emptyElement)
-            xml.setElementValue(elementCopy, 'gmd:MD_Format/gmd:name/gco:CharacterString', format)
-            parent.insert(originalIndex + indexCounter, elementCopy)
-            indexCounter += 1
+        emptyElement, parent, originalIndex = xml.cutElement(root, slots['distributionFormat'], True)
+        xml.insertCopies(emptyElement, parent, originalIndex, record['distribution_format'],
+                         lambda elementCopy, format: xml.setElementValue(elementCopy, 'gmd:MD_Format/gmd:name/gco:CharacterString', format))
     else:
-        xml.cutElement(root, parentXPaths['distributionFormat'])
+        xml.cutElement(root, slots['distributionFormat'])
 
     # - Asset Size: not repeatable
     if 'asset_size_MB' in record:
-        sizeElement = xml.getElement(root, parentXPaths['assetSize'])
+        sizeElement = xml.getElement(root, slots['assetSize'])
         xml.setElementValue(sizeElement, 'gmd:MD_DigitalTransferOptions/gmd:transferSize/gco:Real', record['asset_size_MB'])
     else:
-        xml.cutElement(root, parentXPaths['assetSize'])
+        xml.cutElement(root, slots['assetSize'])
 
     # - Author Identifier: currently not well defined for "old ISO".
 
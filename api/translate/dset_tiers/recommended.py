@@ -19,34 +19,32 @@ parentXPaths = {
      'temporalResolution'  : '/gmd:MD_Metadata/gmd:identificationInfo/gmd:MD_DataIdentification/gmd:extent/gmd:EX_Extent/gmd:description/gco:CharacterString',
 }
 
+# Compile the XPaths above once, at import time.
+xml.registerXPaths(parentXPaths)
 
-def transformRecommendedFields(root, record):
+
+def transformRecommendedFields(root, record, slots):
 
     # - Other Responsible Individual/Organization: repeatable
     if 'other_responsible_party' in record:
-        for party in record['other_responsible_party']:
-            iso.appendContactData(root, parentXPaths['citedContact'], party)
+        iso.appendContactList(root, parentXPaths['citedContact'], record['other_responsible_party'])
 
     # - Citation: not repeatable
     if 'citation' in record:
-        element = xml.setElementValue(root, parentXPaths['citation'], record['citation'])
+        element = xml.setElementValue(root, slots['citation'], record['citation'])
 
     # - Science Support Contact: repeatable
     # Note: data for Resource Support Contact information was inserted, so we must preserve existing elements.
     if 'science_support' in record:
-        supportElement, supportParent, originalIndex = xml.cutElement(root, parentXPaths['supportContact'], True)
+        supportElement, supportParent, originalIndex = xml.cutElement(root, slots['supportContact'], True)
         supportParent.insert(originalIndex, supportElement)
-        insertCounter = 1
-        for party in record['science_support']:
-            elementCopy = xml.copyElement(supportElement)
-            iso.modifyContactData(elementCopy, party, 'principalInvestigator')
-            supportParent.insert(originalIndex + insertCounter, elementCopy)
-            insertCounter += 1
+        xml.insertCopies(supportElement, supportParent, originalIndex + 1, record['science_support'],
+                         lambda elementCopy, party: iso.modifyContactData(elementCopy, party, 'principalInvestigator'))
 
 
     # - Keywords: repeatable
     if 'keywords' in record:
-        iso.addKeywords(root, parentXPaths['keyword'], record['keywords'])
+        iso.addKeywords(root, slots['keyword'], record['keywords'])
 
     # - Keyword Vocabulary:   Not included at this point.
     
@@ -56,38 +54,38 @@ def transformRecommendedFields(root, record):
     if 'spatial_representation' in record:
         childXPath = 'gmd:MD_SpatialRepresentationTypeCode'
         setCodeList = True
-        xml.addChildList(root, parentXPaths['spatialRepType'], childXPath, record['spatial_representation'], setCodeList)
+        xml.addChildList(root, slots['spatialRepType'], childXPath, record['spatial_representation'], setCodeList)
     else:
-        xml.cutElement(root, parentXPaths['spatialRepType'])
+        xml.cutElement(root, slots['spatialRepType'])
 
     # - Spatial Resolution: repeatable
     if 'spatial_resolution' in record:
-        iso.addSpatialResolutionDistances(root, parentXPaths['spatialResolution'], record['spatial_resolution'])
+        iso.addSpatialResolutionDistances(root, slots['spatialResolution'], record['spatial_resolution'])
     else:
-        xml.cutElement(root, parentXPaths['spatialResolution'])
+        xml.cutElement(root, slots['spatialResolution'])
 
     # - ISO Topic Category: repeatable
     if 'topic_category' in record:
         childXPath = 'gmd:MD_TopicCategoryCode'
-        xml.addChildList(root, parentXPaths['topicCategory'], childXPath, record['topic_category'])
+        xml.addChildList(root, slots['topicCategory'], childXPath, record['topic_category'])
     else:
-        xml.cutElement(root, parentXPaths['topicCategory'])
+        xml.cutElement(root, slots['topicCategory'])
 
     # - GeoLocation: not repeatable
     if 'geolocation' in record:
-        iso.modifyBoundingBox(root, parentXPaths['geoExtent'], record['geolocation'])
+        iso.modifyBoundingBox(root, slots['geoExtent'], record['geolocation'])
     else:
-        xml.cutElement(root, parentXPaths['geoExtent'])
+        xml.cutElement(root, slots['geoExtent'])
 
     # - Temporal Coverage: not repeatable
     if 'temporal_coverage' in record:
-        iso.modifyTemporalExtent(root, parentXPaths['temporalExtent'], record['temporal_coverage'])
+        iso.modifyTemporalExtent(root, slots['temporalExtent'], record['temporal_coverage'])
     else:
-        xml.cutElement(root, parentXPaths['temporalExtent'])
+        xml.cutElement(root, slots['temporalExtent'])
 
     # - Temporal Resolution: not repeatable
     if 'temporal_resolution' in record:
-        xml.setElementValue(root, parentXPaths['temporalResolution'], record['temporal_resolution'])
+        xml.setElementValue(root, slots['temporalResolution'], record['temporal_resolution'])
 
     # - Vertical Extent: potentially very complicated in ISO 19139; not included at this point. 
 
@@ -20,22 +20,26 @@ parentXPaths = {
     'accessConstraints': '/gmd:MD_Metadata/gmd:identificationInfo/gmd:MD_DataIdentification/gmd:resourceConstraints/gmd:MD_LegalConstraints/gmd:otherConstraints/gco:CharacterString',
 }
 
+# Compile the XPaths above once, at import time.
+xml.registerXPaths(parentXPaths)
 
-def transformRequiredFields(root, record):
+
+def transformRequiredFields(root, record, slots):
     """Transform fields that are required according to the DSET Metadata Dialect.
        Not all required fields must be present in the record because the ISO template may have default values for them.
+       slots maps each key of parentXPaths to its element in root, as resolved by the template's slot plan.
     """
 
     # - Metadata Record ID: not repeatable
     assert 'metadata_id' in record
-    xml.setElementValue(root, parentXPaths['fileIdentifier'], record['metadata_id'])
+    xml.setElementValue(root, slots['fileIdentifier'], record['metadata_id'])
 
     # - ISO Asset Type (default value: dataset): not repeatable
-    xml.setElementValue(root, parentXPaths['assetType'], record['asset_type'], True)
+    xml.setElementValue(root, slots['assetType'], record['asset_type'], True)
 
     # - Metadata Point of Contact: not repeatable
     if 'metadata_contact' in record:
-        element = xml.getElement(root, parentXPaths['metadataContact'])
+        element = xml.getElement(root, slots['metadataContact'])
         iso.modifyContactData(element, record['metadata_contact'], 'pointOfContact')
 
     # - Metadata Date (not repeatable): Use current time if not present in the record. 
@@ -43,31 +47,28 @@ def transformRequiredFields(root, record):
         metadataDate = record['metadata_date']
     else:
         metadataDate = datetime.now().isoformat()
-    xml.setElementValue(root, parentXPaths['metadataDate'], metadataDate)
+    xml.setElementValue(root, slots['metadataDate'], metadataDate)
 
     # - Landing Page: not repeatable
     assert 'landing_page' in record
-    xml.setElementValue(root, parentXPaths['landingPage'], record['landing_page'])
+    xml.setElementValue(root, slots['landingPage'], record['landing_page'])
 
     # - Title: not repeatable
     assert 'title' in record
-    xml.setElementValue(root, parentXPaths['title'], record['title'])
+    xml.setElementValue(root, slots['title'], record['title'])
 
     # - Publication Date: not repeatable
     assert 'publication_date' in record
-    xml.setElementValue(root, parentXPaths['publicationDate'], record['publication_date'])
+    xml.setElementValue(root, slots['publicationDate'], record['publication_date'])
 
     # - Author: repeatable
     assert 'author' in record
     authors = record['author']
-    firstLoopIteration = True
-    for author in authors:
-        if firstLoopIteration:
-            contactElement = xml.getElement(root, parentXPaths['citedContact'])
-            iso.modifyContactData(contactElement, author, 'author')
-        else:
-            iso.appendContactData(root, parentXPaths['citedContact'], author, 'author')
-        firstLoopIteration = False
+    if authors:
+        # The first author fills the template element; the rest are copies of it, inserted in one pass.
+        contactElement = xml.getElement(root, slots['citedContact'])
+        iso.modifyContactData(contactElement, authors[0], 'author')
+        iso.appendContactList(root, parentXPaths['citedContact'], authors[1:], 'author')
 
     # - Publisher: not repeatable
     if 'publisher' in record:
@@ -75,24 +76,24 @@ def transformRequiredFields(root, record):
 
     # - Abstract: not repeatable
     assert 'abstract' in record
-    xml.setElementValue(root, parentXPaths['abstract'], record['abstract'])
+    xml.setElementValue(root, slots['abstract'], record['abstract'])
 
     # - Resource Support Contact: not repeatable
     if 'resource_support' in record:
-        element = xml.getElement(root, parentXPaths['supportContact'])
+        element = xml.getElement(root, slots['supportContact'])
         iso.modifyContactData(element, record['resource_support'], 'pointOfContact')
 
     # - DataCite Resource Type: not repeatable
     if 'resource_type' in record:
-        xml.setElementValue(root, parentXPaths['resourceType'], record['resource_type'])
+        xml.setElementValue(root, slots['resourceType'], record['resource_type'])
 
     # - Legal Constraints: not repeatable
     if 'legal_constraints' in record:
-        xml.setElementValue(root, parentXPaths['legalConstraints'], record['legal_constraints'])
+        xml.setElementValue(root, slots['legalConstraints'], record['legal_constraints'])
 
     # - Access Constraints: not repeatable
     if 'access_constraints' in record:
-        xml.setElementValue(root, parentXPaths['accessConstraints'], record['access_constraints'])
+        xml.setElementValue(root, slots['accessConstraints'], record['access_constraints'])
 
     return root
 
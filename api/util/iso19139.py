@@ -34,6 +34,9 @@ childXPaths =  {
      'relatedLink' : 'gmd:MD_MetadataExtensionInformation/gmd:extensionOnLineResource/gmd:CI_OnlineResource',
    } 
 
+# Compile the XPaths above once, at import time.
+xml.registerXPaths(childXPaths)
+
 #
 #  ISO Element Modification functions
 #
@@ -149,26 +152,32 @@ def modifyContactDataSelectively(contactElement, contactData):
 
 def addSpatialResolutionDistances(xml_root, resolutionXPath, resolutionList):
     """ Append a number of Spatial Resolution "distance" ISO elements. """
-    insertCounter = 0
     resolutionElement, resolutionParent, elementIndex = xml.cutElement(xml_root, resolutionXPath, True)
-    for resolution in resolutionList:
-        elementCopy = xml.copyElement(resolutionElement)
+
+    def fillResolution(elementCopy, resolution):
         distanceElement = xml.getElement(elementCopy, childXPaths['distance'])
         xml.setTextOrMarkMissing(distanceElement, resolution['distance'])
         distanceElement.attrib['uom'] = resolution['units']
-        # Insert element copies back into parent, in order of creation.
-        resolutionParent.insert(elementIndex + insertCounter, elementCopy)
-        insertCounter += 1
+
+    xml.insertCopies(resolutionElement, resolutionParent, elementIndex, resolutionList, fillResolution)
 
 
 def appendContactData(xml_root, contactXPath, contactData, impliedRoleValue = None):
     """ Append a new contact element to a collection of ResponsibleParty elements """
+    appendContactList(xml_root, contactXPath, [contactData], impliedRoleValue)
+
+
+def appendContactList(xml_root, contactXPath, contactList, impliedRoleValue = None):
+    """ Append one new contact element per contact record to a collection of ResponsibleParty elements.
+        The last existing element is located once, and is the prototype for all new elements.
+    """
+    if not contactList:
+        return
     contactElement = xml.getLastElement(xml_root, contactXPath)
     contactParent = contactElement.getparent()
     contactIndex = contactParent.index(contactElement)
-    elementCopy = xml.copyElement(contactElement)
-    modifyContactData(elementCopy, contactData, impliedRoleValue)
-    contactParent.insert(contactIndex + 1, elementCopy)
+    xml.insertCopies(contactElement, contactParent, contactIndex + 1, contactList,
+                     lambda elementCopy, contactData: modifyContactData(elementCopy, contactData, impliedRoleValue))
 
 
 def fixKeywordChars(keyword):
@@ -185,23 +194,19 @@ def addKeywords(xml_root, keywordXPath, keywordList):
         keywordSectionParent = keywordSection.getparent()
         keywordSectionParent.remove(keywordSection)
         return
-    insertCounter = 0
-    for keyword in keywordList:
-        fixedKeyword = fixKeywordChars(keyword)
-        elementCopy = xml.copyElement(keywordElement)
-        xml.setElementValue(elementCopy, childXPaths['string'], fixedKeyword)
-        keywordParent.insert(originalIndex + insertCounter, elementCopy)
-        insertCounter += 1
+
+    def fillKeyword(elementCopy, keyword):
+        xml.setElementValue(elementCopy, childXPaths['string'], fixKeywordChars(keyword))
+
+    xml.insertCopies(keywordElement, keywordParent, originalIndex, keywordList, fillKeyword)
 
 
 def addRelatedLinks(xml_root, relatedLinkXPath, relatedLinks):
     """ Add related link XML elements using a list of related link records. """
     emptyLinkElement, parent, originalIndex = xml.cutElement(xml_root, relatedLinkXPath, True)
-    insertCounter = 0
-    for link in relatedLinks:
-        elementCopy = xml.copyElement(emptyLinkElement)
+
+    def fillRelatedLink(elementCopy, link):
         onlineResourceChild = xml.getElement(elementCopy, childXPaths['relatedLink'])
         modifyOnlineResource(onlineResourceChild, link['linkage'], link['name'], link['description'])
-        parent.insert(originalIndex + insertCounter, elementCopy)
-        insertCounter += 1
 
+    xml.insertCopies(emptyLinkElement, parent, originalIndex, relatedLinks, fillRelatedLink)
@@ -3,6 +3,7 @@
 #
 
 import numbers
+import os
 from lxml import etree as ElementTree       # ISO XML parser
 from copy import deepcopy                   # Allows deep copy of ISO elements
 
@@ -21,16 +22,168 @@ XML_NAMESPACE_MAP = {'gmd': 'http://www.isotc211.org/2005/gmd',
 #
 # Tree-wide operations
 #
-def getXMLTree(templateFilePath):
-    tree = ElementTree.parse(templateFilePath)
+def getXMLTree(templateFilePath, stripTemplate=False):
+    ''' Parse an XML file and return its root element.
+        If stripTemplate is True, comments and whitespace-only text are removed while parsing.
+    '''
+    parser = None
+    if stripTemplate:
+        parser = ElementTree.XMLParser(remove_comments=True, remove_blank_text=True)
+    tree = ElementTree.parse(templateFilePath, parser)
     root = tree.getroot()
     return root
 
 
-def toString(xml_tree):
-    outputString = ElementTree.tostring(xml_tree, encoding='unicode', pretty_print=True)
+# Parsed templates, keyed by absolute path and strip option.  Each entry holds the file's (mtime, size),
+# a pristine root element, and the slot plans compiled against that root, keyed by plan name.
+_templateCache = {}
+
+
+def _getTemplateEntry(templateFilePath, stripTemplate=False):
+    ''' Return the cache entry for a template, parsing the file if it is new or its mtime or size has changed. '''
+    filePath = os.path.abspath(templateFilePath)
+    fileStat = os.stat(filePath)
+    fileVersion = (fileStat.st_mtime_ns, fileStat.st_size)
+
+    cacheKey = (filePath, stripTemplate)
+    cachedEntry = _templateCache.get(cacheKey)
+    if cachedEntry is None or cachedEntry[0] != fileVersion:
+        cachedEntry = (fileVersion, getXMLTree(filePath, stripTemplate), {})
+        _templateCache[cacheKey] = cachedEntry
+    return cachedEntry
+
+
+def getTemplateCopy(templateFilePath, stripTemplate=False):
+    ''' Return a private copy of a parsed XML template.
+        The template file is parsed only the first time it is seen, or again if its mtime or size has changed.
+        If stripTemplate is True, the template's comments and whitespace-only text are removed when it is parsed.
+    '''
+    fileVersion, pristineRoot, slotPlans = _getTemplateEntry(templateFilePath, stripTemplate)
+    return copyElement(pristineRoot)
+
+
+def getTemplateCopyWithSlots(templateFilePath, planName, slotTables, stripTemplate=False):
+    ''' Return a private copy of a parsed XML template, and its slot elements as {tableName: {slotName: element}}.
+        slotTables maps table names to XPath tables.  The slot plan is compiled once per template and plan name.
+    '''
+    fileVersion, pristineRoot, slotPlans = _getTemplateEntry(templateFilePath, stripTemplate)
+    slotPlan = slotPlans.get(planName)
+    if slotPlan is None:
+        slotPlan = compileSlotPlan(pristineRoot, slotTables, templateFilePath)
+        slotPlans[planName] = slotPlan
+
+    root = copyElement(pristineRoot)
+    return root, resolveSlots(root, slotPlan)
+
+
+def clearTemplateCache():
+    ''' Forget all parsed templates. '''
+    _templateCache.clear()
+
+
+def toString(xml_tree, prettyPrint=True):
+    ''' Serialize an XML tree to a unicode string, indented unless prettyPrint is False. '''
+    outputString = ElementTree.tostring(xml_tree, encoding='unicode', pretty_print=prettyPrint)
     return outputString
 
+
+def toBytes(xml_tree, prettyPrint=True):
+    ''' Serialize an XML tree to UTF-8 bytes, without an XML declaration. '''
+    outputBytes = ElementTree.tostring(xml_tree, encoding='UTF-8', xml_declaration=False, pretty_print=prettyPrint)
+    return outputBytes
+
+
+def writeFile(xml_tree, outputFilePath, prettyPrint=True):
+    ''' Serialize an XML tree as UTF-8 bytes directly into a file, without an intermediate string. '''
+    ElementTree.ElementTree(xml_tree).write(outputFilePath, encoding='UTF-8', xml_declaration=False,
+                                            pretty_print=prettyPrint)
+
+#
+# Template slot plans
+#
+# A slot plan records, for each XPath in a set of XPath tables, the path of child indexes from the template root
+# to the first matching element.  Following those indexes in a fresh copy of the template finds the same elements
+# without searching the tree.
+#
+
+def getIndexPath(element):
+    ''' Return the child indexes leading from the root of an element's tree down to the element. '''
+    indexPath = []
+    parent = element.getparent()
+    while parent is not None:
+        indexPath.append(parent.index(element))
+        element = parent
+        parent = element.getparent()
+    indexPath.reverse()
+    return tuple(indexPath)
+
+
+def compileSlotPlan(templateRoot, slotTables, templateFilePath=''):
+    ''' Resolve every XPath in slotTables against a pristine template, and return {tableName: {slotName: indexPath}}.
+        Raise ValueError naming every slot that has no matching element in the template.
+    '''
+    slotPlan = {}
+    missingSlots = []
+    for tableName, xPathTable in slotTables.items():
+        tablePlan = {}
+        for slotName, xPath in xPathTable.items():
+            element = getFirst(getElements(templateRoot, xPath))
+            if element is None:
+                missingSlots.append(tableName + '.' + slotName)
+            else:
+                tablePlan[slotName] = getIndexPath(element)
+        slotPlan[tableName] = tablePlan
+
+    if missingSlots:
+        raise ValueError('Template %s is missing elements for slots: %s' % (templateFilePath, ', '.join(missingSlots)))
+    return slotPlan
+
+
+def resolveSlots(root, slotPlan):
+    ''' Follow the index paths of a slot plan in a copy of its template; return {tableName: {slotName: element}}. '''
+    slots = {}
+    for tableName, tablePlan in slotPlan.items():
+        tableSlots = {}
+        for slotName, indexPath in tablePlan.items():
+            element = root
+            for index in indexPath:
+                element = element[index]
+            tableSlots[slotName] = element
+        slots[tableName] = tableSlots
+    return slots
+
+
+#
+# Compiled XPath registry
+#
+
+# Compiled XPath objects, keyed by XPath string.  Modules register their XPath tables at import time;
+# any other XPath string is compiled on first use.
+_compiledXPaths = {}
+
+
+def compileXPath(elementPath):
+    ''' Return the compiled XPath object for an XPath string, compiling each distinct string only once.
+        Compiled XPath objects are returned unchanged.
+    '''
+    if isinstance(elementPath, ElementTree.XPath):
+        return elementPath
+    compiledXPath = _compiledXPaths.get(elementPath)
+    if compiledXPath is None:
+        compiledXPath = ElementTree.XPath(elementPath, namespaces=XML_NAMESPACE_MAP)
+        _compiledXPaths[elementPath] = compiledXPath
+    return compiledXPath
+
+
+def registerXPaths(xPathTable):
+    ''' Compile every XPath string in a table of XPaths into the registry, so that no record pays for compiling them.
+        This only warms up the registry and returns None; callers keep using the XPath strings, which compileXPath
+        looks up in the registry.
+    '''
+    for xPath in xPathTable.values():
+        compileXPath(xPath)
+
+
 #
 # XML Element Query operations
 #
@@ -46,16 +199,24 @@ def getLast(someList):
         return someList[-1]
     return None
 
+def getElements(baseElement, elementPath):
+    ''' Search XML element tree and return all matching elements.
+        elementPath may be an XPath string, a compiled XPath object, or an element resolved from a slot plan.
+    '''
+    if ElementTree.iselement(elementPath):
+        return [elementPath]
+    return compileXPath(elementPath)(baseElement)
+
 def getElement(baseElement, elementPath):
     ''' Search XML element tree and return the first matching element '''
-    elements = baseElement.xpath(elementPath, namespaces=XML_NAMESPACE_MAP)
+    elements = getElements(baseElement, elementPath)
     element = getFirst(elements)
     assert element != None
     return element
 
 def getLastElement(baseElement, elementPath):
     ''' Search XML element tree and return the first matching element '''
-    elements = baseElement.xpath(elementPath, namespaces=XML_NAMESPACE_MAP)
+    elements = getElements(baseElement, elementPath)
     element = getLast(elements)
     assert element != None
     return element
@@ -63,7 +224,7 @@ def getLastElement(baseElement, elementPath):
 
 def cutElement(baseElement, elementPath, returnIndex = False):
     ''' Search XML element tree and cut the first matching element. '''
-    elements = baseElement.xpath(elementPath, namespaces=XML_NAMESPACE_MAP)
+    elements = getElements(baseElement, elementPath)
     element = getFirst(elements)
 
     parent = element.getparent()
@@ -115,6 +276,20 @@ def setElementValue(xmlTreeRoot, xPath, value, setCodeListValue = False):
 # XML Element Insert operations
 #
 
+def insertCopies(prototype, parent, index, records, fillCopy):
+    """ Insert one copy of a prototype element per record into parent, starting at index, in record order.
+        fillCopy(elementCopy, record) fills in each copy.  All copies are inserted with one slice assignment,
+        so the cost grows linearly with the number of records.  Return the list of inserted copies.
+    """
+    copies = []
+    for record in records:
+        elementCopy = copyElement(prototype)
+        fillCopy(elementCopy, record)
+        copies.append(elementCopy)
+    parent[index:index] = copies
+    return copies
+
+
 def addChildList(xml_root, elementXPath, childXPath, valueList, setCodeListValue = False):
     element = getElement(xml_root, elementXPath)
     emptyChild, parent = cutElement(element, childXPath)
@@ -0,0 +1,239 @@
+#
+#  Code for uploading files to a Zenodo deposition bucket concurrently, resumably.
+#
+#  Before uploading, a folder is hashed in parallel into a manifest, which reports the total size and files with
+#  duplicate contents.  The manifest's MD5s are checked against the checksum Zenodo returns for each upload, used
+#  to skip files already in the bucket when an upload is resumed, and used to verify the bucket at the end, so no
+#  file is hashed more than once.  An upload journal records the bucket each upload goes to, so that a resumed
+#  upload can find it.
+#
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from requests.adapters import HTTPAdapter
+
+ZENODO_URL = 'https://zenodo.org/api/deposit/depositions'
+ZENODO_SANDBOX_URL = 'https://sandbox.zenodo.org/api/deposit/depositions'
+
+# Bytes read from a file at a time, while hashing or uploading it.
+HASH_BLOCK_SIZE = 1024 * 1024
+
+# Seconds to wait for Zenodo to accept a connection, and to answer once a file has been sent.
+UPLOAD_TIMEOUT = (10, 600)
+
+
+def getZenodoSession(apiToken, poolSize=1):
+    """ Return a requests Session for the Zenodo API, keeping poolSize connections open. """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=poolSize)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.params = {'access_token': apiToken}
+    return session
+
+
+def getJournalPath(uploadFolder):
+    """ Return the default journal path for an upload folder: a file next to the folder, so it is not uploaded. """
+    return os.path.abspath(uploadFolder).rstrip(os.sep) + '.zenodo_journal.jsonl'
+
+
+class FileBlockReader:
+    """ An iterable over the blocks of a file.  Its length is the file size, so that requests sends it with a
+        Content-Length header.
+    """
+
+    def __init__(self, filePath, size):
+        self.filePath = filePath
+        self.size = size
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        with open(self.filePath, 'rb') as fileObject:
+            yield from iter(lambda: fileObject.read(HASH_BLOCK_SIZE), b'')
+
+
+def getFileMD5(filePath):
+    """ Return the hexadecimal MD5 digest of a file, read in blocks into one reused buffer.
+        hashlib releases the GIL while hashing each block, so files hashed in several threads use several cores.
+    """
+    md5 = hashlib.md5()
+    buffer = bytearray(HASH_BLOCK_SIZE)
+    view = memoryview(buffer)
+    with open(filePath, 'rb', buffering=0) as fileObject:
+        for blockSize in iter(lambda: fileObject.readinto(buffer), 0):
+            md5.update(view[:blockSize])
+    return md5.hexdigest()
+
+
+def getFileVersion(filePath):
+    """ Return (size, mtime in nanoseconds) of a file, used to tell whether a journal entry still describes it. """
+    fileStat = os.stat(filePath)
+    return fileStat.st_size, fileStat.st_mtime_ns
+
+
+def getManifestPath(uploadFolder):
+    """ Return the default manifest path for an upload folder: a file next to the folder, so it is not uploaded. """
+    return os.path.abspath(uploadFolder).rstrip(os.sep) + '.zenodo_manifest.json'
+
+
+def readManifest(manifestPath):
+    """ Return the manifest written by hashFolder, or None if there is none or it cannot be read. """
+    try:
+        with open(manifestPath, 'r') as manifestFile:
+            return json.load(manifestFile)
+    except (OSError, ValueError):
+        return None
+
+
+def hashFolder(fileInfo, manifestPath, jobs=None):
+    """ Compute the MD5 of every file in a list of (fileName, filePath) pairs, with up to `jobs` files hashed at
+        once, and write a manifest of the results.  Return the manifest, a dictionary with keys:
+
+            'files'       a dictionary mapping each file name to {'path', 'size', 'version', 'md5'}
+            'totalSize'   the total size of the files, in bytes
+            'duplicates'  a sorted list of lists of file names whose contents are identical
+
+        No file is read twice: MD5s are reused from an earlier manifest for files whose size and mtime have not
+        changed, and hard links to the same file are hashed once.
+    """
+    oldManifest = readManifest(manifestPath) or {'files': {}}
+    entries = {}
+    filesToHash = {}
+    for fileName, filePath in fileInfo:
+        fileStat = os.stat(filePath)
+        entry = {'path': filePath, 'size': fileStat.st_size, 'version': [fileStat.st_size, fileStat.st_mtime_ns]}
+        oldEntry = oldManifest['files'].get(fileName)
+        if oldEntry and oldEntry['path'] == filePath and oldEntry['version'] == entry['version']:
+            entry['md5'] = oldEntry['md5']
+        else:
+            filesToHash.setdefault((fileStat.st_dev, fileStat.st_ino), []).append(entry)
+        entries[fileName] = entry
+
+    with ThreadPoolExecutor(max_workers=jobs or os.cpu_count()) as hashers:
+        futures = {hashers.submit(getFileMD5, linkedEntries[0]['path']): linkedEntries
+                   for linkedEntries in filesToHash.values()}
+        for future in as_completed(futures):
+            md5 = future.result()
+            for entry in futures[future]:
+                entry['md5'] = md5
+
+    namesByContent = {}
+    for fileName, entry in entries.items():
+        namesByContent.setdefault((entry['size'], entry['md5']), []).append(fileName)
+    manifest = {'files': entries,
+                'totalSize': sum(entry['size'] for entry in entries.values()),
+                'duplicates': sorted(sorted(names) for names in namesByContent.values() if len(names) > 1)}
+
+    # Replace the manifest in one step, so an interrupted run leaves the earlier manifest intact.
+    temporaryPath = manifestPath + '.tmp'
+    with open(temporaryPath, 'w') as manifestFile:
+        json.dump(manifest, manifestFile, indent=1, sort_keys=True)
+    os.replace(temporaryPath, manifestPath)
+    return manifest
+
+
+def verifyBucket(manifest, remoteChecksums):
+    """ Return a sorted list of the manifest's file names that are missing from a bucket or differ from it. """
+    return sorted(fileName for fileName, entry in manifest['files'].items()
+                  if remoteChecksums.get(fileName) != 'md5:' + entry['md5'])
+
+
+def readJournal(journalPath):
+    """ Return the bucket URL of the latest upload recorded in an upload journal, or None if there is none.
+        An incomplete last line, left by an interrupted run, is ignored.
+    """
+    bucketURL = None
+    if os.path.isfile(journalPath):
+        with open(journalPath, 'r') as journalFile:
+            for line in journalFile:
+                try:
+                    bucketURL = json.loads(line)['bucket']
+                except (ValueError, KeyError):
+                    continue
+    return bucketURL
+
+
+def startJournal(journalPath, bucketURL):
+    """ Record a new bucket in an upload journal, so that an upload to it can be resumed before any file is done. """
+    with open(journalPath, 'a') as journalFile:
+        journalFile.write(json.dumps({'bucket': bucketURL}) + '\n')
+
+
+def getBucketChecksums(session, bucketURL):
+    """ Return a dictionary mapping the names of files already in a Zenodo bucket to their checksums. """
+    response = session.get(bucketURL, timeout=UPLOAD_TIMEOUT)
+    response.raise_for_status()
+    return {item['key']: item.get('checksum') for item in response.json().get('contents', [])}
+
+
+def getLocalMD5(filePath, knownEntry=None):
+    """ Return the MD5 of a file, taken from its manifest entry if the file's size and mtime have not changed. """
+    if knownEntry and tuple(knownEntry.get('version', ())) == getFileVersion(filePath):
+        return knownEntry['md5']
+    return getFileMD5(filePath)
+
+
+def getFilesToUpload(fileInfo, knownEntries, remoteChecksums):
+    """ Split a list of (fileName, filePath) pairs into (filesToUpload, skippedFiles).  A file is skipped when
+        the bucket already holds a file with that name whose checksum matches the local file's MD5.
+        knownEntries maps file names to manifest entries, whose MD5s are used for unchanged files.
+    """
+    filesToUpload = []
+    skippedFiles = []
+    for fileName, filePath in fileInfo:
+        remoteChecksum = remoteChecksums.get(fileName)
+        if remoteChecksum and remoteChecksum == 'md5:' + getLocalMD5(filePath, knownEntries.get(fileName)):
+            skippedFiles.append((fileName, filePath))
+        else:
+            filesToUpload.append((fileName, filePath))
+    return filesToUpload, skippedFiles
+
+
+def checkFileVersion(fileName, manifestEntry):
+    """ Raise OSError if a file's size or mtime no longer match its manifest entry, so its MD5 may be stale. """
+    if getFileVersion(manifestEntry['path']) != tuple(manifestEntry['version']):
+        raise OSError('%s changed after it was hashed; rerun to hash and upload it again' % fileName)
+
+
+def uploadFile(session, bucketURL, fileName, manifestEntry):
+    """ Upload one file to a Zenodo bucket and return Zenodo's description of it, with its 'checksum' and 'size'.
+        The file is not read again to hash it: Zenodo's checksum is compared with the MD5 in the file's manifest
+        entry, and the file's size and mtime are checked against the entry before and after it is sent.  Raise
+        OSError if the upload failed, the file changed, or the checksums do not match.
+    """
+    checkFileVersion(fileName, manifestEntry)
+    reader = FileBlockReader(manifestEntry['path'], manifestEntry['size'])
+    response = session.put('%s/%s' % (bucketURL, fileName), data=reader, timeout=UPLOAD_TIMEOUT)
+    if response.status_code not in (200, 201):
+        raise OSError('Response ' + str(response.status_code) + ': ' + response.text[:500])
+    checkFileVersion(fileName, manifestEntry)
+
+    md5 = manifestEntry['md5']
+    uploaded = response.json()
+    if uploaded.get('checksum') != 'md5:' + md5:
+        raise OSError('Zenodo checksum %s does not match local MD5 %s' % (uploaded.get('checksum'), md5))
+    return uploaded
+
+
+def uploadFiles(session, bucketURL, fileInfo, manifestEntries, jobs=1):
+    """ Upload a list of (fileName, filePath) pairs to a Zenodo bucket with up to `jobs` uploads at once, checking
+        each against its entry in manifestEntries, the manifest's 'files' dictionary.  Yield (fileName, uploaded,
+        errorMessage) as each upload finishes, where uploaded is the result of uploadFile; errorMessage is None for
+        successful uploads and uploaded is None for failed ones.
+    """
+    with ThreadPoolExecutor(max_workers=jobs) as uploaders:
+        futures = {uploaders.submit(uploadFile, session, bucketURL, fileName, manifestEntries[fileName]): fileName
+                   for fileName, filePath in fileInfo}
+        for future in as_completed(futures):
+            fileName = futures[future]
+            try:
+                uploaded = future.result()
+            except (OSError, ValueError) as error:
+                yield fileName, None, '%s: %s' % (type(error).__name__, error)
+                continue
+            yield fileName, uploaded, None
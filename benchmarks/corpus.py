@@ -0,0 +1,192 @@
+#
+#  Seeded generator of synthetic DSET and DataCite record corpora, for load testing.
+#
+#  To run this generator: type "python -m benchmarks.corpus" from the top-level folder.
+#
+#  Each record is generated from its own random stream, seeded by (seed, record index), so a record does not
+#  depend on how many records are generated, and the same seed always produces the same corpus.
+#
+#  Example usages:
+#
+#       # Write 100,000 DSET records into a directory tree, 1000 files per sub-folder
+#       python -m benchmarks.corpus --count 100000 --outputDir /tmp/corpus
+#       python dset2iso.py --inputDir /tmp/corpus --outputDir /tmp/corpus_iso --jobs 8
+#
+#       # Stream one million DSET records as JSON lines
+#       python -m benchmarks.corpus --count 1000000 --jsonl - | python dset2iso.py --jsonl > /dev/null
+#
+#       # Write DataCite records, as found in the 'attributes' of a DataCite API response
+#       python -m benchmarks.corpus --dialect datacite --count 1000 --jsonl datacite.jsonl
+#
+#       # Write ISO 19139 records, translated from DataCite records, for scanning with xpath.py
+#       python -m benchmarks.corpus --dialect iso --count 100000 --outputDir /tmp/corpus_iso
+#
+
+import argparse
+import json
+import os
+import random
+import sys
+
+from benchmarks.records import makeDSETRecord, makeDataCiteRecord
+import api.translate.datacite as datacite_translate
+
+# Number of record files written to each sub-folder of a directory tree.
+FILES_PER_FOLDER = 1000
+
+# DSET keys that the translator treats as optional.
+DSET_OPTIONAL_KEYS = ['metadata_contact', 'metadata_date', 'publisher', 'resource_support',
+                      'resource_type', 'legal_constraints', 'access_constraints', 'other_responsible_party',
+                      'citation', 'science_support', 'keywords', 'spatial_representation', 'spatial_resolution',
+                      'topic_category', 'geolocation', 'temporal_coverage', 'temporal_resolution', 'related_link',
+                      'alternate_identifier', 'resource_version', 'progress', 'resource_format',
+                      'software_implementation_language', 'additional_information', 'distributor',
+                      'distribution_format', 'asset_size_MB']
+
+# DataCite keys that the translator treats as optional.
+DATACITE_OPTIONAL_KEYS = ['rightsList', 'relatedIdentifiers', 'subjects', 'formats', 'publisher', 'contributors',
+                          'geoLocations', 'dates']
+
+# Edge cases mixed into the corpus.
+EDGE_CASES = ['emptyKeywords', 'missingOptional', 'indeterminateExtent']
+
+# Template for ISO records, and the values mixed into them, weighted roughly as seen in harvested archives.
+ISO_TEMPLATE = './templates_ISO19139/datacite.xml'
+ISO_RESOURCE_TYPES = ['Dataset'] * 6 + ['Text'] * 2 + ['Software', 'Image', 'Collection', 'Other']
+ISO_PUBLISHERS = ['UCAR/NCAR - Earth Observing Laboratory', 'UCAR/NCAR - Research Data Archive',
+                  'UCAR/NCAR - Computational and Information Systems Laboratory', 'UCAR/NCAR', 'UCAR/UNIDATA']
+ISO_FORMATS = ['NetCDF', 'netCDF-4', 'application/x-netcdf', 'ASCII', 'text/plain', 'CSV', 'Comma-Separated Values',
+               'HDF5', 'GRIB2', 'PDF', 'image/png', 'JPEG', 'Excel', 'ZIP', 'tar', 'Matlab', 'Shapefile',
+               'binary', 'Unknown format']
+
+
+def getListSize(randomStream, alpha, maxListSize, minListSize=1):
+    """ Return a list size from a heavy-tailed Pareto distribution: mostly small, occasionally very large. """
+    return min(maxListSize, minListSize - 1 + int(randomStream.paretovariate(alpha)))
+
+
+def getRealisticShape(randomStream, maxListSize):
+    """ Return a record shape whose sizes roughly follow those seen in real archives. """
+    return {'authors': getListSize(randomStream, 1.1, maxListSize),
+            'keywords': getListSize(randomStream, 1.3, maxListSize),
+            'relatedLinks': getListSize(randomStream, 1.5, maxListSize, minListSize=0),
+            'formats': getListSize(randomStream, 2.0, maxListSize),
+            'abstractLength': min(100 * maxListSize, int(randomStream.lognormvariate(6.5, 0.8)))}
+
+
+def getEdgeCases(randomStream, edgeCaseRate):
+    """ Return the edge cases to apply to one record: none, or a random non-empty subset of EDGE_CASES. """
+    if randomStream.random() >= edgeCaseRate:
+        return []
+    return randomStream.sample(EDGE_CASES, randomStream.randint(1, len(EDGE_CASES)))
+
+
+def dropOptionalKeys(randomStream, record, optionalKeys):
+    """ Remove a random subset of optional keys from a record. """
+    for key in randomStream.sample(optionalKeys, randomStream.randint(1, len(optionalKeys))):
+        record.pop(key, None)
+
+
+def makeDSETCorpusRecord(seed, recordIndex, maxListSize, edgeCaseRate):
+    """ Return synthetic DSET record number recordIndex of the corpus with the given seed. """
+    randomStream = random.Random('%d:%d' % (seed, recordIndex))
+    record = makeDSETRecord(getRealisticShape(randomStream, maxListSize), recordIndex)
+
+    for edgeCase in getEdgeCases(randomStream, edgeCaseRate):
+        if edgeCase == 'emptyKeywords':
+            record['keywords'] = []
+        elif edgeCase == 'missingOptional':
+            dropOptionalKeys(randomStream, record, DSET_OPTIONAL_KEYS)
+        elif edgeCase == 'indeterminateExtent' and 'temporal_coverage' in record:
+            record['temporal_coverage'] = {'start': randomStream.choice(['before', 'unknown', '2008-01-01T00:00:00Z']),
+                                           'end': randomStream.choice(['after', 'now'])}
+    return record
+
+
+def makeDataCiteCorpusRecord(seed, recordIndex, maxListSize, edgeCaseRate):
+    """ Return synthetic DataCite record number recordIndex of the corpus with the given seed. """
+    randomStream = random.Random('%d:%d' % (seed, recordIndex))
+    record = makeDataCiteRecord(getRealisticShape(randomStream, maxListSize), recordIndex)
+
+    for edgeCase in getEdgeCases(randomStream, edgeCaseRate):
+        if edgeCase == 'emptyKeywords':
+            record['subjects'] = []
+        elif edgeCase == 'missingOptional':
+            dropOptionalKeys(randomStream, record, DATACITE_OPTIONAL_KEYS)
+        elif edgeCase == 'indeterminateExtent' and 'dates' in record:
+            # An empty start or end date is translated to an "unknown" start or "now" end.
+            record['dates'] = [{'date': randomStream.choice(['/2018-02-01', '2008-01-01/', '/']),
+                                'dateType': 'Collected'}]
+    return record
+
+
+def makeISOCorpusRecord(seed, recordIndex, maxListSize, edgeCaseRate):
+    """ Return synthetic ISO record number recordIndex of the corpus with the given seed, as an XML string.
+        Records are translated from DataCite records with a mix of resource types, publishers and format names.
+    """
+    record = makeDataCiteCorpusRecord(seed, recordIndex, maxListSize, edgeCaseRate)
+    randomStream = random.Random('%d:%d:iso' % (seed, recordIndex))
+    record['types'] = {'resourceTypeGeneral': randomStream.choice(ISO_RESOURCE_TYPES)}
+    if 'publisher' in record:
+        record['publisher'] = randomStream.choice(ISO_PUBLISHERS)
+    if record.get('formats'):
+        record['formats'] = [randomStream.choice(ISO_FORMATS) for format in record['formats']]
+    return datacite_translate.translateDataCiteRecord(record, ISO_TEMPLATE)
+
+
+def getRecordFilePath(outputDir, recordIndex, extension):
+    """ Return the path of a record file in a directory tree with FILES_PER_FOLDER files per sub-folder. """
+    folder = os.path.join(outputDir, '%05d' % (recordIndex // FILES_PER_FOLDER))
+    return os.path.join(folder, 'synthetic_%08d%s' % (recordIndex, extension))
+
+
+parser = argparse.ArgumentParser(description='Generate a reproducible corpus of synthetic DSET or DataCite records.')
+parser.add_argument('--count', type=int, default=1000, help="number of records to generate, default is 1000")
+parser.add_argument('--seed', type=int, default=0, help="random seed, default is 0")
+parser.add_argument('--dialect', choices=['dset', 'datacite', 'iso'], default='dset', help="record format, default is dset")
+parser.add_argument('--maxListSize', type=int, default=2000, help="largest number of authors, keywords, links or "
+                                                                  "formats in one record, default is 2000")
+parser.add_argument('--edgeCaseRate', type=float, default=0.2, help="fraction of records with edge cases: empty keyword "
+                                                                    "lists, missing optional fields, or indeterminate "
+                                                                    "temporal extents.  Default is 0.2")
+outputGroup = parser.add_mutually_exclusive_group(required=True)
+outputGroup.add_argument('--outputDir', help="write one file per record into a directory tree")
+outputGroup.add_argument('--jsonl', help="write one JSON record per line to this file, or '-' for STDOUT")
+args = parser.parse_args()
+
+if args.dialect == 'dset':
+    makeCorpusRecord = makeDSETCorpusRecord
+    # dset2iso.py batch mode reads files ending in '.txt'.
+    extension = '.txt'
+elif args.dialect == 'datacite':
+    makeCorpusRecord = makeDataCiteCorpusRecord
+    extension = '.json'
+else:
+    makeCorpusRecord = makeISOCorpusRecord
+    extension = '.xml'
+    if args.jsonl:
+        parser.error('ISO records can only be written to --outputDir')
+
+if args.jsonl:
+    if args.jsonl == '-':
+        outputFile = sys.stdout
+    else:
+        outputFile = open(args.jsonl, 'w')
+    for recordIndex in range(args.count):
+        record = makeCorpusRecord(args.seed, recordIndex, args.maxListSize, args.edgeCaseRate)
+        outputFile.write(json.dumps(record) + '\n')
+    if outputFile is not sys.stdout:
+        outputFile.close()
+else:
+    for recordIndex in range(args.count):
+        record = makeCorpusRecord(args.seed, recordIndex, args.maxListSize, args.edgeCaseRate)
+        recordFilePath = getRecordFilePath(args.outputDir, recordIndex, extension)
+        if recordIndex % FILES_PER_FOLDER == 0:
+            os.makedirs(os.path.dirname(recordFilePath), exist_ok=True)
+        with open(recordFilePath, 'w') as recordFile:
+            if extension == '.xml':
+                recordFile.write(record)
+            else:
+                json.dump(record, recordFile)
+
+print('Wrote %d %s records.' % (args.count, args.dialect), file=sys.stderr)
@@ -0,0 +1,98 @@
+#
+#  Synthetic DSET and DataCite records with parameterized sizes, for benchmarks.
+#
+
+# Shape of the records produced by default; each value is a list length, except abstractLength (characters).
+DEFAULT_SHAPE = {'authors': 2, 'keywords': 2, 'relatedLinks': 2, 'formats': 2, 'abstractLength': 500}
+
+LOREM_TEXT = ('Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor incididunt ut labore '
+              'et dolore magna aliqua. ')
+
+
+def getScaledShape(size):
+    """ Return a record shape where every repeatable list has `size` items and the abstract has 100 * size characters. """
+    return {'authors': size, 'keywords': size, 'relatedLinks': size, 'formats': size, 'abstractLength': 100 * size}
+
+
+def makeText(length):
+    """ Return filler text of exactly `length` characters. """
+    repeatCount = length // len(LOREM_TEXT) + 1
+    return (LOREM_TEXT * repeatCount)[:length]
+
+
+def makeContact(index, role=None):
+    contact = {"name": "Author %d" % index,
+               "position": "Scientist",
+               "organization": "NCAR Test Laboratory %d" % index,
+               "email": "author_%d@ucar.edu" % index}
+    if role:
+        contact["role"] = role
+    return contact
+
+
+def makeDSETRecord(shape=DEFAULT_SHAPE, recordIndex=0):
+    """ Return a DSET record containing every concept the translator handles, with list sizes taken from shape. """
+    record = {
+        "metadata_id": "edu.ucar.test::synthetic_%d" % recordIndex,
+        "asset_type": "dataset",
+        "metadata_contact": {"name": "", "position": "", "organization": "", "email": "metadata@ucar.edu"},
+        "metadata_date": "2020-01-01T00:00:00",
+        "landing_page": "https://doi.org/10.5065/SYNTHETIC%d" % recordIndex,
+        "title": "Synthetic Record %d" % recordIndex,
+        "publication_date": "2020-01-01",
+        "author": [makeContact(index) for index in range(shape['authors'])],
+        "publisher": {"name": "", "position": "", "organization": "NCAR Test Laboratory"},
+        "abstract": makeText(shape['abstractLength']),
+        "resource_support": makeContact(0),
+        "resource_type": "Dataset",
+        "legal_constraints": "Use of this dataset is subject to UCAR's Terms of Use.",
+        "access_constraints": "None",
+        "other_responsible_party": [makeContact(0, "processor")],
+        "citation": "Synthetic citation.",
+        "science_support": [makeContact(0, "principalInvestigator")],
+        "keywords": ["EARTH SCIENCE > ATMOSPHERE > KEYWORD %d" % index for index in range(shape['keywords'])],
+        "spatial_representation": ["grid"],
+        "spatial_resolution": [{"distance": "5.5", "units": "meters"}],
+        "topic_category": ["climatologyMeteorologyAtmosphere"],
+        "geolocation": {"north": "90.0", "south": "-90.0", "east": "180.0", "west": "-180.0"},
+        "temporal_coverage": {"start": "2008-01-01T00:00:00Z", "end": "2018-02-01T23:00:00Z"},
+        "temporal_resolution": "Hourly",
+        "related_link": [{"name": "Related Resource #%d" % index,
+                          "linkage": "https://www.ucar.edu/related/%d" % index,
+                          "description": "Related resource %d" % index} for index in range(shape['relatedLinks'])],
+        "alternate_identifier": ["SYNTHETIC_%d" % recordIndex],
+        "resource_version": "1.0",
+        "progress": "completed",
+        "resource_format": [{"name": "NETCDF", "version": str(index)} for index in range(shape['formats'])],
+        "software_implementation_language": "Python",
+        "additional_information": "Synthetic record for benchmarks.",
+        "distributor": makeContact(0),
+        "distribution_format": ["FORMAT %d" % index for index in range(shape['formats'])],
+        "asset_size_MB": "100",
+    }
+    return record
+
+
+def makeDataCiteRecord(shape=DEFAULT_SHAPE, recordIndex=0):
+    """ Return a DataCite JSON record, as found in the 'attributes' of a DataCite API response. """
+    record = {
+        "doi": "10.5065/SYNTHETIC%d" % recordIndex,
+        "types": {"resourceTypeGeneral": "Dataset"},
+        "titles": [{"title": "Synthetic Record %d" % recordIndex}],
+        "descriptions": [{"description": makeText(shape['abstractLength'])}],
+        "rightsList": [{"rights": "Creative Commons Attribution 4.0", "rightsUri": "https://creativecommons.org/licenses/by/4.0/"}],
+        "publicationYear": 2020,
+        "relatedIdentifiers": [{"relatedIdentifier": "https://www.ucar.edu/related/%d" % index,
+                                "relatedIdentifierType": "URL"} for index in range(shape['relatedLinks'])],
+        "subjects": [{"subject": "EARTH SCIENCE &gt; ATMOSPHERE &gt; KEYWORD %d" % index} for index in range(shape['keywords'])],
+        "formats": ["FORMAT %d" % index for index in range(shape['formats'])],
+        "creators": [{"name": "Author %d" % index} for index in range(shape['authors'])],
+        "publisher": "UCAR/NCAR",
+        "contributors": [{"name": "Contact Person, contact@ucar.edu", "contributorType": "ContactPerson"},
+                         {"name": "Related Person", "contributorType": "RelatedPerson"},
+                         {"name": "Data Curator", "contributorType": "DataCurator"}],
+        "geoLocations": [{"geoLocationBox": {"westBoundLongitude": -180, "eastBoundLongitude": 180,
+                                             "northBoundLatitude": 90, "southBoundLatitude": -90}}],
+        "dates": [{"date": "2008-01-01/2018-02-01", "dateType": "Collected"}],
+    }
+    return record
@@ -0,0 +1,57 @@
+#
+# Benchmark: output size and serialization throughput for each template in templates_ISO19139.
+#
+#  To run this benchmark: type "python -m benchmarks.serialization" from the top-level folder.
+#
+
+import argparse
+import glob
+import os
+import os.path
+import sys
+import tempfile
+import timeit
+
+import api.util.xml as xml
+
+
+def writeTextFile(root, outputFilePath, prettyPrint):
+    ''' The output path used before direct byte output: serialize to str, then re-encode through a text file. '''
+    with open(outputFilePath, 'w') as file:
+        file.write(xml.toString(root, prettyPrint))
+
+
+def timePerDocument(function, repeat, number):
+    ''' Return the best time for one call of function, in microseconds. '''
+    bestTime = min(timeit.Timer(function).repeat(repeat=repeat, number=number))
+    return 1e6 * bestTime / number
+
+
+parser = argparse.ArgumentParser(description='Compare output size and serialization throughput across templates.')
+parser.add_argument('--templateDir', default='./templates_ISO19139', help="folder of ISO XML template files")
+parser.add_argument('--number', type=int, default=500, help="serializations per timing run")
+parser.add_argument('--repeat', type=int, default=5, help="number of timing runs; the best run is reported")
+args = parser.parse_args()
+
+# Each case is (template is stripped at load time, output is pretty printed).
+cases = [(False, True), (False, False), (True, True), (True, False)]
+
+print('%-22s %-8s %-7s %9s %12s %12s %12s' % ('template', 'stripped', 'pretty', 'bytes', 'str us/doc', 'bytes us/doc',
+                                               'file us/doc'), file=sys.stdout)
+print('%-22s %-8s %-7s %9s %12s %12s %12s' % ('', '', '', '', '', '', '(str->text)'), file=sys.stdout)
+
+with tempfile.TemporaryDirectory() as tempDir:
+    outputFilePath = os.path.join(tempDir, 'output.xml')
+    for templatePath in sorted(glob.glob(os.path.join(args.templateDir, '*.xml'))):
+        for stripTemplate, prettyPrint in cases:
+            root = xml.getTemplateCopy(templatePath, stripTemplate)
+            outputSize = len(xml.toBytes(root, prettyPrint))
+
+            strTime = timePerDocument(lambda: xml.toString(root, prettyPrint), args.repeat, args.number)
+            bytesTime = timePerDocument(lambda: xml.toBytes(root, prettyPrint), args.repeat, args.number)
+            fileTime = timePerDocument(lambda: xml.writeFile(root, outputFilePath, prettyPrint), args.repeat, args.number)
+            textFileTime = timePerDocument(lambda: writeTextFile(root, outputFilePath, prettyPrint), args.repeat, args.number)
+
+            print('%-22s %-8s %-7s %9d %12.1f %12.1f %5.1f (%5.1f)' %
+                  (os.path.basename(templatePath), stripTemplate, prettyPrint, outputSize,
+                   strTime, bytesTime, fileTime, textFileTime), file=sys.stdout)
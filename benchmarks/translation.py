@@ -0,0 +1,164 @@
+#
+# Benchmark suite: DSET and DataCite translation time per template, per tier, and per record size.
+#
+#  To run this benchmark: type "python -m benchmarks.translation" from the top-level folder.
+#
+#  Example usages:
+#
+#       # Save results for later comparison
+#       python -m benchmarks.translation --output baseline.json
+#
+#       # Flag cases that are more than 20% slower than the saved baseline
+#       python -m benchmarks.translation --output current.json --compare baseline.json --threshold 0.2
+#
+
+import argparse
+import datetime
+import json
+import platform
+import sys
+import time
+
+from lxml import etree as ElementTree
+
+import api.translate.dset as dset_translate
+import api.translate.datacite as datacite_translate
+import api.util.xml as xml
+from api.translate.dset_tiers.required import transformRequiredFields
+from api.translate.dset_tiers.recommended import transformRecommendedFields
+from api.translate.dset_tiers.optional import transformOptionalFields
+
+from benchmarks.records import getScaledShape, makeDSETRecord, makeDataCiteRecord
+
+DSET_TEMPLATES = ['dset_full.xml', 'dset_min.xml', 'dset_min_geo.xml', 'dset_min_fakelab.xml']
+DATACITE_TEMPLATES = ['datacite.xml', 'ral_vigh_dois.xml']
+TEMPLATE_FOLDER = './templates_ISO19139/'
+
+
+def timeDSETStages(record, templatePath, repeat, number):
+    """ Return the best per-record time, in seconds, of each DSET translation stage. """
+    bestTimes = None
+    for _ in range(repeat):
+        stageTimes = {'copy': 0.0, 'required': 0.0, 'recommended': 0.0, 'optional': 0.0, 'serialize': 0.0}
+        for _ in range(number):
+            startTime = time.perf_counter()
+            root, slots = xml.getTemplateCopyWithSlots(templatePath, 'dset', dset_translate.slotTables)
+            copyTime = time.perf_counter()
+            transformRequiredFields(root, record, slots['required'])
+            requiredTime = time.perf_counter()
+            transformRecommendedFields(root, record, slots['recommended'])
+            recommendedTime = time.perf_counter()
+            transformOptionalFields(root, record, slots['optional'])
+            optionalTime = time.perf_counter()
+            xml.toString(root)
+            serializeTime = time.perf_counter()
+
+            stageTimes['copy'] += copyTime - startTime
+            stageTimes['required'] += requiredTime - copyTime
+            stageTimes['recommended'] += recommendedTime - requiredTime
+            stageTimes['optional'] += optionalTime - recommendedTime
+            stageTimes['serialize'] += serializeTime - optionalTime
+
+        stageTimes['total'] = sum(stageTimes.values())
+        if bestTimes is None or stageTimes['total'] < bestTimes['total']:
+            bestTimes = stageTimes
+
+    return {stage: stageTime / number for stage, stageTime in bestTimes.items()}
+
+
+def timeDataCite(record, templatePath, repeat, number):
+    """ Return the best per-record time, in seconds, of a whole DataCite translation. """
+    bestTime = None
+    for _ in range(repeat):
+        startTime = time.perf_counter()
+        for _ in range(number):
+            datacite_translate.transformDataCiteToISO(record, templatePath, datacite_translate.roleMappingDataCiteToISO)
+        runTime = time.perf_counter() - startTime
+        if bestTime is None or runTime < bestTime:
+            bestTime = runTime
+    return {'total': bestTime / number}
+
+
+def runBenchmarks(sizes, repeat, number):
+    """ Return a dictionary of benchmark results, keyed by 'translator/template/size=N/stage'. """
+    # Templates missing slots cannot be used by the DSET translator at all.
+    dsetTemplates = []
+    for template in DSET_TEMPLATES:
+        try:
+            dset_translate.compileTemplate(TEMPLATE_FOLDER + template)
+            dsetTemplates.append(template)
+        except ValueError as error:
+            print('  skipping %s: %s' % (template, error), file=sys.stderr)
+
+    results = {}
+    for size in sizes:
+        shape = getScaledShape(size)
+        # Keep the work per timing run roughly constant as records grow.
+        recordNumber = max(1, number // size)
+
+        dsetRecord = makeDSETRecord(shape)
+        for template in dsetTemplates:
+            templatePath = TEMPLATE_FOLDER + template
+            stageTimes = timeDSETStages(dsetRecord, templatePath, repeat, recordNumber)
+            for stage, stageTime in stageTimes.items():
+                results['dset/%s/size=%d/%s' % (template, size, stage)] = stageTime
+
+        dataciteRecord = makeDataCiteRecord(shape)
+        for template in DATACITE_TEMPLATES:
+            stageTimes = timeDataCite(dataciteRecord, TEMPLATE_FOLDER + template, repeat, recordNumber)
+            for stage, stageTime in stageTimes.items():
+                results['datacite/%s/size=%d/%s' % (template, size, stage)] = stageTime
+
+    return results
+
+
+def compareResults(results, baselineResults, threshold):
+    """ Print the ratio of each result to its baseline.  Return the names of results slower by more than threshold. """
+    regressions = []
+    print('%-50s %12s %12s %8s' % ('case', 'baseline ms', 'current ms', 'ratio'), file=sys.stdout)
+    for name in sorted(results):
+        if name not in baselineResults:
+            continue
+        ratio = results[name] / baselineResults[name]
+        flag = ''
+        if ratio > 1.0 + threshold:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        print('%-50s %12.4f %12.4f %8.2f%s' % (name, 1000 * baselineResults[name], 1000 * results[name], ratio, flag),
+              file=sys.stdout)
+    return regressions
+
+
+parser = argparse.ArgumentParser(description='Time DSET and DataCite translation across templates, tiers and record sizes.')
+parser.add_argument('--sizes', nargs='+', type=int, default=[1, 10, 100, 1000],
+                    help="record sizes: number of authors, keywords, related links and formats")
+parser.add_argument('--number', type=int, default=200, help="translations per timing run for size 1; "
+                                                            "divided by the size for larger records")
+parser.add_argument('--repeat', type=int, default=3, help="number of timing runs; the best run is reported")
+parser.add_argument('--output', help="JSON file to write results to")
+parser.add_argument('--compare', help="baseline JSON results file to compare against")
+parser.add_argument('--threshold', type=float, default=0.2, help="slowdown ratio above which a case is flagged, "
+                                                                   "default is 0.2 (20%%)")
+args = parser.parse_args()
+
+results = runBenchmarks(args.sizes, args.repeat, args.number)
+report = {'metadata': {'date': datetime.datetime.now().isoformat(),
+                       'python': platform.python_version(),
+                       'lxml': '.'.join(str(part) for part in ElementTree.LXML_VERSION),
+                       'sizes': args.sizes},
+          'results': results}
+
+if args.output:
+    with open(args.output, 'w') as outputFile:
+        json.dump(report, outputFile, indent=2, sort_keys=True)
+
+if args.compare:
+    with open(args.compare, 'r') as baselineFile:
+        baselineResults = json.load(baselineFile)['results']
+    regressions = compareResults(results, baselineResults, args.threshold)
+    if regressions:
+        print('%d cases regressed by more than %d%%.' % (len(regressions), 100 * args.threshold), file=sys.stderr)
+        sys.exit(1)
+else:
+    for name in sorted(results):
+        print('%-50s %10.4f ms' % (name, 1000 * results[name]), file=sys.stdout)
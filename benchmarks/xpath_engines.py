@@ -0,0 +1,96 @@
+#
+# Benchmark: time and peak memory of the tree and stream field extraction engines used by xpath.py.
+#
+#  To run this benchmark: type "python -m benchmarks.xpath_engines" from the top-level folder.
+#
+#  Synthetic ISO records of increasing size are translated from DataCite records.  Each measurement runs in a new
+#  Python process, so that peak memory (the growth of the maximum resident set size) covers libxml2's allocations
+#  and is not affected by earlier measurements.
+#
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import timeit
+
+import api.isofields as isofields
+import api.translate.datacite as datacite_translate
+from benchmarks.records import makeDataCiteRecord, getScaledShape
+
+ISO_TEMPLATE = './templates_ISO19139/datacite.xml'
+
+# Fields extracted by each xpath.py report, with the resource type that --datasetsOnly adds.
+REPORT_FIELDS = {'publisher': ['publisher', 'resourceType'],
+                 'resourceFormat': ['resourceFormats', 'resourceType'],
+                 'geoExtent': ['geoExtent', 'resourceType']}
+
+
+def getPeakMemoryMB():
+    ''' Return the maximum resident set size of this process so far, in MB. '''
+    # On Linux, ru_maxrss is carried over from the parent process across exec, but VmHWM is not.
+    if os.path.isfile('/proc/self/status'):
+        with open('/proc/self/status') as statusFile:
+            for line in statusFile:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024.0
+    maxRSS = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes; other systems report kilobytes.
+    return maxRSS / (1024.0 * 1024.0) if sys.platform == 'darwin' else maxRSS / 1024.0
+
+
+def measureExtraction(filePath, fieldNames, engine, repeat, number):
+    ''' Return the peak memory growth of one extraction, in MB, and the best extraction time, in milliseconds. '''
+    startMemory = getPeakMemoryMB()
+    isofields.getFields(filePath, fieldNames, engine)
+    peakMemory = getPeakMemoryMB() - startMemory
+    timer = timeit.Timer(lambda: isofields.getFields(filePath, fieldNames, engine))
+    bestTime = min(timer.repeat(repeat=repeat, number=number))
+    return {'memoryMB': peakMemory, 'milliseconds': 1000.0 * bestTime / number}
+
+
+def runMeasurement(filePath, report, engine, repeat, number):
+    ''' Measure one engine and report in a new Python process, and return its results. '''
+    command = [sys.executable, '-m', 'benchmarks.xpath_engines', '--measure', filePath, report, engine,
+               '--repeat', str(repeat), '--number', str(number)]
+    return json.loads(subprocess.run(command, check=True, stdout=subprocess.PIPE).stdout)
+
+
+def runBenchmarks(sizes, repeat, number):
+    print(f'{"size":>6} {"file MB":>8} {"report":>15} {"tree ms":>9} {"stream ms":>10} {"tree MB":>8} {"stream MB":>10}',
+          file=sys.stdout)
+    with tempfile.TemporaryDirectory() as recordDir:
+        for size in sizes:
+            filePath = os.path.join(recordDir, 'record_%d.xml' % size)
+            isoRecord = datacite_translate.translateDataCiteRecord(makeDataCiteRecord(getScaledShape(size)), ISO_TEMPLATE)
+            with open(filePath, 'w') as recordFile:
+                recordFile.write(isoRecord)
+            fileSize = os.path.getsize(filePath) / (1024.0 * 1024.0)
+
+            # Fewer extractions per timing run for larger records.
+            sizeNumber = max(1, number // size)
+            for report in REPORT_FIELDS:
+                tree = runMeasurement(filePath, report, 'tree', repeat, sizeNumber)
+                stream = runMeasurement(filePath, report, 'stream', repeat, sizeNumber)
+                print(f'{size:>6} {fileSize:>8.2f} {report:>15} {tree["milliseconds"]:>9.2f} '
+                      f'{stream["milliseconds"]:>10.2f} {tree["memoryMB"]:>8.1f} {stream["memoryMB"]:>10.1f}',
+                      file=sys.stdout)
+
+
+parser = argparse.ArgumentParser(description='Compare time and peak memory of tree and stream field extraction.')
+parser.add_argument('--sizes', nargs='+', type=int, default=[1, 10, 100, 1000, 4000],
+                    help="record sizes: number of authors, keywords, related links and formats")
+parser.add_argument('--number', type=int, default=200, help="extractions per timing run for size 1; "
+                                                            "divided by the size for larger records")
+parser.add_argument('--repeat', type=int, default=3, help="number of timing runs; the best run is reported")
+parser.add_argument('--measure', nargs=3, metavar=('FILE', 'REPORT', 'ENGINE'), help=argparse.SUPPRESS)
+args = parser.parse_args()
+
+if args.measure:
+    filePath, report, engine = args.measure
+    print(json.dumps(measureExtraction(filePath, REPORT_FIELDS[report], engine, args.repeat, args.number)))
+else:
+    runBenchmarks(args.sizes, args.repeat, args.number)
@@ -0,0 +1,51 @@
+#
+# Benchmark: per-record translation time with and without the compiled XPath registry.
+#
+#  To run this benchmark: type "python -m benchmarks.xpath_registry" from the top-level folder.
+#
+
+import argparse
+import sys
+import timeit
+from lxml import etree as ElementTree
+
+import api.inputjson as dset_input
+import api.translate.dset as dset_translate
+import api.util.xml as xml
+
+
+def getElementsUncompiled(baseElement, elementPath):
+    ''' The query path used before the registry existed: every call re-compiles the XPath string. '''
+    if ElementTree.iselement(elementPath):
+        return [elementPath]
+    return baseElement.xpath(elementPath, namespaces=xml.XML_NAMESPACE_MAP)
+
+
+def timePerRecord(record, templatePath, repeat, number):
+    ''' Return the best per-record translation time, in milliseconds. '''
+    timer = timeit.Timer(lambda: dset_translate.transformDSETToISO(dict(record), templatePath))
+    bestTime = min(timer.repeat(repeat=repeat, number=number))
+    return 1000.0 * bestTime / number
+
+
+parser = argparse.ArgumentParser(description='Compare per-record translation time before and after XPath precompilation.')
+parser.add_argument('--input', default='./defaultInputRecords/test_dset_full.txt', help="DSET JSON record to translate")
+parser.add_argument('--template', default='./templates_ISO19139/dset_full.xml', help="ISO XML template file")
+parser.add_argument('--number', type=int, default=200, help="translations per timing run")
+parser.add_argument('--repeat', type=int, default=5, help="number of timing runs; the best run is reported")
+args = parser.parse_args()
+
+with open(args.input, 'r') as inputFile:
+    record = dset_input.getJSONData(inputFile.read())
+
+compiledGetElements = xml.getElements
+xml.getElements = getElementsUncompiled
+try:
+    beforeTime = timePerRecord(record, args.template, args.repeat, args.number)
+finally:
+    xml.getElements = compiledGetElements
+afterTime = timePerRecord(record, args.template, args.repeat, args.number)
+
+print(f'uncompiled XPath strings: {beforeTime:.3f} ms/record', file=sys.stdout)
+print(f'compiled XPath registry:  {afterTime:.3f} ms/record', file=sys.stdout)
+print(f'speedup:                  {beforeTime / afterTime:.2f}x', file=sys.stdout)
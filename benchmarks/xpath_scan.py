@@ -0,0 +1,58 @@
+#
+# Benchmark: xpath.py directory scan time with several worker processes and read-ahead threads.
+#
+#  To run this benchmark: type "python -m benchmarks.xpath_scan" from the top-level folder.
+#
+#  A synthetic ISO corpus is generated with benchmarks.corpus unless --inputDir is given.  Each configuration's
+#  output is checked against the serial scan, which it must match line for line.
+#
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def runScan(inputDir, reportType, jobs, ioThreads):
+    ''' Run xpath.py over a directory, and return (elapsed seconds, output). '''
+    command = [sys.executable, 'xpath.py', '--inputDir', inputDir, '--type', reportType,
+               '--jobs', str(jobs), '--ioThreads', str(ioThreads)]
+    startTime = time.perf_counter()
+    output = subprocess.run(command, check=True, stdout=subprocess.PIPE).stdout
+    return time.perf_counter() - startTime, output
+
+
+def runBenchmarks(inputDir, reportType, configurations, repeat):
+    ''' Time each (jobs, ioThreads) configuration, and print its best time and speedup over the serial scan. '''
+    baseTime, baseOutput = min(runScan(inputDir, reportType, 1, 0) for i in range(repeat))
+    fileCount = baseOutput.count(b'\n')
+    print(f'{"jobs":>5} {"ioThreads":>10} {"seconds":>9} {"speedup":>8}   ({fileCount} output lines)', file=sys.stdout)
+    print(f'{1:>5} {0:>10} {baseTime:>9.2f} {1.0:>7.2f}x', file=sys.stdout)
+    for jobs, ioThreads in configurations:
+        elapsed, output = min(runScan(inputDir, reportType, jobs, ioThreads) for i in range(repeat))
+        if output != baseOutput:
+            print(f'ERROR: output with --jobs {jobs} --ioThreads {ioThreads} differs from the serial scan', file=sys.stderr)
+            sys.exit(1)
+        print(f'{jobs:>5} {ioThreads:>10} {elapsed:>9.2f} {baseTime / elapsed:>7.2f}x', file=sys.stdout)
+
+
+parser = argparse.ArgumentParser(description='Time xpath.py directory scans with worker processes and read-ahead threads.')
+parser.add_argument('--inputDir', help="directory of ISO XML files to scan; by default a synthetic corpus is generated")
+parser.add_argument('--count', type=int, default=20000, help="number of records in the generated corpus")
+parser.add_argument('--seed', type=int, default=0, help="seed for the generated corpus")
+parser.add_argument('--type', default='standardResourceFormat', help="xpath.py report type")
+parser.add_argument('--jobs', nargs='+', type=int, default=[2, 4, os.cpu_count()], help="worker process counts to time")
+parser.add_argument('--ioThreads', nargs='+', type=int, default=[0, 8], help="read-ahead thread counts to time")
+parser.add_argument('--repeat', type=int, default=1, help="number of timing runs; the best run is reported")
+args = parser.parse_args()
+
+configurations = sorted({(jobs, ioThreads) for jobs in args.jobs for ioThreads in args.ioThreads} - {(1, 0)})
+if args.inputDir:
+    runBenchmarks(args.inputDir, args.type, configurations, args.repeat)
+else:
+    with tempfile.TemporaryDirectory() as corpusDir:
+        subprocess.run([sys.executable, '-m', 'benchmarks.corpus', '--dialect', 'iso', '--count', str(args.count),
+                        '--seed', str(args.seed), '--outputDir', corpusDir], check=True, stdout=subprocess.DEVNULL)
+        runBenchmarks(corpusDir, args.type, configurations, args.repeat)
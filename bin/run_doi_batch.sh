@@ -12,11 +12,19 @@ DOI_SUFFIXES="10.26024/sprq-2d04"
 
 echo "DOI_SUFFIXES= " $DOI_SUFFIXES
 
+# DataCite responses are cached here, so reruns only revalidate unchanged records.
+CACHE_DIR=${CACHE_DIR:-$HOME/.cache/datacite2iso}
 
+
+# Output records are named <DOI suffix>.xml, as written by datacite2iso.py --doiFile, with the suffix in the case
+# DataCite gives it (usually upper case).  Earlier versions of this script wrote test_<suffix>.xml instead.
+OUTPUT_DIR=${OUTPUT_DIR:-.}
+
+# Translate all DOIs in one process, fetching several at a time.  DOIs that fail are listed in failed_dois.txt,
+# which can be passed back to --doiFile to retry them.
+DOI_FILE=`mktemp`
 for f in $DOI_SUFFIXES; do
-   #echo "Processing 10.5065/${f}..."
-   #python datacite2iso.py  --doi 10.5065/${f} > test_${f}.xml
-   echo "Processing ${f}..."
-   suffix=`echo ${f} | cut -d / -f 2`
-   python datacite2iso.py  --doi ${f} > test_${suffix}.xml
+   echo ${f} >> ${DOI_FILE}
 done
+python datacite2iso.py --doiFile ${DOI_FILE} --outputDir ${OUTPUT_DIR} --cacheDir ${CACHE_DIR} --failureFile failed_dois.txt
+rm -f ${DOI_FILE}
@@ -7,6 +7,8 @@ import sys
 import os.path
 
 import api.inputjson as input_json
+import api.ratelimit as rate_limit
+import api.responsecache as response_cache
 import api.translate.datacite as translate
 
 __version_info__ = ('2022', '11', '01')
@@ -18,10 +20,28 @@ A program for translating DataCite JSON metadata into ISO 19139 metadata.
 
 DataCite metadata is obtained from the DataCite website, so an internet connection is required.
 
-Example usage:
+Example usages:
+
+  * Translate a single DOI's record:
 
        python datacite2iso.py --doi 10.5065/D6WD3XH5   > test_datacite.xml
 
+
+  * Translate every DOI with a given prefix, saving one file per DOI:
+
+       python datacite2iso.py --prefix 10.5065 --outputDir ./defaultOutputRecords
+
+
+  * Translate a list of DOIs, one per line, fetching 16 at a time; list failed DOIs in a file that can be retried:
+
+       python datacite2iso.py --doiFile dois.txt --outputDir ./defaultOutputRecords --jobs 16 --failureFile failed.txt
+
+
+  * Keep DataCite responses in a local cache, and later translate from the cache without network access:
+
+       python datacite2iso.py --doi 10.5065/D6WD3XH5 --cacheDir ~/.cache/datacite2iso  > test_datacite.xml
+       python datacite2iso.py --doi 10.5065/D6WD3XH5 --cacheDir ~/.cache/datacite2iso --offline  > test_datacite.xml
+
 Program Version: '''
 
 
@@ -38,13 +58,48 @@ class PrintHelpOnErrorParser(argparse.ArgumentParser):
 programHelp = PROGRAM_DESCRIPTION + __version__
 parser = PrintHelpOnErrorParser(description=programHelp, formatter_class=argparse.RawTextHelpFormatter)
 parser.add_argument("--template", nargs=1, help="custom ISO template to use from the 'templates' folder.  Default: datacite.xml")
+parser.add_argument("--outputDir", nargs=1, help="directory for output records, required with --prefix and --doiFile")
+parser.add_argument("--jobs", nargs=1, type=int, default=[8], help="number of DOIs fetched at the same time with --doiFile.  Default: 8")
+parser.add_argument("--failureFile", nargs=1, help="with --doiFile, write DOIs that could not be translated to this file")
+parser.add_argument("--cacheDir", nargs=1, help="directory for a persistent cache of DataCite responses, keyed by DOI")
+parser.add_argument("--cacheTTL", nargs=1, type=float, default=[response_cache.DEFAULT_TTL_SECONDS / 3600],
+                    help="hours before a cached response is revalidated with DataCite.  Default: 24")
+parser.add_argument("--cacheMaxMB", nargs=1, type=float, default=[response_cache.DEFAULT_MAX_BYTES / (1024 * 1024)],
+                    help="cache size above which least recently used responses are evicted.  Default: 256")
+parser.add_argument("--offline", action='store_true', help="use only cached responses; requires --cacheDir")
+parser.add_argument("--rateLimit", nargs=1, type=float, default=[rate_limit.DEFAULT_RATE],
+                    help="most DataCite requests per second, lowered automatically when DataCite throttles.  Default: 10")
+parser.add_argument("--maxRetries", nargs=1, type=int, default=[rate_limit.DEFAULT_MAX_RETRIES],
+                    help="retries of a throttled or temporarily failed DataCite request.  Default: 5")
 parser.add_argument('--version', action='version', version="%(prog)s (" + __version__ + ")")
 
-requiredArgs = parser.add_argument_group('required arguments')
-requiredArgs.add_argument("--doi", nargs=1, required=True, help="Digital Object Identifier (DOI)")
+requiredArgs = parser.add_argument_group('required arguments (one of)')
+recordArgs = requiredArgs.add_mutually_exclusive_group(required=True)
+recordArgs.add_argument("--doi", nargs=1, help="Digital Object Identifier (DOI)")
+recordArgs.add_argument("--prefix", nargs=1, help="DOI prefix, such as 10.5065; translate every DOI with this prefix")
+recordArgs.add_argument("--doiFile", nargs=1, help="file listing one DOI per line; translate every listed DOI")
 
 args = parser.parse_args()
 
+if (args.prefix or args.doiFile) and args.outputDir is None:
+    parser.error('--prefix and --doiFile require --outputDir')
+if args.doiFile and not os.path.isfile(args.doiFile[0]):
+    parser.error('DOI file does not exist: %s\n' % args.doiFile[0])
+if args.jobs[0] < 1:
+    parser.error('--jobs must be at least 1')
+if args.failureFile and not args.doiFile:
+    parser.error('--failureFile requires --doiFile')
+if args.outputDir is not None and not os.path.isdir(args.outputDir[0]):
+    parser.error('Output directory does not exist: %s\n' % args.outputDir[0])
+if args.offline and args.cacheDir is None:
+    parser.error('--offline requires --cacheDir')
+if args.offline and args.prefix:
+    parser.error('--offline cannot be used with --prefix')
+if args.rateLimit[0] <= 0:
+    parser.error('--rateLimit must be positive')
+if args.maxRetries[0] < 0:
+    parser.error('--maxRetries cannot be negative')
+
 # Check for ISO 19139 template existence.
 DEFAULT_OUTPUT_TEMPLATE = 'datacite.xml'
 
@@ -53,9 +108,49 @@ if not os.path.isfile(templateFilePath):
     message = 'Template file does not exist: %s\n' % templateFilePath
     parser.error(message)
 
+# Open the response cache, if one is used.
+cache = None
+if args.cacheDir:
+    cache = response_cache.ResponseCache(os.path.expanduser(args.cacheDir[0]), args.cacheTTL[0] * 3600,
+                                         int(args.cacheMaxMB[0] * 1024 * 1024), args.offline)
+
+# One rate limiter paces every request sent to DataCite.
+limiter = rate_limit.RateLimiter(args.rateLimit[0], maxRetries=args.maxRetries[0])
+
+# Harvest and translate all records for a DOI prefix, one page at a time.
+if args.prefix:
+    translatedCount, failedDOIs = translate.translateDataCiteRecords(args.prefix[0], templateFilePath, args.outputDir[0],
+                                                                     limiter=limiter)
+    print(("DataCite: " + rate_limit.formatMetrics(limiter.getMetrics())), file=sys.stderr)
+    if failedDOIs:
+        print(("Failed to translate " + str(len(failedDOIs)) + " records."), file=sys.stderr)
+        sys.exit(1)
+    sys.exit(0)
+
+# Fetch the records for a list of DOIs concurrently, translating each one as it arrives.
+if args.doiFile:
+    with open(args.doiFile[0], 'r') as doiFile:
+        dois = input_json.getDOIList(doiFile)
+    translatedCount, failures = translate.translateDataCiteDOIs(dois, templateFilePath, args.outputDir[0],
+                                                                args.jobs[0], cache, limiter=limiter)
+    print(("Translated " + str(translatedCount) + " of " + str(len(dois)) + " DOIs."), file=sys.stderr)
+    print(("DataCite: " + rate_limit.formatMetrics(limiter.getMetrics())), file=sys.stderr)
+    if args.failureFile:
+        with open(args.failureFile[0], 'w') as failureFile:
+            for doi, errorMessage in failures:
+                failureFile.write(doi + '\n')
+    if failures:
+        sys.exit(1)
+    sys.exit(0)
+
 # Query the specified DOI's metadata JSON record.
 doi = args.doi[0]
-record = input_json.getDataCiteRecords(doi)
+try:
+    record = rate_limit.callWithRetries(limiter, input_json.getDataCiteRecords, doi, cache, None,
+                                        input_json.DATACITE_DOI_URL, limiter)
+except (LookupError, rate_limit.RetryableError) as error:
+    print(str(error), file=sys.stderr)
+    sys.exit(1)
 
 #
 #  Perform the translation.
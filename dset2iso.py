@@ -5,6 +5,8 @@
 #
 
 import argparse
+import atexit
+import multiprocessing
 import sys
 import os.path
 
@@ -23,11 +25,31 @@ Here are some working examples showing the two main uses of this program:
        python dset2iso.py  < defaultInputRecords/test_dset_full.txt  > test_dset_full.xml
 
 
+  * Convert a stream of DSET metadata records, one JSON record per line, into NUL-separated ISO records:
+
+       cat records.jsonl | python dset2iso.py --jsonl  > records.xml0
+
+
+  * Convert a stream of DSET metadata records into files named by each record's metadata_id:
+
+       cat records.jsonl | python dset2iso.py --jsonl --outputDir ./defaultOutputRecords
+
+
   * Perform batch DSET metadata record processing:
 
        python dset2iso.py --inputDir ./defaultInputRecords --outputDir ./defaultOutputRecords
 
 
+  * Perform batch DSET metadata record processing with 8 worker processes:
+
+       python dset2iso.py --inputDir ./defaultInputRecords --outputDir ./defaultOutputRecords --jobs 8
+
+
+  * Perform batch DSET metadata record processing, translating only new or changed records:
+
+       python dset2iso.py --inputDir ./defaultInputRecords --outputDir ./defaultOutputRecords --incremental
+
+
 Program Version: '''
 
 
@@ -62,22 +84,59 @@ parser.add_argument('--template', nargs=1, help="path to ISO XML template file,
                                                 "'./templates_ISO19139/dset_full.xml'")
 parser.add_argument('--inputDir', nargs=1, help="base directory for input records")
 parser.add_argument('--outputDir', nargs=1, help="base directory for output records")
+parser.add_argument('--jsonl', action='store_true', help="read newline-delimited JSON records from STDIN; write NUL-separated\n"
+                                                         "ISO records to STDOUT, or files named by metadata_id to --outputDir")
+parser.add_argument('--jobs', nargs=1, type=int, default=[1], help="number of worker processes for batch processing, default is 1")
+parser.add_argument('--compact', action='store_true', help="write output XML without indentation")
+parser.add_argument('--stripTemplate', action='store_true', help="remove comments and whitespace-only text from the template\n"
+                                                                 "when it is loaded")
+parser.add_argument('--incremental', action='store_true', help="keep a manifest in the output directory, translate only new or\n"
+                                                               "changed input files, and delete outputs of removed input files")
+parser.add_argument('--dry-run', action='store_true', help="with --incremental, list what would be rebuilt or deleted and exit")
+parser.add_argument('--profile', action='store_true', help="time each translation stage and report per-stage totals, latency\n"
+                                                           "percentiles and the slowest records to STDERR")
+parser.add_argument('--profileFile', nargs=1, help="with --profile, write the timing report as JSON to this file instead")
+parser.add_argument('--profileSlowest', nargs=1, type=int, default=[10], help="with --profile, number of slowest records to report,\n"
+                                                                             "default is 10")
 parser.add_argument('--version', action='version', version="%(prog)s (" + __version__ + ")")
 args = parser.parse_args()
 
-# Require that --input-dir and --output-dir both be used if either is used.
-if len([x for x in (args.inputDir, args.outputDir) if x is not None]) == 1:
+# Require that --input-dir and --output-dir both be used if either is used, except in JSONL mode where
+# --outputDir is optional and --inputDir is not allowed.
+if args.jsonl and args.inputDir is not None:
+    parser.error('--jsonl reads from STDIN and cannot be used with --inputDir')
+if not args.jsonl and len([x for x in (args.inputDir, args.outputDir) if x is not None]) == 1:
     parser.error('--inputDir and --outputDir must be given together')
 
 # Check that input and output directories exist.
 readSTDIN = (args.inputDir == None)
 if not readSTDIN:
     checkDirectoryExistence(args.inputDir[0], 'Input directory')
+if args.outputDir is not None:
     checkDirectoryExistence(args.outputDir[0], 'Output directory')
 
+# Worker processes are only used for batch processing, and are started by fork.
+jobs = args.jobs[0]
+if jobs < 1:
+    parser.error('--jobs must be at least 1')
+if jobs > 1 and readSTDIN:
+    parser.error('--jobs requires --inputDir and --outputDir')
+if args.incremental and readSTDIN:
+    parser.error('--incremental requires --inputDir and --outputDir')
+if args.dry_run and not args.incremental:
+    parser.error('--dry-run requires --incremental')
+if (args.profileFile is not None or args.profileSlowest != [10]) and not args.profile:
+    parser.error('--profileFile and --profileSlowest require --profile')
+if jobs > 1 and 'fork' not in multiprocessing.get_all_start_methods():
+    parser.error('--jobs is not supported on this platform')
+
 import api.inputjson as dset_input
 import api.translate.dset as dset_translate
 import api.output as dset_output
+import api.batch as dset_batch
+import api.manifest as dset_manifest
+import api.timing as timing
+import api.util.xml as xml
 
 import pprint
 
@@ -95,14 +154,81 @@ if args.template and args.template[0]:
 
 checkFileExistence(ISO_TEMPLATE_PATH, 'ISO template')
 
-if readSTDIN:
+# Check that the template has an element for every concept the translator fills in.
+try:
+    dset_translate.compileTemplate(ISO_TEMPLATE_PATH, args.stripTemplate)
+except ValueError as error:
+    parser.error(str(error))
+
+# Output formatting options.
+prettyPrint = not args.compact
+stripTemplate = args.stripTemplate
+
+# Turn on per-stage timing after the template is loaded, so one-time parsing is not counted against records.
+if args.profile:
+    timing.enable(args.profileSlowest[0])
+    atexit.register(timing.writeReport, args.profileFile[0] if args.profileFile else None)
+
+if args.jsonl:
+    # Translate each record as it arrives, so memory use does not grow with the number of records.
+    failureCount = 0
+    for lineNumber, inputText in dset_input.getJSONLines(sys.stdin):
+        recordStartTime = startTime = timing.startStage()
+        try:
+            jsonData = dset_input.getJSONData(inputText)
+            timing.endStage('decode', startTime)
+            isoTree = dset_translate.transformDSETToISOTree(jsonData, ISO_TEMPLATE_PATH, stripTemplate)
+        except Exception as error:
+            print(("  Failed to translate record on line " + str(lineNumber) + ": " + repr(error)), file=sys.stderr)
+            failureCount += 1
+            continue
+
+        startTime = timing.startStage()
+        if args.outputDir is not None:
+            outputFile = None
+            try:
+                recordID = jsonData['metadata_id']
+                # Each file is created only if its name is free, so records whose identifiers map to the same name,
+                # or files left by an earlier run, are not overwritten.
+                outputFile = dset_output.createOutputFileForID(recordID, args.outputDir[0])
+                if os.path.basename(outputFile) != dset_output.getFileNameForID(recordID) + '.xml':
+                    print(("  Warning: record on line " + str(lineNumber) + " has the file name of an existing file; "
+                           "writing " + outputFile), file=sys.stderr)
+                xml.writeFile(isoTree, outputFile, prettyPrint)
+            except Exception as error:
+                print(("  Failed to write record on line " + str(lineNumber) + ": " + repr(error)), file=sys.stderr)
+                failureCount += 1
+                if outputFile is not None:
+                    os.remove(outputFile)
+                continue
+            timing.endStage('serialize+write', startTime)
+        else:
+            isoBytes = xml.toBytes(isoTree, prettyPrint)
+            startTime = timing.endStage('serialize', startTime)
+            sys.stdout.buffer.write(isoBytes + b'\0')
+            sys.stdout.buffer.flush()
+            timing.endStage('write', startTime)
+
+        if recordStartTime is not None:
+            timing.endRecord('line %d' % lineNumber, timing.getRecordShape(jsonData, len(inputText)), recordStartTime)
+
+    if failureCount:
+        print(("Failed to translate " + str(failureCount) + " records."), file=sys.stderr)
+        sys.exit(1)
+
+elif readSTDIN:
+    recordStartTime = startTime = timing.startStage()
     inputText = sys.stdin.readlines()
     inputText = "".join(inputText)
+    startTime = timing.endStage('read', startTime)
 
     jsonData = dset_input.getJSONData(inputText)
+    timing.endStage('decode', startTime)
     # pprint.pprint(jsonData)
 
-    isoText = dset_translate.transformDSETToISO(jsonData, ISO_TEMPLATE_PATH)
+    isoText = dset_translate.transformDSETToISO(jsonData, ISO_TEMPLATE_PATH, prettyPrint, stripTemplate)
+    if recordStartTime is not None:
+        timing.endRecord('<stdin>', timing.getRecordShape(jsonData, len(inputText)), recordStartTime)
 
     # Python 3 needs conversion from byte array to string
     isoText = str(isoText)
@@ -114,18 +240,63 @@ else:
     print(inputDir, file=sys.stdout)
     jsonFiles = dset_input.getJSONFileNames(inputDir)
     print("Found " + str(len(jsonFiles)) + " input files.", file=sys.stdout)
-    for inputFile in jsonFiles:
-        with open(inputFile, 'r') as myfile:
-            inputText = myfile.readlines()
-            inputText = "".join(inputText)
-        jsonData = dset_input.getJSONData(inputText)
-
-        print(("  Translating file: " + inputFile), file=sys.stdout)
-        isoText = dset_translate.transformDSETToISO(jsonData, ISO_TEMPLATE_PATH)
-
-        outputFile = dset_output.prepareOutputFile(inputFile, inputDir, outputDir)
-        print((inputFile + " -> " + outputFile), file=sys.stdout)
 
-        file = open(outputFile, 'w')
-        file.write(isoText)
-        file.close()
+    # In incremental mode, only translate stale input files, and remove outputs of input files that no longer exist.
+    manifestJournal = None
+    if args.incremental:
+        jsonFiles, removedEntries, manifestEntries, newEntries = \
+            dset_manifest.planRebuild(jsonFiles, inputDir, outputDir, ISO_TEMPLATE_PATH,
+                                      {'prettyPrint': prettyPrint, 'stripTemplate': stripTemplate})
+        print(str(len(jsonFiles)) + " input files need translation; " + str(len(removedEntries)) +
+              " outputs of removed input files will be deleted.", file=sys.stdout)
+
+        if args.dry_run:
+            for inputFile in jsonFiles:
+                print("  rebuild: " + inputFile, file=sys.stdout)
+            for entry in removedEntries:
+                print("  delete: " + os.path.join(outputDir, entry['output']), file=sys.stdout)
+            sys.exit(0)
+
+        manifestJournal = dset_manifest.openManifestJournal(outputDir)
+        for entry in removedEntries:
+            outputFile = os.path.join(outputDir, entry['output'])
+            if os.path.isfile(outputFile):
+                os.remove(outputFile)
+            print("  Deleted output file: " + outputFile, file=sys.stdout)
+            dset_manifest.appendManifestEntry(manifestJournal, {'input': entry['input'], 'deleted': True})
+            del manifestEntries[entry['input']]
+
+    def recordTranslation(status):
+        """ Add a successful translation to the manifest, if one is kept. """
+        inputFile, outputFile, errorMessage = status
+        if manifestJournal and not errorMessage:
+            entry = newEntries[inputFile]
+            entry['output'] = os.path.relpath(outputFile, outputDir)
+            dset_manifest.appendManifestEntry(manifestJournal, entry)
+            manifestEntries[entry['input']] = entry
+
+    failureCount = 0
+    if jobs > 1:
+        statusList = dset_batch.translateFilesInParallel(jsonFiles, inputDir, outputDir, ISO_TEMPLATE_PATH, jobs,
+                                                         recordTranslation, prettyPrint, stripTemplate)
+        for inputFile, outputFile, errorMessage in statusList:
+            if errorMessage:
+                print(("  Failed to translate file: " + inputFile + ": " + errorMessage), file=sys.stderr)
+                failureCount += 1
+            else:
+                print((inputFile + " -> " + outputFile), file=sys.stdout)
+    else:
+        for inputFile in jsonFiles:
+            print(("  Translating file: " + inputFile), file=sys.stdout)
+            outputFile = dset_batch.translateFile(inputFile, inputDir, outputDir, ISO_TEMPLATE_PATH,
+                                                  prettyPrint, stripTemplate)
+            recordTranslation((inputFile, outputFile, None))
+            print((inputFile + " -> " + outputFile), file=sys.stdout)
+
+    if manifestJournal:
+        manifestJournal.close()
+        dset_manifest.writeManifest(outputDir, manifestEntries)
+
+    if failureCount:
+        print(("Failed to translate " + str(failureCount) + " input files."), file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,103 @@
+#
+# Python program for publishing ISO 19139 records to a CSW server, such as GeoNetwork.
+#
+
+import argparse
+import os
+import os.path
+import sys
+
+import api.csw as csw
+
+__version_info__ = ('2022', '11', '01')
+__version__ = '-'.join(__version_info__)
+
+PROGRAM_DESCRIPTION = '''
+
+A program for publishing a directory of ISO 19139 records to a CSW 2.0.2 server with batched Transactions.
+
+Each Transaction inserts many records, and several Transactions are sent at the same time.  The identifiers of
+inserted records are appended to an ID file, which utils/deletePushedCSWRecords.py can use to delete them again.
+
+The CSW password is read from the CSW_PASSWORD environment variable.
+
+Example usages:
+
+  * Publish all records in a directory, 200 records per Transaction, 4 Transactions at a time:
+
+       CSW_PASSWORD=... python push_csw.py --inputDir ./defaultOutputRecords --user admin --batchSize 200 --jobs 4
+
+
+  * Publish to a local GeoNetwork, and list the files of failed batches for a later retry:
+
+       python push_csw.py --inputDir ./defaultOutputRecords --url http://localhost:8080/geonetwork/srv/eng/csw-publication \\
+                          --failureFile failed_files.txt
+
+Program Version: '''
+
+
+class PrintHelpOnErrorParser(argparse.ArgumentParser):
+    def error(self, error_message):
+        sys.stderr.write('error: %s\n' % error_message)
+        self.print_help()
+        sys.exit(2)
+
+
+#
+#  Parse the command line options.
+#
+programHelp = PROGRAM_DESCRIPTION + __version__
+parser = PrintHelpOnErrorParser(description=programHelp, formatter_class=argparse.RawTextHelpFormatter)
+parser.add_argument("--inputDir", nargs=1, required=True, help="directory of ISO XML records to publish, searched recursively")
+parser.add_argument("--url", nargs=1, default=[csw.DEFAULT_CSW_URL], help="CSW publication endpoint.  Default: " + csw.DEFAULT_CSW_URL)
+parser.add_argument("--user", nargs=1, help="CSW user name for HTTP basic authentication")
+parser.add_argument("--batchSize", nargs=1, type=int, default=[csw.DEFAULT_BATCH_SIZE],
+                    help="number of records inserted by each Transaction.  Default: %d" % csw.DEFAULT_BATCH_SIZE)
+parser.add_argument("--jobs", nargs=1, type=int, default=[4], help="number of Transactions sent at the same time.  Default: 4")
+parser.add_argument("--idFile", nargs=1, default=['pushedRecordIDs.txt'],
+                    help="file to which the identifiers of inserted records are appended.  Default: pushedRecordIDs.txt")
+parser.add_argument("--failureFile", nargs=1, help="write the files of batches that could not be published to this file")
+parser.add_argument("--template", nargs=1, default=[csw.INSERT_TEMPLATE],
+                    help="CSW Transaction template.  Default: " + csw.INSERT_TEMPLATE)
+parser.add_argument('--version', action='version', version="%(prog)s (" + __version__ + ")")
+
+args = parser.parse_args()
+
+if not os.path.isdir(args.inputDir[0]):
+    parser.error('Input directory does not exist: %s\n' % args.inputDir[0])
+if not os.path.isfile(args.template[0]):
+    parser.error('Template file does not exist: %s\n' % args.template[0])
+if args.batchSize[0] < 1 or args.jobs[0] < 1:
+    parser.error('--batchSize and --jobs must be at least 1')
+
+filePaths = csw.getISORecordFiles(args.inputDir[0])
+session = csw.getCSWSession(args.user[0] if args.user else None, os.environ.get('CSW_PASSWORD'), args.jobs[0])
+
+print("##", file=sys.stderr)
+print(("## Publishing " + str(len(filePaths)) + " Records..."), file=sys.stderr)
+print("##", file=sys.stderr)
+
+insertedCount = 0
+failedFiles = []
+with open(args.idFile[0], 'a') as idFile:
+    for batch, insertedIDs, errorMessage in csw.publishRecordFiles(filePaths, args.url[0], session, args.batchSize[0],
+                                                                   args.jobs[0], args.template[0]):
+        if errorMessage:
+            print(("  Failed to publish batch starting with " + batch[0] + ": " + errorMessage), file=sys.stderr)
+            failedFiles.extend(batch)
+            continue
+        # Save record IDs as they are inserted, to allow later deletion through CSW.
+        for recordID in insertedIDs:
+            idFile.write(recordID + '\n')
+        idFile.flush()
+        insertedCount += len(insertedIDs)
+        print(("  Published " + str(insertedCount) + " Records."), file=sys.stderr)
+
+if args.failureFile:
+    with open(args.failureFile[0], 'w') as failureFile:
+        for filePath in failedFiles:
+            failureFile.write(filePath + '\n')
+
+print(('...Finished publishing records; ' + str(len(failedFiles)) + ' records failed.'), file=sys.stderr)
+if failedFiles:
+    sys.exit(1)
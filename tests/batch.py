@@ -0,0 +1,34 @@
+#
+#  To run these unit tests: type "./run_tests.sh" at a command prompt.
+#
+
+import unittest
+import os
+import tempfile
+
+import api.batch as batch
+
+
+#
+# Unit tests
+#
+class Batch_Test(unittest.TestCase):
+
+   def testGetSizeBalancedChunks_BalancesTotalSize(self):
+      ''' Every file should be placed in exactly one chunk, and chunk sizes should be balanced.
+      '''
+      fileSizes = [90, 50, 40, 30, 20, 10, 10, 10]
+      with tempfile.TemporaryDirectory() as tempDir:
+         filePaths = []
+         for fileIndex, fileSize in enumerate(fileSizes):
+            filePath = os.path.join(tempDir, 'record_%d.txt' % fileIndex)
+            with open(filePath, 'w') as recordFile:
+               recordFile.write('x' * fileSize)
+            filePaths.append(filePath)
+
+         chunks = batch.getSizeBalancedChunks(filePaths, 3)
+
+         chunkedPaths = [filePath for chunk in chunks for filePath in chunk]
+         self.assertEqual(sorted(chunkedPaths), sorted(filePaths))
+         chunkSizes = [sum(os.path.getsize(filePath) for filePath in chunk) for chunk in chunks]
+         self.assertEqual(sorted(chunkSizes), [80, 90, 90])
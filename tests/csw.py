@@ -0,0 +1,213 @@
+#
+#  To run these unit tests: type "./run_tests.sh" at a command prompt.
+#
+
+import unittest
+import os
+import re
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from lxml import etree as ElementTree
+
+import api.csw as csw
+
+
+#
+# Unit test Setup/Helper functions
+#
+
+TEST_FOLDER = os.path.dirname(os.path.abspath(__file__))
+INSERT_TEMPLATE_PATH = os.path.join(os.path.dirname(TEST_FOLDER), 'templates_ISO19139', 'insertCSW.xml')
+DELETE_TEMPLATE_PATH = os.path.join(os.path.dirname(TEST_FOLDER), 'templates_ISO19139', 'deleteCSW.xml')
+
+ISO_RECORD = '''<?xml version="1.0" encoding="UTF-8"?>
+<gmd:MD_Metadata xmlns:gmd="http://www.isotc211.org/2005/gmd" xmlns:gco="http://www.isotc211.org/2005/gco">
+  <gmd:fileIdentifier>
+    <gco:CharacterString>%s</gco:CharacterString>
+  </gmd:fileIdentifier>
+</gmd:MD_Metadata>
+'''
+
+TRANSACTION_RESPONSE = '''<?xml version="1.0" encoding="UTF-8"?>
+<csw:TransactionResponse xmlns:csw="http://www.opengis.net/cat/csw/2.0.2" xmlns:dc="http://purl.org/dc/elements/1.1/">
+  <csw:TransactionSummary>
+    <csw:totalInserted>%d</csw:totalInserted>
+    <csw:totalUpdated>0</csw:totalUpdated>
+    <csw:totalDeleted>0</csw:totalDeleted>
+  </csw:TransactionSummary>
+  %s
+</csw:TransactionResponse>
+'''
+
+DELETE_RESPONSE = '''<?xml version="1.0" encoding="UTF-8"?>
+<csw:TransactionResponse xmlns:csw="http://www.opengis.net/cat/csw/2.0.2">
+  <csw:TransactionSummary>
+    <csw:totalInserted>0</csw:totalInserted>
+    <csw:totalUpdated>0</csw:totalUpdated>
+    <csw:totalDeleted>%d</csw:totalDeleted>
+  </csw:TransactionSummary>
+</csw:TransactionResponse>
+'''
+
+EXCEPTION_REPORT = '''<?xml version="1.0" encoding="UTF-8"?>
+<ows:ExceptionReport xmlns:ows="http://www.opengis.net/ows" version="1.0.0">
+  <ows:Exception exceptionCode="NoApplicableCode">
+    <ows:ExceptionText>Record %s is invalid</ows:ExceptionText>
+  </ows:Exception>
+</ows:ExceptionReport>
+'''
+
+
+class TransactionHandler(BaseHTTPRequestHandler):
+   ''' A stand-in CSW publication endpoint.  Each Transaction's record IDs are saved in server.transactions, and
+       Insert Transactions containing a record listed in server.rejectedIDs are answered with an exception report.
+       Delete Transactions remove records from the server.catalog set.
+   '''
+   protocol_version = 'HTTP/1.1'
+
+   def do_POST(self):
+      transaction = ElementTree.fromstring(self.rfile.read(int(self.headers['Content-Length'])))
+      if transaction.xpath('csw:Delete', namespaces=csw.CSW_NAMESPACE_MAP):
+         self.deleteRecords(transaction)
+         return
+      recordIDs = transaction.xpath('csw:Insert/gmd:MD_Metadata/gmd:fileIdentifier/gco:CharacterString/text()',
+                                    namespaces=csw.CSW_NAMESPACE_MAP)
+      with self.server.lock:
+         self.server.transactions.append((self.client_address, self.headers.get('Authorization'), recordIDs))
+
+      rejectedIDs = [recordID for recordID in recordIDs if recordID in self.server.rejectedIDs]
+      if rejectedIDs:
+         body = EXCEPTION_REPORT % rejectedIDs[0]
+      else:
+         insertResults = ''.join('<csw:InsertResult><csw:BriefRecord><dc:identifier>%s</dc:identifier>'
+                                 '</csw:BriefRecord></csw:InsertResult>' % recordID for recordID in recordIDs)
+         body = TRANSACTION_RESPONSE % (len(recordIDs), insertResults)
+      self.sendXML(body)
+
+   def deleteRecords(self, transaction):
+      ''' Delete the records in server.catalog whose identifiers are given as literals in the filter. '''
+      literals = transaction.xpath('.//ogc:Literal/text()', namespaces=csw.CSW_NAMESPACE_MAP)
+      with self.server.lock:
+         self.server.transactions.append((self.client_address, self.headers.get('Authorization'), literals))
+         # The template's PropertyIsLike comparison uses '/' as its escape character.
+         deletedIDs = self.server.catalog.intersection(re.sub('/(.)', r'\1', literal) for literal in literals)
+         self.server.catalog -= deletedIDs
+      self.sendXML(DELETE_RESPONSE % len(deletedIDs))
+
+   def sendXML(self, body):
+      body = body.encode('utf-8')
+      self.send_response(200)
+      self.send_header('Content-Type', 'application/xml')
+      self.send_header('Content-Length', str(len(body)))
+      self.end_headers()
+      self.wfile.write(body)
+
+   def log_message(self, format, *args):
+      pass
+
+
+def writeISORecords(dirPath, recordIDs):
+   ''' Write a minimal ISO record file for each record ID, and return the sorted file paths. '''
+   for recordID in recordIDs:
+      with open(os.path.join(dirPath, recordID + '.xml'), 'w') as recordFile:
+         recordFile.write(ISO_RECORD % recordID)
+   return csw.getISORecordFiles(dirPath)
+
+
+#
+# Unit tests
+#
+class CSW_Test(unittest.TestCase):
+
+   def setUp(self):
+      self.server = ThreadingHTTPServer(('127.0.0.1', 0), TransactionHandler)
+      self.server.transactions = []
+      self.server.rejectedIDs = set()
+      self.server.catalog = set()
+      self.server.lock = threading.Lock()
+      threading.Thread(target=self.server.serve_forever, daemon=True).start()
+      self.url = 'http://127.0.0.1:%d/csw-publication' % self.server.server_port
+      self.recordDir = tempfile.TemporaryDirectory()
+
+   def tearDown(self):
+      self.server.shutdown()
+      self.server.server_close()
+      self.recordDir.cleanup()
+
+   def testBuildInsertTransaction_WrapsEachRecordInAnInsert(self):
+      ''' The template's example record should be dropped, and each record should get its own csw:Insert.
+      '''
+      recordRoots = [ElementTree.fromstring((ISO_RECORD % recordID).encode('utf-8')) for recordID in ['a', 'b']]
+      transaction = ElementTree.fromstring(csw.buildInsertTransaction(recordRoots, INSERT_TEMPLATE_PATH))
+      inserts = transaction.xpath('csw:Insert', namespaces=csw.CSW_NAMESPACE_MAP)
+      self.assertEqual(transaction.get('service'), 'CSW')
+      self.assertEqual([insert.get('handle') for insert in inserts], ['a', 'b'])
+      self.assertEqual([csw.getRecordID(insert[0]) for insert in inserts], ['a', 'b'])
+
+   def testPublishRecordFiles_SendsBatchesOverPooledConnections(self):
+      ''' Records should be sent in Transactions of batchSize records, with every inserted ID reported once.
+      '''
+      recordIDs = ['record-%02d' % i for i in range(25)]
+      filePaths = writeISORecords(self.recordDir.name, recordIDs)
+      session = csw.getCSWSession('admin', 'secret', poolSize=2)
+      results = list(csw.publishRecordFiles(filePaths, self.url, session, batchSize=10, jobs=2,
+                                            templateFilePath=INSERT_TEMPLATE_PATH))
+
+      self.assertEqual(sorted(recordID for batch, insertedIDs, errorMessage in results for recordID in insertedIDs),
+                       recordIDs)
+      self.assertEqual(sorted(len(recordIDs) for clientAddress, auth, recordIDs in self.server.transactions),
+                       [5, 10, 10])
+      self.assertTrue(all(auth.startswith('Basic ') for clientAddress, auth, recordIDs in self.server.transactions))
+      self.assertLessEqual(len({clientAddress for clientAddress, auth, recordIDs in self.server.transactions}), 2)
+
+   def testPublishRecordFiles_ReportsRejectedBatches(self):
+      ''' A batch answered with an exception report should be reported with its files, and other batches inserted.
+      '''
+      self.server.rejectedIDs = {'record-3'}
+      filePaths = writeISORecords(self.recordDir.name, ['record-%d' % i for i in range(6)])
+      results = list(csw.publishRecordFiles(filePaths, self.url, batchSize=3, templateFilePath=INSERT_TEMPLATE_PATH))
+
+      failedBatches = [(batch, errorMessage) for batch, insertedIDs, errorMessage in results if errorMessage]
+      self.assertEqual(len(failedBatches), 1)
+      self.assertEqual([os.path.basename(filePath) for filePath in failedBatches[0][0]],
+                       ['record-3.xml', 'record-4.xml', 'record-5.xml'])
+      self.assertIn('Record record-3 is invalid', failedBatches[0][1])
+      self.assertEqual([insertedIDs for batch, insertedIDs, errorMessage in results if not errorMessage],
+                       [['record-0', 'record-1', 'record-2']])
+
+   def testBuildDeleteTransaction_MatchesEveryIdentifierExactly(self):
+      ''' One identifier should need no ogc:Or, several should share one, and wildcards should be escaped.
+      '''
+      transaction = ElementTree.fromstring(csw.buildDeleteTransaction(['10.5065/D68S4N4H'], DELETE_TEMPLATE_PATH))
+      self.assertEqual(transaction.xpath('csw:Delete/csw:Constraint/ogc:Filter/ogc:PropertyIsLike/ogc:Literal/text()',
+                                         namespaces=csw.CSW_NAMESPACE_MAP), ['10.5065//D68S4N4H'])
+
+      transaction = ElementTree.fromstring(csw.buildDeleteTransaction(['a_1', 'b%2', 'c'], DELETE_TEMPLATE_PATH))
+      comparisons = transaction.xpath('csw:Delete/csw:Constraint/ogc:Filter/ogc:Or/ogc:PropertyIsLike',
+                                      namespaces=csw.CSW_NAMESPACE_MAP)
+      self.assertEqual([comparison[1].text for comparison in comparisons], ['a/_1', 'b/%2', 'c'])
+      self.assertEqual({comparison[0].text for comparison in comparisons}, {'apiso:identifier'})
+
+   def testDeleteRecordIDs_DeletesInBatches(self):
+      ''' Records should be deleted with one Transaction per batch, and each batch's deleted count reported.
+      '''
+      recordIDs = ['10.5065/record_%02d' % i for i in range(25)]
+      self.server.catalog = set(recordIDs[:24])
+      results = list(csw.deleteRecordIDs(recordIDs, self.url, batchSize=10, jobs=2, templateFilePath=DELETE_TEMPLATE_PATH))
+
+      self.assertEqual(sorted(recordID for batch, deletedCount, errorMessage in results for recordID in batch), recordIDs)
+      self.assertEqual(sum(deletedCount for batch, deletedCount, errorMessage in results), 24)
+      self.assertEqual(len(self.server.transactions), 3)
+      self.assertEqual(self.server.catalog, set())
+
+   def testParseTransactionResponse_ReadsTotalsWithoutInsertResults(self):
+      ''' Totals should be read even when the server does not list inserted identifiers.
+      '''
+      summary = csw.parseTransactionResponse(TRANSACTION_RESPONSE % (4, ''))
+      self.assertEqual(summary, {'totalInserted': 4, 'totalUpdated': 0, 'totalDeleted': 0, 'insertedIDs': []})
+
+
+if __name__ == '__main__':
+   unittest.main()
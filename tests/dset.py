@@ -0,0 +1,55 @@
+#
+#  To run these unit tests: type "./run_tests.sh" at a command prompt.
+#
+
+import unittest
+import json
+import os
+
+import api.translate.dset as dset_translate
+
+
+#
+# Unit test Setup/Helper functions
+#
+
+TEST_FOLDER = os.path.dirname(os.path.abspath(__file__))
+TOP_FOLDER = os.path.dirname(TEST_FOLDER)
+DSET_RECORD_PATH = os.path.join(TOP_FOLDER, 'defaultInputRecords', 'test_dset_full.txt')
+DSET_TEMPLATE_PATH = os.path.join(TOP_FOLDER, 'templates_ISO19139', 'dset_full.xml')
+
+ISO_NAMESPACES = {'gmd': 'http://www.isotc211.org/2005/gmd', 'gco': 'http://www.isotc211.org/2005/gco'}
+IDENTIFICATION_PATH = '/gmd:MD_Metadata/gmd:identificationInfo/gmd:MD_DataIdentification'
+
+
+def getRecordWithout(*fieldNames):
+   ''' Return the full DSET test record without the given fields. '''
+   with open(DSET_RECORD_PATH) as recordFile:
+      record = json.load(recordFile)
+   for fieldName in fieldNames:
+      del record[fieldName]
+   return record
+
+
+#
+# Unit tests
+#
+class DSET_Test(unittest.TestCase):
+
+   def testTransformDSETToISOTree_CutsStatusWithoutProgress(self):
+      ''' A record without 'progress' should have no gmd:status element, and keep its edition.
+      '''
+      record = getRecordWithout('progress')
+      isoTree = dset_translate.transformDSETToISOTree(record, DSET_TEMPLATE_PATH)
+      self.assertEqual(isoTree.xpath(IDENTIFICATION_PATH + '/gmd:status', namespaces=ISO_NAMESPACES), [])
+      self.assertEqual(isoTree.xpath(IDENTIFICATION_PATH + '/gmd:citation/gmd:CI_Citation/gmd:edition/gco:CharacterString/text()',
+                                     namespaces=ISO_NAMESPACES), [record['resource_version']])
+
+      record = getRecordWithout('progress', 'resource_version')
+      isoTree = dset_translate.transformDSETToISOTree(record, DSET_TEMPLATE_PATH)
+      self.assertEqual(isoTree.xpath(IDENTIFICATION_PATH + '/gmd:status | ' + IDENTIFICATION_PATH +
+                                     '/gmd:citation/gmd:CI_Citation/gmd:edition', namespaces=ISO_NAMESPACES), [])
+
+
+if __name__ == '__main__':
+   unittest.main()
@@ -0,0 +1,171 @@
+#
+#  To run these unit tests: type "./run_tests.sh" at a command prompt.
+#
+
+import unittest
+import json
+import os
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import urlparse, parse_qs
+
+import api.harvest as harvest
+import api.translate.datacite as datacite
+
+
+#
+# Unit test Setup/Helper functions
+#
+
+TEST_FOLDER = os.path.dirname(os.path.abspath(__file__))
+RESPONSE_FOLDER = os.path.join(TEST_FOLDER, 'dataciteResponses')
+TEMPLATE_PATH = os.path.join(os.path.dirname(TEST_FOLDER), 'templates_ISO19139', 'datacite.xml')
+
+
+class RecordedPageHandler(BaseHTTPRequestHandler):
+   ''' Serve recorded DataCite API pages, chosen by the page cursor, and single DOI records from those pages. '''
+   protocol_version = 'HTTP/1.1'
+   pageFiles = {'1': 'prefix_page1.json', 'MTYxNjQ1': 'prefix_page2.json'}
+
+   def do_GET(self):
+      url = urlparse(self.path)
+      query = parse_qs(url.query)
+      self.server.requests.append((self.client_address, query))
+      if url.path.startswith('/dois/'):
+         body = self.getDOIResponse(url.path[len('/dois/'):])
+      else:
+         body = self.getPageResponse(query.get('page[cursor]', [''])[0])
+      if body is None:
+         self.send_error(404)
+         return
+      self.send_response(200)
+      self.send_header('Content-Type', 'application/vnd.api+json')
+      self.send_header('Content-Length', str(len(body)))
+      self.end_headers()
+      self.wfile.write(body)
+
+   def getPageResponse(self, cursor):
+      pageFile = self.pageFiles.get(cursor)
+      if pageFile is None:
+         return None
+      with open(os.path.join(RESPONSE_FOLDER, pageFile), 'r') as responseFile:
+         return responseFile.read().replace('{baseURL}', self.server.baseURL).encode('utf-8')
+
+   def getDOIResponse(self, doi):
+      ''' Return a single-DOI response built from the records in the recorded pages. '''
+      for pageFile in self.pageFiles.values():
+         with open(os.path.join(RESPONSE_FOLDER, pageFile), 'r') as responseFile:
+            for record in json.load(responseFile)['data']:
+               if record['id'] == doi.lower():
+                  return json.dumps({'data': record}).encode('utf-8')
+      return None
+
+   def log_message(self, format, *args):
+      pass
+
+
+def startRecordedPageServer():
+   ''' Start a local stand-in for the DataCite API.  Return the server, whose baseURL attribute is its address. '''
+   server = ThreadingHTTPServer(('127.0.0.1', 0), RecordedPageHandler)
+   server.baseURL = 'http://127.0.0.1:%d' % server.server_port
+   server.requests = []
+   threading.Thread(target=server.serve_forever, daemon=True).start()
+   return server
+
+
+#
+# Unit tests
+#
+class Harvest_Test(unittest.TestCase):
+
+   def setUp(self):
+      self.server = startRecordedPageServer()
+      self.apiURL = self.server.baseURL + '/dois'
+
+   def tearDown(self):
+      self.server.shutdown()
+      self.server.server_close()
+
+   def testGetDataCitePrefixPages_FollowsCursorsOverOneConnection(self):
+      ''' Every page should be requested once, in order, and all requests should reuse one pooled connection.
+      '''
+      pages = list(harvest.getDataCitePrefixPages('10.5065', apiURL=self.apiURL, pageSize=2))
+      self.assertEqual([[record['id'] for record in page] for page in pages],
+                       [['10.5065/abcd-1234', '10.5065/efgh-5678'], ['10.5065/ijkl-9012']])
+
+      self.assertEqual([query['page[cursor]'] for clientAddress, query in self.server.requests], [['1'], ['MTYxNjQ1']])
+      self.assertEqual(self.server.requests[0][1]['prefix'], ['10.5065'])
+      self.assertEqual(len({clientAddress for clientAddress, query in self.server.requests}), 1)
+
+   def testTranslateDataCiteRecords_WritesOutputsAndReportsFailures(self):
+      ''' Translated records should be saved by DOI suffix, and untranslatable records should be reported.
+      '''
+      with tempfile.TemporaryDirectory() as outputDir:
+         translatedCount, failedDOIs = datacite.translateDataCiteRecords('10.5065', TEMPLATE_PATH, outputDir, self.apiURL)
+         self.assertEqual(translatedCount, 2)
+         self.assertEqual(failedDOIs, ['10.5065/IJKL-9012'])
+         self.assertEqual(sorted(os.listdir(outputDir)), ['ABCD-1234.xml', 'EFGH-5678.xml'])
+         with open(os.path.join(outputDir, 'ABCD-1234.xml'), 'r') as outputFile:
+            self.assertIn('First Dataset', outputFile.read())
+
+   def testTranslateDataCiteDOIs_TranslatesConcurrentlyAndListsFailuresInOrder(self):
+      ''' Each DOI should become an output file or a failure, and failures should keep the order of the DOI list.
+      '''
+      dois = ['10.5065/IJKL-9012', '10.5065/ABCD-1234', '10.5065/NOT-FOUND', '10.5065/EFGH-5678']
+      with tempfile.TemporaryDirectory() as outputDir:
+         translatedCount, failures = datacite.translateDataCiteDOIs(dois, TEMPLATE_PATH, outputDir, 3,
+                                                                    apiURL=self.apiURL + '/')
+         self.assertEqual(translatedCount, 2)
+         self.assertEqual([doi for doi, errorMessage in failures], ['10.5065/IJKL-9012', '10.5065/NOT-FOUND'])
+         self.assertIn('LookupError', failures[1][1])
+         self.assertEqual(sorted(os.listdir(outputDir)), ['ABCD-1234.xml', 'EFGH-5678.xml'])
+
+   def testTranslateDataCiteDOIs_BoundsTheFetchesInFlight(self):
+      ''' No more than jobs * FETCHES_PER_THREAD fetches should be started and not yet translated at any time.
+      '''
+      lock = threading.Lock()
+      counts = {'started': 0, 'translated': 0, 'mostInFlight': 0}
+
+      def fetchRecord(doi, *args):
+         with lock:
+            counts['started'] += 1
+            counts['mostInFlight'] = max(counts['mostInFlight'], counts['started'] - counts['translated'])
+         return {'doi': doi}
+
+      def translateRecord(record, templateFile, outputDir, usedNames):
+         counts['translated'] += 1
+
+      dois = ['10.5065/%04d' % i for i in range(200)]
+      with mock.patch.object(datacite.inputjson, 'getDataCiteRecords', side_effect=fetchRecord), \
+           mock.patch.object(datacite, 'translateDataCiteRecordToFile', side_effect=translateRecord):
+         self.assertEqual(datacite.translateDataCiteDOIs(dois, TEMPLATE_PATH, None, 2), (200, []))
+      self.assertEqual(counts['started'], 200)
+      self.assertLessEqual(counts['mostInFlight'], 2 * datacite.FETCHES_PER_THREAD)
+
+   def testTranslateDataCiteDOIs_KeepsDOIsWithTheSameSuffixApart(self):
+      ''' DOIs with the same suffix in different prefixes should each be written to their own output file.
+      '''
+      with open(os.path.join(RESPONSE_FOLDER, 'prefix_page1.json'), 'r') as responseFile:
+         attributes = json.load(responseFile)['data'][0]['attributes']
+
+      def fetchRecord(doi, *args):
+         return dict(attributes, doi=doi)
+
+      dois = ['10.5065/ABCD-1234', '10.26024/ABCD-1234']
+      with tempfile.TemporaryDirectory() as outputDir:
+         with mock.patch.object(datacite.inputjson, 'getDataCiteRecords', side_effect=fetchRecord):
+            self.assertEqual(datacite.translateDataCiteDOIs(dois, TEMPLATE_PATH, outputDir, 1), (2, []))
+         outputNames = sorted(os.listdir(outputDir))
+         self.assertEqual(outputNames, ['ABCD-1234.xml', 'ABCD-1234_2.xml'])
+         outputTexts = []
+         for outputName in outputNames:
+            with open(os.path.join(outputDir, outputName), 'r') as outputFile:
+               outputTexts.append(outputFile.read())
+         # The fetches may finish in either order, so either DOI may get the first name.
+         self.assertEqual(sorted('10.26024/' in outputText for outputText in outputTexts), [False, True])
+
+
+if __name__ == '__main__':
+   unittest.main()
@@ -0,0 +1,91 @@
+#
+#  To run these unit tests: type "./run_tests.sh" at a command prompt.
+#
+
+import unittest
+import itertools
+import random
+from unittest import mock
+
+import utils.harvest_mappings as harvest_mappings
+
+
+#
+# Unit test Setup/Helper functions
+#
+
+def getStandardResourceFormatByLoop(format_string):
+   ''' The original mapping: test each key of RESOURCE_FORMAT_MAPPING in turn, and return the first one found. '''
+   if not format_string:
+      return harvest_mappings.MISSING_FORMAT_STRING
+
+   test_string = format_string.lower()
+   for key, value in harvest_mappings.RESOURCE_FORMAT_MAPPING.items():
+      if key in test_string:
+         return value
+   return harvest_mappings.OTHER_FORMAT_STRING
+
+
+def getTestStrings():
+   ''' Return format strings covering every key alone, every ordered pair of keys, joined and overlapping,
+       in several letter cases, every substring of all keys joined together, and random strings of key letters.
+   '''
+   keys = list(harvest_mappings.RESOURCE_FORMAT_MAPPING)
+   testStrings = ['', None, 'x', ' ', 'Unknown format', 'NetCDF-4 / HDF5', 'ASCII text (CSV)', 'image/png; image/jpeg']
+   for key in keys:
+      testStrings += [key, key.upper(), key.title(), ' %s ' % key]
+   for first, second in itertools.permutations(keys, 2):
+      testStrings += [first + second, first + ' ' + second, (first + '/' + second).upper()]
+      # Let the end of the first key overlap the start of the second.
+      for overlap in range(1, min(len(first), len(second))):
+         if first[-overlap:] == second[:overlap]:
+            testStrings.append(first + second[overlap:])
+
+   allKeys = ''.join(keys)
+   testStrings += [allKeys[start:end] for start in range(len(allKeys)) for end in range(start + 1, len(allKeys) + 1)]
+
+   randomStream = random.Random(0)
+   letters = sorted(set(allKeys.upper() + allKeys + ' .-_'))
+   testStrings += [''.join(randomStream.choice(letters) for i in range(randomStream.randint(1, 12)))
+                   for j in range(20000)]
+   return testStrings
+
+
+#
+# Unit tests
+#
+class HarvestMappings_Test(unittest.TestCase):
+
+   def testGetStandardResourceFormat_MatchesTheKeyLoop(self):
+      ''' The compiled matcher should give the same result as testing each key in turn, for every test string.
+      '''
+      testStrings = getTestStrings()
+      for testString in testStrings:
+         self.assertEqual(harvest_mappings.getStandardResourceFormat(testString),
+                          getStandardResourceFormatByLoop(testString), testString)
+      self.assertEqual(harvest_mappings.getStandardResourceFormats(testStrings),
+                       [getStandardResourceFormatByLoop(testString) for testString in testStrings])
+
+   def testGetStandardResourceFormat_KeepsFirstKeyPriority(self):
+      ''' The earliest key in the mapping should win, wherever it occurs in the string.
+      '''
+      self.assertEqual(harvest_mappings.getStandardResourceFormat('ASCII, then NetCDF'), 'NetCDF')
+      self.assertEqual(harvest_mappings.getStandardResourceFormat('unknown tiff'), 'TIFF')
+
+   def testGetStandardResourceFormat_UsesTheChangedMapping(self):
+      ''' As soon as the mapping changes, remembered results should not be used, and new keys should come after the
+          existing ones.
+      '''
+      self.assertEqual(harvest_mappings.getStandardResourceFormat('GeoTIF'), 'OTHER')
+      self.assertEqual(harvest_mappings.getStandardResourceFormats(['GeoTIF']), ['OTHER'])
+      with mock.patch.dict(harvest_mappings.RESOURCE_FORMAT_MAPPING, {'geotif': 'GeoTIFF'}):
+         self.assertEqual(harvest_mappings.getStandardResourceFormats(['GeoTIF']), ['GeoTIFF'])
+         self.assertEqual(harvest_mappings.getStandardResourceFormat('GeoTIF'), 'GeoTIFF')
+         self.assertEqual(harvest_mappings.getStandardResourceFormat('GeoTIFF'), 'TIFF')
+         self.assertEqual(harvest_mappings.getStandardResourceFormat('GeoTIFF'),
+                          getStandardResourceFormatByLoop('GeoTIFF'))
+      self.assertEqual(harvest_mappings.getStandardResourceFormat('GeoTIF'), 'OTHER')
+
+
+if __name__ == '__main__':
+   unittest.main()
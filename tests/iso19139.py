@@ -4,6 +4,7 @@
 
 import unittest
 import json
+import time
 from lxml.etree import Element
 from lxml import etree as ElementTree
 
@@ -32,6 +33,42 @@ def getEmptyTemporalExtentXMLTree():
     return root
 
 
+def getContactListXMLTree():
+    ''' Create a simplified XML Tree with one empty contact element, followed by another element. '''
+    root = ElementTree.fromstring('''
+    <root xmlns:gco="http://www.isotc211.org/2005/gco"
+          xmlns:gmd="http://www.isotc211.org/2005/gmd">
+      <gmd:citedResponsibleParty>
+        <gmd:CI_ResponsibleParty>
+          <gmd:individualName><gco:CharacterString></gco:CharacterString></gmd:individualName>
+          <gmd:organisationName><gco:CharacterString></gco:CharacterString></gmd:organisationName>
+          <gmd:positionName><gco:CharacterString></gco:CharacterString></gmd:positionName>
+          <gmd:contactInfo><gmd:CI_Contact><gmd:address><gmd:CI_Address>
+            <gmd:electronicMailAddress><gco:CharacterString></gco:CharacterString></gmd:electronicMailAddress>
+          </gmd:CI_Address></gmd:address></gmd:CI_Contact></gmd:contactInfo>
+          <gmd:role><gmd:CI_RoleCode codeListValue=""></gmd:CI_RoleCode></gmd:role>
+        </gmd:CI_ResponsibleParty>
+      </gmd:citedResponsibleParty>
+      <gmd:presentationForm/>
+    </root>
+    ''')
+    return root
+
+
+def timeAppendContactList(contactCount):
+    ''' Return the best of three times to append a number of contacts to a contact list. '''
+    contacts = [{'name': 'Author %d' % index} for index in range(contactCount)]
+    bestTime = None
+    for _ in range(3):
+        root = getContactListXMLTree()
+        startTime = time.perf_counter()
+        iso.appendContactList(root, 'gmd:citedResponsibleParty', contacts, 'author')
+        runTime = time.perf_counter() - startTime
+        if bestTime is None or runTime < bestTime:
+            bestTime = runTime
+    return bestTime
+
+
 #
 # Unit tests
 #
@@ -56,4 +93,22 @@ class ISO19139_Test(unittest.TestCase):
       element = xml.getElement(xml_tree, iso.childXPaths['extentEnd'])
       self.assertEqual(element.attrib['indeterminatePosition'], extentRecord['end'])
 
+   def testAppendContactList_InsertsContactsInOrderAfterLastContact(self):
+      ''' Appended contacts should follow the existing contact, in list order, before any following element.
+      '''
+      root = getContactListXMLTree()
+      iso.appendContactList(root, 'gmd:citedResponsibleParty', [{'name': 'A'}, {'name': 'B'}], 'author')
+      iso.appendContactData(root, 'gmd:citedResponsibleParty', {'organization': 'C'}, 'publisher')
 
+      names = xml.getElements(root, 'gmd:citedResponsibleParty//gmd:individualName/gco:CharacterString')
+      self.assertEqual([element.text for element in names], [None, 'A', 'B', ''])
+      roles = xml.getElements(root, 'gmd:citedResponsibleParty//gmd:role/gmd:CI_RoleCode')
+      self.assertEqual([element.attrib['codeListValue'] for element in roles], ['', 'author', 'author', 'publisher'])
+      self.assertEqual(ElementTree.QName(root[-1]).localname, 'presentationForm')
+
+   def testAppendContactList_ScalesLinearly(self):
+      ''' Appending eight times as many contacts should take roughly eight times as long, not sixty-four.
+      '''
+      smallTime = timeAppendContactList(250)
+      largeTime = timeAppendContactList(2000)
+      self.assertLess(largeTime / smallTime, 20)
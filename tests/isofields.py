@@ -0,0 +1,110 @@
+#
+#  To run these unit tests: type "./run_tests.sh" at a command prompt.
+#
+
+import unittest
+import glob
+import os
+
+import api.isofields as isofields
+import api.translate.datacite as datacite_translate
+from benchmarks.records import makeDataCiteRecord, getScaledShape
+
+
+#
+# Unit test Setup/Helper functions
+#
+
+TEST_FOLDER = os.path.dirname(os.path.abspath(__file__))
+TOP_FOLDER = os.path.dirname(TEST_FOLDER)
+DATACITE_TEMPLATE_PATH = os.path.join(TOP_FOLDER, 'templates_ISO19139', 'datacite.xml')
+
+ISO_RECORD = '''<?xml version="1.0" encoding="UTF-8"?>
+<gmd:MD_Metadata xmlns:gmd="http://www.isotc211.org/2005/gmd" xmlns:gco="http://www.isotc211.org/2005/gco">
+  <gmd:identificationInfo>
+    <gmd:MD_DataIdentification>
+      <gmd:citation>
+        <gmd:CI_Citation>
+          %s
+        </gmd:CI_Citation>
+      </gmd:citation>
+      <gmd:descriptiveKeywords>
+        <gmd:MD_Keywords>
+          <gmd:keyword><gco:CharacterString>  Text </gco:CharacterString></gmd:keyword>
+          <gmd:thesaurusName><gmd:CI_Citation>
+            <gmd:title><gco:CharacterString>DataCite Resource Types</gco:CharacterString></gmd:title>
+          </gmd:CI_Citation></gmd:thesaurusName>
+        </gmd:MD_Keywords>
+      </gmd:descriptiveKeywords>
+    </gmd:MD_DataIdentification>
+  </gmd:identificationInfo>
+  <gmd:distributionInfo>%s</gmd:distributionInfo>
+</gmd:MD_Metadata>
+'''
+
+CONTACT = '''<gmd:citedResponsibleParty><gmd:CI_ResponsibleParty>
+  <gmd:individualName><gco:CharacterString>%s</gco:CharacterString></gmd:individualName>
+  <gmd:organisationName><gco:CharacterString>%s</gco:CharacterString></gmd:organisationName>
+  <gmd:role><gmd:CI_RoleCode codeListValue="%s"/></gmd:role>
+</gmd:CI_ResponsibleParty></gmd:citedResponsibleParty>'''
+
+
+def getRecordBytes(contacts, distribution=''):
+   ''' Return a minimal ISO record with the given cited contacts, as bytes. '''
+   return (ISO_RECORD % (''.join(CONTACT % contact for contact in contacts), distribution)).encode('utf-8')
+
+
+#
+# Unit tests
+#
+class ISOFields_Test(unittest.TestCase):
+
+   def assertEnginesAgree(self, source):
+      ''' Both engines should extract the same values, for all fields at once and for each field alone. '''
+      fieldNames = list(isofields.FIELD_DEFAULTS)
+      fields = isofields.getFields(source, fieldNames, 'tree')
+      self.assertEqual(isofields.getFields(source, fieldNames, 'stream'), fields)
+      for fieldName in fieldNames:
+         self.assertEqual(isofields.getFields(source, [fieldName], 'stream'), {fieldName: fields[fieldName]})
+      return fields
+
+   def testEngines_AgreeOnTemplatesAndLargeRecords(self):
+      ''' The engines should agree on every ISO template and default output record, and on a large record
+          translated from DataCite.
+      '''
+      for recordPath in glob.glob(os.path.join(TOP_FOLDER, 'templates_ISO19139', '*.xml')) + \
+                        glob.glob(os.path.join(TOP_FOLDER, 'defaultOutputRecords', '*.xml')):
+         self.assertEnginesAgree(recordPath)
+
+      record = makeDataCiteRecord(getScaledShape(200))
+      isoRecord = datacite_translate.translateDataCiteRecord(record, DATACITE_TEMPLATE_PATH)
+      fields = self.assertEnginesAgree(isoRecord.encode('utf-8'))
+      self.assertEqual(len(fields['resourceFormats']), 200)
+      self.assertEqual(fields['resourceType'], 'dataset')
+      self.assertTrue(fields['geoExtent'])
+
+   def testEngines_AgreeOnPublisherChoice(self):
+      ''' The first publisher's individual name, or else its organisation name, should be the publisher.
+      '''
+      fields = self.assertEnginesAgree(getRecordBytes([('A', 'Org A', 'author'), ('', 'Org B', 'publisher'),
+                                                       ('C', 'Org C', 'publisher')]))
+      self.assertEqual(fields['publisher'], 'Org B')
+      self.assertEqual(fields['resourceType'], 'publication')
+      fields = self.assertEnginesAgree(getRecordBytes([('A', 'Org A', 'publisher')]))
+      self.assertEqual(fields['publisher'], 'A')
+      fields = self.assertEnginesAgree(getRecordBytes([('A', 'Org A', 'author')]))
+      self.assertEqual(fields['publisher'], '')
+
+   def testStreamEngine_StopsAfterIdentificationInfo(self):
+      ''' The stream engine should not read past the identificationInfo elements, so a record that is malformed
+          after them is still read, while the tree engine cannot parse it.
+      '''
+      source = getRecordBytes([('A', 'Org A', 'publisher')], '<gmd:MD_Distribution><unclosed></gmd:MD_Distribution>')
+      self.assertIsNone(isofields.getFields(source, ['publisher'], 'tree'))
+      self.assertEqual(isofields.getFields(source, ['publisher', 'resourceType', 'geoExtent'], 'stream'),
+                       {'publisher': 'A', 'resourceType': 'publication', 'geoExtent': False})
+      self.assertIsNone(isofields.getFields(b'<gmd:MD_Metadata', ['publisher'], 'stream'))
+
+
+if __name__ == '__main__':
+   unittest.main()
@@ -0,0 +1,131 @@
+#
+#  To run these unit tests: type "./run_tests.sh" at a command prompt.
+#
+
+import unittest
+import os
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+import api.isofields as isofields
+import api.isoindex as isoindex
+import utils.harvest_mappings as harvest_mappings
+
+
+#
+# Unit test Setup/Helper functions
+#
+
+ISO_RECORD = '''<?xml version="1.0" encoding="UTF-8"?>
+<gmd:MD_Metadata xmlns:gmd="http://www.isotc211.org/2005/gmd" xmlns:gco="http://www.isotc211.org/2005/gco">
+  <gmd:fileIdentifier><gco:CharacterString>%s</gco:CharacterString></gmd:fileIdentifier>
+  <gmd:identificationInfo>
+    <gmd:MD_DataIdentification>
+      <gmd:citation><gmd:CI_Citation>
+        <gmd:citedResponsibleParty><gmd:CI_ResponsibleParty>
+          <gmd:organisationName><gco:CharacterString>%s</gco:CharacterString></gmd:organisationName>
+          <gmd:role><gmd:CI_RoleCode codeListValue="publisher"/></gmd:role>
+        </gmd:CI_ResponsibleParty></gmd:citedResponsibleParty>
+      </gmd:CI_Citation></gmd:citation>
+      %s
+      <gmd:descriptiveKeywords><gmd:MD_Keywords>
+        <gmd:keyword><gco:CharacterString>Dataset</gco:CharacterString></gmd:keyword>
+        <gmd:thesaurusName><gmd:CI_Citation>
+          <gmd:title><gco:CharacterString>Resource Type</gco:CharacterString></gmd:title>
+        </gmd:CI_Citation></gmd:thesaurusName>
+      </gmd:MD_Keywords></gmd:descriptiveKeywords>
+    </gmd:MD_DataIdentification>
+  </gmd:identificationInfo>
+</gmd:MD_Metadata>
+'''
+
+RESOURCE_FORMAT = '''<gmd:resourceFormat><gmd:MD_Format>
+  <gmd:name><gco:CharacterString>%s</gco:CharacterString></gmd:name>
+</gmd:MD_Format></gmd:resourceFormat>'''
+
+
+def writeISORecord(filePath, fileIdentifier, publisher='UCAR', formats=()):
+   ''' Write a minimal ISO record with the given file identifier, publisher and resource formats. '''
+   os.makedirs(os.path.dirname(filePath), exist_ok=True)
+   with open(filePath, 'w') as recordFile:
+      recordFile.write(ISO_RECORD % (fileIdentifier, publisher, ''.join(RESOURCE_FORMAT % name for name in formats)))
+
+
+#
+# Unit tests
+#
+class ISOIndex_Test(unittest.TestCase):
+
+   def setUp(self):
+      self.tempDir = tempfile.TemporaryDirectory()
+      self.inputDir = os.path.join(self.tempDir.name, 'records')
+      for i in range(12):
+         writeISORecord(os.path.join(self.inputDir, '%02d' % (i % 3), 'record_%02d.xml' % i), 'id-%02d' % i,
+                        formats=['NetCDF', 'text/csv', 'my format %d' % i][:i % 4])
+      with open(os.path.join(self.inputDir, 'broken.xml'), 'w') as brokenFile:
+         brokenFile.write('<gmd:MD_Metadata')
+      self.index = isoindex.FieldIndex(os.path.join(self.tempDir.name, 'index.sqlite'))
+
+   def tearDown(self):
+      self.index.close()
+      self.tempDir.cleanup()
+
+   def testGetFields_MatchesAScanInScanOrder(self):
+      ''' The index should return the fields a scan of the directory would extract, in the order of the scan.
+      '''
+      self.assertEqual(self.index.update(self.inputDir), (13, 0))
+      fieldNames = isoindex.INDEXED_FIELDS
+      scanned = [(path.as_posix(), isofields.getFields(path.as_posix(), fieldNames))
+                 for path in Path(self.inputDir).rglob('*.xml')]
+      indexed = list(self.index.getFields(fieldNames))
+
+      self.assertEqual([(path, fields and {name: fields[name] for name in fieldNames}) for path, fields in indexed],
+                       scanned)
+      self.assertEqual([fields['standardResourceFormats'] for path, fields in indexed if fields],
+                       [[harvest_mappings.getStandardResourceFormat(name) for name in fields['resourceFormats']]
+                        for path, fields in scanned if fields])
+
+   def testUpdate_ParsesOnlyNewAndChangedFiles(self):
+      ''' A second update should parse only new and changed files, and drop removed ones.
+      '''
+      self.index.update(self.inputDir)
+      writeISORecord(os.path.join(self.inputDir, '00', 'record_00.xml'), 'id-00', publisher='Changed publisher')
+      writeISORecord(os.path.join(self.inputDir, '01', 'record_new.xml'), 'id-new')
+      os.remove(os.path.join(self.inputDir, '02', 'record_02.xml'))
+
+      with mock.patch.object(isofields, 'getFields', wraps=isofields.getFields) as getFields:
+         self.assertEqual(self.index.update(self.inputDir), (2, 1))
+         self.assertEqual(sorted(os.path.basename(call[0][0]) for call in getFields.call_args_list),
+                          ['record_00.xml', 'record_new.xml'])
+         self.assertEqual(self.index.update(self.inputDir), (0, 0))
+
+      publishers = dict(self.index.getFields(['publisher']))
+      self.assertEqual(publishers[Path(self.inputDir, '00', 'record_00.xml').as_posix()], {'publisher': 'Changed publisher'})
+      self.assertEqual(list(publishers), [path.as_posix() for path in Path(self.inputDir).rglob('*.xml')])
+
+   def testGetDuplicateIdentifiers_ListsSharedIdentifiers(self):
+      ''' Files sharing a file identifier should be listed together, and unique identifiers left out.
+      '''
+      writeISORecord(os.path.join(self.inputDir, 'copy_a.xml'), 'id-03')
+      writeISORecord(os.path.join(self.inputDir, 'copy_b.xml'), 'id-03')
+      self.index.update(self.inputDir)
+      duplicates = self.index.getDuplicateIdentifiers()
+      self.assertEqual([(fileIdentifier, sorted(os.path.basename(path) for path in paths))
+                        for fileIdentifier, paths in duplicates],
+                       [('id-03', ['copy_a.xml', 'copy_b.xml', 'record_03.xml'])])
+
+   def testOpen_RestandardizesFormatsWhenTheMappingChanges(self):
+      ''' Reopening an index after the format mapping changed should update the standardized formats.
+      '''
+      self.index.update(self.inputDir)
+      self.index.close()
+      with mock.patch.dict(harvest_mappings.RESOURCE_FORMAT_MAPPING, {'my format': 'MINE'}):
+         self.index = isoindex.FieldIndex(os.path.join(self.tempDir.name, 'index.sqlite'))
+         standardFormats = {name for path, fields in self.index.getFields(['resourceFormats']) if fields
+                            for name in fields['standardResourceFormats']}
+      self.assertIn('MINE', standardFormats)
+
+
+if __name__ == '__main__':
+   unittest.main()
@@ -0,0 +1,99 @@
+#
+#  To run these unit tests: type "./run_tests.sh" at a command prompt.
+#
+
+import unittest
+import random
+from collections import Counter
+
+from api.isosummary import FieldSummary
+
+
+#
+# Unit test Setup/Helper functions
+#
+
+REPORT_TYPES = ['publisher', 'standardResourceFormat', 'geoExtent']
+
+
+def getRecordValues(count):
+   ''' Return a list of (resourceType, values) for count random records, some with no publisher or formats. '''
+   randomStream = random.Random(0)
+   records = []
+   for i in range(count):
+      values = {'publisher': randomStream.choice(['UCAR', 'NCAR', '']),
+                'standardResourceFormat': randomStream.sample(['NetCDF', 'CSV', 'PDF'], randomStream.randint(0, 2)),
+                'geoExtent': randomStream.random() < 0.75}
+      records.append((randomStream.choice(['dataset', 'text', '']), values))
+   return records
+
+
+#
+# Unit tests
+#
+class FieldSummary_Test(unittest.TestCase):
+
+   def testMerge_MatchesOneSummaryOfAllRecords(self):
+      ''' Summaries of separate parts of the records, merged, should equal a summary of all the records.
+      '''
+      records = getRecordValues(500)
+      summary = FieldSummary(REPORT_TYPES)
+      for resourceType, values in records:
+         summary.add(resourceType, values)
+      summary.addUnparsed()
+
+      merged = FieldSummary(REPORT_TYPES)
+      for start in range(0, len(records), 64):
+         partSummary = FieldSummary(REPORT_TYPES)
+         for resourceType, values in records[start:start + 64]:
+            partSummary.add(resourceType, values)
+         merged.merge(partSummary)
+      unparsedSummary = FieldSummary(REPORT_TYPES)
+      unparsedSummary.addUnparsed()
+      merged.merge(unparsedSummary)
+
+      self.assertEqual(merged.getLines(), summary.getLines())
+      self.assertEqual(sum(summary.getCounts('geoExtent').values()), 500)
+      self.assertEqual(summary.getCounts('publisher', 'dataset'),
+                       Counter(values['publisher'] for resourceType, values in records if resourceType == 'dataset'))
+
+   def testGetLines_ListsCountsAndShares(self):
+      ''' The summary should list counts from the most frequent value, count records with no value as "(none)",
+          and give the share of records with and without a flag, overall and for each resource type.
+      '''
+      summary = FieldSummary(['standardResourceFormat', 'geoExtent'])
+      summary.add('dataset', {'standardResourceFormat': ['NetCDF', 'CSV', 'NetCDF'], 'geoExtent': True})
+      summary.add('dataset', {'standardResourceFormat': [], 'geoExtent': False})
+      summary.add('text', {'standardResourceFormat': ['CSV'], 'geoExtent': True})
+      summary.addUnparsed()
+
+      self.assertEqual(summary.getLines(),
+                       ['# records',
+                        '       3  parsed',
+                        '       1  unparsed',
+                        '# resourceType',
+                        '       2  dataset',
+                        '       1  text',
+                        '# standardResourceFormat',
+                        '       2  CSV',
+                        '       2  NetCDF',
+                        '       1  (none)',
+                        '# standardResourceFormat, resourceType dataset',
+                        '       2  NetCDF',
+                        '       1  (none)',
+                        '       1  CSV',
+                        '# standardResourceFormat, resourceType text',
+                        '       1  CSV',
+                        '# geoExtent',
+                        '       2   66.7%  with geoExtent',
+                        '       1   33.3%  without geoExtent',
+                        '# geoExtent, resourceType dataset',
+                        '       1   50.0%  with geoExtent',
+                        '       1   50.0%  without geoExtent',
+                        '# geoExtent, resourceType text',
+                        '       1  100.0%  with geoExtent',
+                        '       0    0.0%  without geoExtent'])
+
+
+if __name__ == '__main__':
+   unittest.main()
@@ -0,0 +1,53 @@
+#
+#  To run these unit tests: type "./run_tests.sh" at a command prompt.
+#
+
+import unittest
+import os
+import tempfile
+
+import api.manifest as manifest
+
+
+#
+# Unit test Setup/Helper functions
+#
+
+def writeFile(filePath, text):
+    ''' Write a small text file, creating its folder if needed. '''
+    os.makedirs(os.path.dirname(filePath), exist_ok=True)
+    with open(filePath, 'w') as file:
+        file.write(text)
+    return filePath
+
+
+#
+# Unit tests
+#
+class Manifest_Test(unittest.TestCase):
+
+   def testPlanRebuild_FindsStaleAndRemovedInputs(self):
+      ''' Only new or changed inputs should be stale, and manifest entries without an input should be removed.
+      '''
+      with tempfile.TemporaryDirectory() as tempDir:
+         inputDir = os.path.join(tempDir, 'input')
+         outputDir = os.path.join(tempDir, 'output')
+         templatePath = writeFile(os.path.join(tempDir, 'template.xml'), '<Root/>')
+         unchangedFile = writeFile(os.path.join(inputDir, 'unchanged.txt'), '{}')
+         changedFile = writeFile(os.path.join(inputDir, 'changed.txt'), '{}')
+         removedFile = writeFile(os.path.join(inputDir, 'removed.txt'), '{}')
+
+         inputFiles = [unchangedFile, changedFile, removedFile]
+         staleFiles, removedEntries, entries, newEntries = manifest.planRebuild(inputFiles, inputDir, outputDir, templatePath)
+         self.assertEqual(staleFiles, inputFiles)
+         for inputFile in inputFiles:
+            entry = newEntries[inputFile]
+            entry['output'] = os.path.basename(writeFile(os.path.join(outputDir, entry['input'] + '.xml'), '<Root/>'))
+            entries[entry['input']] = entry
+         manifest.writeManifest(outputDir, entries)
+
+         writeFile(changedFile, '{"title": "changed"}')
+         inputFiles = [unchangedFile, changedFile]
+         staleFiles, removedEntries, entries, newEntries = manifest.planRebuild(inputFiles, inputDir, outputDir, templatePath)
+         self.assertEqual(staleFiles, [changedFile])
+         self.assertEqual([entry['input'] for entry in removedEntries], ['removed.txt'])
@@ -0,0 +1,96 @@
+#
+#  To run these unit tests: type "./run_tests.sh" at a command prompt.
+#
+
+import unittest
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import api.output as dset_output
+
+
+#
+# Unit test Setup/Helper functions
+#
+
+TEST_FOLDER = os.path.dirname(os.path.abspath(__file__))
+TOP_FOLDER = os.path.dirname(TEST_FOLDER)
+DSET_RECORD_PATH = os.path.join(TOP_FOLDER, 'defaultInputRecords', 'test_dset_full.txt')
+
+
+def getJSONLinesWithIDs(recordIDs):
+   ''' Return newline-delimited copies of the full DSET test record, one per identifier; None leaves it out. '''
+   with open(DSET_RECORD_PATH) as recordFile:
+      record = json.load(recordFile)
+   lines = []
+   for recordID in recordIDs:
+      lineRecord = dict(record)
+      if recordID is None:
+         del lineRecord['metadata_id']
+      else:
+         lineRecord['metadata_id'] = recordID
+      lines.append(json.dumps(lineRecord) + '\n')
+   return ''.join(lines)
+
+
+#
+# Unit tests
+#
+class Output_Test(unittest.TestCase):
+
+   def testPrepareOutputFileForID_NamesNonStringAndCollidingIDs(self):
+      ''' Identifiers of any type should be named by their string form, and identifiers that map to the same name
+          should get distinct names.
+      '''
+      self.assertEqual(dset_output.prepareOutputFileForID(12345, 'out'), os.path.join('out', '12345.xml'))
+      usedNames = set()
+      outputFiles = [dset_output.prepareOutputFileForID(recordID, 'out', usedNames)
+                     for recordID in ['a/b', 'a_b', 'a b', 'a_b_2']]
+      self.assertEqual(outputFiles, [os.path.join('out', name) for name in
+                                     ['a_b.xml', 'a_b_2.xml', 'a_b_3.xml', 'a_b_2_2.xml']])
+
+   def testCreateOutputFileForID_NeverReusesAnExistingName(self):
+      ''' A name already taken in the output directory should get a numeric suffix, leaving the existing file as it
+          was.
+      '''
+      with tempfile.TemporaryDirectory() as outputDir:
+         with open(os.path.join(outputDir, 'a_b.xml'), 'w') as existingFile:
+            existingFile.write('earlier run')
+         outputFiles = [dset_output.createOutputFileForID(recordID, outputDir) for recordID in ['a/b', 'a b', 7]]
+         self.assertEqual(outputFiles, [os.path.join(outputDir, name) for name in ['a_b_2.xml', 'a_b_3.xml', '7.xml']])
+         self.assertEqual(os.path.getsize(outputFiles[0]), 0)
+         with open(os.path.join(outputDir, 'a_b.xml')) as existingFile:
+            self.assertEqual(existingFile.read(), 'earlier run')
+
+   def runJSONLines(self, outputDir, recordIDs):
+      ''' Run dset2iso.py --jsonl on copies of the test record with the given identifiers, into outputDir. '''
+      return subprocess.run([sys.executable, 'dset2iso.py', '--jsonl', '--outputDir', outputDir], cwd=TOP_FOLDER,
+                            input=getJSONLinesWithIDs(recordIDs),
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+
+   def testJSONLines_SkipsRecordsThatCannotBeWritten(self):
+      ''' In --jsonl mode, a record without an identifier, or whose file cannot be written, should be counted as
+          failed without stopping the stream, records with a numeric identifier or colliding identifiers should
+          all be written, and a second run should not overwrite the files of the first.
+      '''
+      with tempfile.TemporaryDirectory() as outputDir:
+         # An identifier too long for a file name makes writing its record fail.
+         result = self.runJSONLines(outputDir, [12345, 'a/b', None, 'x' * 300, 'a_b', 'last'])
+         self.assertEqual(result.returncode, 1)
+         self.assertIn('Failed to write record on line 4', result.stderr)
+         self.assertIn('Failed to translate 2 records.', result.stderr)
+         self.assertEqual(sorted(os.listdir(outputDir)), ['12345.xml', 'a_b.xml', 'a_b_2.xml', 'last.xml'])
+
+         lastFile = os.path.join(outputDir, 'last.xml')
+         os.utime(lastFile, ns=(0, 0))
+         result = self.runJSONLines(outputDir, ['last'])
+         self.assertEqual(result.returncode, 0)
+         self.assertIn('writing ' + os.path.join(outputDir, 'last_2.xml'), result.stderr)
+         self.assertEqual(os.stat(lastFile).st_mtime_ns, 0)
+         self.assertIn('last_2.xml', os.listdir(outputDir))
+
+if __name__ == '__main__':
+   unittest.main()
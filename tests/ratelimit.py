@@ -0,0 +1,188 @@
+#
+#  To run these unit tests: type "./run_tests.sh" at a command prompt.
+#
+
+import unittest
+import email.utils
+import os
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer
+from unittest import mock
+
+import requests
+
+import api.harvest as harvest
+import api.ratelimit as ratelimit
+import api.translate.datacite as datacite
+from tests.harvest import RecordedPageHandler, TEMPLATE_PATH
+
+
+#
+# Unit test Setup/Helper functions
+#
+
+class ThrottlingHandler(RecordedPageHandler):
+   ''' Serve recorded DataCite API responses, but answer the first requests for each path with an error status.
+       The server's failures attribute maps a path to the list of (status, Retry-After) responses to send first.
+   '''
+
+   def do_GET(self):
+      with self.server.lock:
+         self.server.requestTimes.append((self.path, time.monotonic()))
+         failures = self.server.failures.get(self.path.split('?')[0].lower(), [])
+         failure = failures.pop(0) if failures else None
+      if failure is None:
+         super().do_GET()
+         return
+      status, retryAfter = failure
+      self.send_response(status)
+      if retryAfter is not None:
+         self.send_header('Retry-After', retryAfter)
+      self.send_header('Content-Length', '0')
+      self.end_headers()
+
+
+def startThrottlingServer(failures):
+   ''' Start a local stand-in for the DataCite API that injects the given failures. '''
+   server = ThreadingHTTPServer(('127.0.0.1', 0), ThrottlingHandler)
+   server.baseURL = 'http://127.0.0.1:%d' % server.server_port
+   server.requests = []
+   server.requestTimes = []
+   server.failures = failures
+   server.lock = threading.Lock()
+   threading.Thread(target=server.serve_forever, daemon=True).start()
+   return server
+
+
+#
+# Unit tests
+#
+class RateLimit_Test(unittest.TestCase):
+
+   def tearDown(self):
+      if hasattr(self, 'server'):
+         self.server.shutdown()
+         self.server.server_close()
+
+   def testAcquire_PacesRequestsAtTheRate(self):
+      ''' After the burst is spent, requests should be spaced by the inverse of the rate.
+      '''
+      limiter = ratelimit.RateLimiter(rate=40, burst=1)
+      startTime = time.monotonic()
+      for i in range(11):
+         limiter.acquire()
+      self.assertGreaterEqual(time.monotonic() - startTime, 0.24)
+
+      metrics = limiter.getMetrics()
+      self.assertEqual(metrics['requests'], 11)
+      self.assertGreater(metrics['throttleWaitSeconds'], 0.2)
+
+   def testRecordThrottle_PausesAndHalvesTheRateOncePerPause(self):
+      ''' Throttled responses should pause all requests, and halve the rate once however many arrive together.
+      '''
+      limiter = ratelimit.RateLimiter(rate=40)
+      limiter.recordThrottle(0.2)
+      limiter.recordThrottle(0.2)
+      self.assertEqual(limiter.rate, 20)
+      self.assertGreaterEqual(limiter.acquire(), 0.15)
+
+      for i in range(20):
+         limiter.recordSuccess()
+      self.assertEqual(limiter.rate, 40)
+
+   def testGetRetryDelay_HonorsRetryAfterOrBacksOffWithJitter(self):
+      ''' A Retry-After time should be used as given; otherwise delays should grow exponentially, up to a cap.
+      '''
+      limiter = ratelimit.RateLimiter(baseDelay=1.0, maxDelay=5.0)
+      self.assertEqual(limiter.getRetryDelay(3, retryAfter=2.5), 2.5)
+      for attempt in range(6):
+         delays = [limiter.getRetryDelay(attempt) for i in range(50)]
+         self.assertTrue(all(0 <= delay <= min(5.0, 2 ** attempt) for delay in delays))
+         self.assertGreater(len(set(delays)), 1)
+      self.assertEqual(limiter.getMetrics()['retries'], 301)
+
+   def testParseRetryAfter_ReadsSecondsAndDates(self):
+      ''' Retry-After may be a number of seconds or an HTTP date; anything else is ignored.
+      '''
+      self.assertEqual(ratelimit.parseRetryAfter('3'), 3.0)
+      self.assertIsNone(ratelimit.parseRetryAfter(None))
+      self.assertIsNone(ratelimit.parseRetryAfter('soon'))
+      retryDate = email.utils.formatdate(time.time() + 30, usegmt=True)
+      self.assertAlmostEqual(ratelimit.parseRetryAfter(retryDate), 30, delta=2)
+
+   def testTranslateDataCiteDOIs_RetriesThrottledFetchesAfterRetryAfter(self):
+      ''' A DOI answered with 429 should be retried no sooner than its Retry-After time, while others proceed.
+      '''
+      throttledPath = '/dois/10.5065/abcd-1234'
+      self.server = startThrottlingServer({throttledPath: [(429, '1')]})
+      limiter = ratelimit.RateLimiter(rate=100)
+      dois = ['10.5065/ABCD-1234', '10.5065/EFGH-5678']
+      with tempfile.TemporaryDirectory() as outputDir:
+         translatedCount, failures = datacite.translateDataCiteDOIs(dois, TEMPLATE_PATH, outputDir, 2,
+                                                                    apiURL=self.server.baseURL + '/dois/',
+                                                                    limiter=limiter)
+         self.assertEqual((translatedCount, failures), (2, []))
+         self.assertEqual(sorted(os.listdir(outputDir)), ['ABCD-1234.xml', 'EFGH-5678.xml'])
+
+      requestTimes = [requestTime for path, requestTime in self.server.requestTimes if path.lower() == throttledPath]
+      self.assertEqual(len(requestTimes), 2)
+      self.assertGreaterEqual(requestTimes[1] - requestTimes[0], 0.95)
+      metrics = limiter.getMetrics()
+      self.assertEqual((metrics['requests'], metrics['retries'], metrics['throttled']), (3, 1, 1))
+
+   def testTranslateDataCiteDOIs_RetriesServerErrorsAndReportsExhaustedRetries(self):
+      ''' 5xx responses should be retried with backoff, and DOIs still failing after maxRetries should be reported.
+      '''
+      self.server = startThrottlingServer({'/dois/10.5065/abcd-1234': [(503, None)] * 2,
+                                           '/dois/10.5065/efgh-5678': [(502, None)] * 10})
+      limiter = ratelimit.RateLimiter(rate=100, maxRetries=3, baseDelay=0.01)
+      dois = ['10.5065/ABCD-1234', '10.5065/EFGH-5678']
+      with tempfile.TemporaryDirectory() as outputDir:
+         translatedCount, failures = datacite.translateDataCiteDOIs(dois, TEMPLATE_PATH, outputDir, 2,
+                                                                    apiURL=self.server.baseURL + '/dois/',
+                                                                    limiter=limiter)
+         self.assertEqual(translatedCount, 1)
+         self.assertEqual([doi for doi, errorMessage in failures], ['10.5065/EFGH-5678'])
+         self.assertIn('RetryableError', failures[0][1])
+
+      metrics = limiter.getMetrics()
+      self.assertEqual((metrics['requests'], metrics['retries'], metrics['throttled']), (7, 5, 0))
+
+   def testGetDataCitePrefixPages_RetriesThrottledPages(self):
+      ''' A throttled page request should be retried rather than ending the harvest.
+      '''
+      self.server = startThrottlingServer({'/dois': [(429, '0')]})
+      limiter = ratelimit.RateLimiter(rate=100)
+      pages = list(harvest.getDataCitePrefixPages('10.5065', apiURL=self.server.baseURL + '/dois', pageSize=2,
+                                                  limiter=limiter))
+      self.assertEqual([len(page) for page in pages], [2, 1])
+      self.assertEqual(limiter.getMetrics()['throttled'], 1)
+
+   def testGetDataCitePrefixPages_RetriesConnectionErrors(self):
+      ''' A page request failing with a connection error should be retried after a backoff, like a 5xx response.
+      '''
+      self.server = startThrottlingServer({})
+      session = harvest.getDataCiteSession()
+      sendRequest = session.get
+      requestURLs = []
+
+      def failFirstRequest(url, **kwargs):
+         requestURLs.append(url)
+         if len(requestURLs) == 1:
+            raise requests.ConnectionError('Connection reset by peer')
+         return sendRequest(url, **kwargs)
+
+      limiter = ratelimit.RateLimiter(rate=100, baseDelay=0.01)
+      with mock.patch.object(session, 'get', side_effect=failFirstRequest):
+         pages = list(harvest.getDataCitePrefixPages('10.5065', session=session, apiURL=self.server.baseURL + '/dois',
+                                                     pageSize=2, limiter=limiter))
+      self.assertEqual([len(page) for page in pages], [2, 1])
+      self.assertEqual(requestURLs[0], requestURLs[1])
+      metrics = limiter.getMetrics()
+      self.assertEqual((metrics['requests'], metrics['retries'], metrics['throttled']), (3, 1, 0))
+
+
+if __name__ == '__main__':
+   unittest.main()
@@ -0,0 +1,176 @@
+#
+#  To run these unit tests: type "./run_tests.sh" at a command prompt.
+#
+
+import unittest
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+import requests
+
+import api.inputjson as inputjson
+import api.ratelimit as ratelimit
+import api.responsecache as responsecache
+
+
+#
+# Unit test Setup/Helper functions
+#
+
+class DOIHandler(BaseHTTPRequestHandler):
+   ''' Serve one DataCite DOI record with an ETag, answering conditional requests with 304 Not Modified. '''
+   protocol_version = 'HTTP/1.1'
+   etag = '"version-1"'
+
+   def do_GET(self):
+      self.server.requests.append((self.path, self.headers.get('If-None-Match')))
+      if not self.path.lower().endswith('/10.5065/abcd-1234'):
+         self.send_error(404)
+         return
+      if self.headers.get('If-None-Match') == self.etag:
+         self.send_response(304)
+         self.send_header('ETag', self.etag)
+         self.send_header('Content-Length', '0')
+         self.end_headers()
+         return
+      body = json.dumps({'data': {'id': '10.5065/abcd-1234', 'attributes': {'doi': '10.5065/ABCD-1234'}}}).encode('utf-8')
+      self.send_response(200)
+      self.send_header('ETag', self.etag)
+      self.send_header('Last-Modified', 'Mon, 01 Feb 2021 00:00:00 GMT')
+      self.send_header('Content-Length', str(len(body)))
+      self.end_headers()
+      self.wfile.write(body)
+
+   def log_message(self, format, *args):
+      pass
+
+
+#
+# Unit tests
+#
+class ResponseCache_Test(unittest.TestCase):
+
+   def setUp(self):
+      self.server = ThreadingHTTPServer(('127.0.0.1', 0), DOIHandler)
+      self.server.requests = []
+      threading.Thread(target=self.server.serve_forever, daemon=True).start()
+      self.apiURL = 'http://127.0.0.1:%d/dois/' % self.server.server_port
+      self.cacheDir = tempfile.TemporaryDirectory()
+
+   def tearDown(self):
+      self.server.shutdown()
+      self.server.server_close()
+      self.cacheDir.cleanup()
+
+   def testGetDataCiteRecords_UsesFreshEntriesAndRevalidatesExpiredOnes(self):
+      ''' Fresh entries should need no request, and expired entries should be revalidated with their ETag.
+      '''
+      cache = responsecache.ResponseCache(self.cacheDir.name)
+      record = inputjson.getDataCiteRecords('10.5065/ABCD-1234', cache, apiURL=self.apiURL)
+      self.assertEqual(record['doi'], '10.5065/ABCD-1234')
+      self.assertEqual(inputjson.getDataCiteRecords('10.5065/abcd-1234', cache, apiURL=self.apiURL), record)
+      self.assertEqual(len(self.server.requests), 1)
+
+      cache.ttlSeconds = 0
+      self.assertEqual(inputjson.getDataCiteRecords('10.5065/ABCD-1234', cache, apiURL=self.apiURL), record)
+      self.assertEqual(self.server.requests[-1][1], DOIHandler.etag)
+      self.assertEqual(len(self.server.requests), 2)
+      cache.close()
+
+   def testGetDataCiteRecords_ServesExpiredEntriesWhenDataCiteCannotBeReached(self):
+      ''' An expired entry should be served when DataCite cannot be reached, while a DOI that is not cached should
+          fail with a retryable error.
+      '''
+      cache = responsecache.ResponseCache(self.cacheDir.name, ttlSeconds=0)
+      record = inputjson.getDataCiteRecords('10.5065/ABCD-1234', cache, apiURL=self.apiURL)
+      session = mock.Mock()
+      session.get.side_effect = requests.ConnectionError('Connection refused')
+      self.assertEqual(inputjson.getDataCiteRecords('10.5065/ABCD-1234', cache, session, apiURL=self.apiURL), record)
+      with self.assertRaises(ratelimit.RetryableError):
+         inputjson.getDataCiteRecords('10.5065/NOT-CACHED', cache, session, apiURL=self.apiURL)
+      cache.close()
+
+   def testGetDataCiteRecords_OfflineServesOnlyCachedEntries(self):
+      ''' An offline cache should serve cached DOIs, even expired ones, and never contact DataCite.
+      '''
+      cache = responsecache.ResponseCache(self.cacheDir.name)
+      record = inputjson.getDataCiteRecords('10.5065/ABCD-1234', cache, apiURL=self.apiURL)
+      cache.close()
+
+      cache = responsecache.ResponseCache(self.cacheDir.name, ttlSeconds=0, offline=True)
+      self.assertEqual(inputjson.getDataCiteRecords('10.5065/ABCD-1234', cache, apiURL=self.apiURL), record)
+      with self.assertRaises(LookupError):
+         inputjson.getDataCiteRecords('10.5065/NOT-CACHED', cache, apiURL=self.apiURL)
+      self.assertEqual(len(self.server.requests), 1)
+      cache.close()
+
+   def testPut_EvictsLeastRecentlyUsedEntries(self):
+      ''' When the size cap is exceeded, the least recently used entries should be evicted first.
+      '''
+      cache = responsecache.ResponseCache(self.cacheDir.name, maxBytes=250)
+      for doi in ['10.5065/a', '10.5065/b']:
+         cache.put(doi, 'x' * 100)
+      cache.get('10.5065/a')
+      cache.put('10.5065/c', 'x' * 100)
+
+      self.assertIsNotNone(cache.get('10.5065/a'))
+      self.assertIsNone(cache.get('10.5065/b'))
+      self.assertIsNotNone(cache.get('10.5065/c'))
+      self.assertEqual(cache.getTotalBytes(), 200)
+      cache.close()
+
+   def testGet_WritesLastUsedTimesWithTheNextChange(self):
+      ''' Cache hits should not write to the database; their times should be written by the next put, in time to
+          decide which entries it evicts, or when the cache is closed.
+      '''
+      cache = responsecache.ResponseCache(self.cacheDir.name, maxBytes=250)
+      for doi in ['10.5065/a', '10.5065/b']:
+         cache.put(doi, 'x' * 100)
+      statements = []
+      cache._connection.set_trace_callback(statements.append)
+      for i in range(100):
+         self.assertIsNotNone(cache.get('10.5065/a'))
+      self.assertEqual([statement for statement in statements if not statement.startswith('SELECT')], [])
+
+      cache.put('10.5065/c', 'x' * 100)
+      self.assertIsNotNone(cache.get('10.5065/a'))
+      self.assertIsNone(cache.get('10.5065/b'))
+
+      lastUsed = cache._pendingLastUsed['10.5065/a']
+      cache.close()
+      connection = sqlite3.connect(os.path.join(self.cacheDir.name, responsecache.CACHE_FILE_NAME))
+      self.assertEqual(connection.execute('SELECT lastUsed FROM responses WHERE doi = ?', ('10.5065/a',)).fetchone(),
+                       (lastUsed,))
+      connection.close()
+
+   def testPut_KeepsARunningTotalOfUTF8Bytes(self):
+      ''' Sizes should be counted in UTF-8 bytes, replaced entries should not be counted twice, and storing entries
+          should not sum the sizes of the whole cache, before or after it is reopened.
+      '''
+      cache = responsecache.ResponseCache(self.cacheDir.name, maxBytes=1000)
+      statements = []
+      cache._connection.set_trace_callback(statements.append)
+      cache.put('10.5065/a', '\u00e9' * 100)
+      cache.put('10.5065/A', '\u00e9' * 150)
+      for i in range(20):
+         cache.put('10.5065/%d' % i, 'x' * 100)
+      self.assertFalse([statement for statement in statements if 'SUM(' in statement])
+      self.assertLessEqual(cache.getTotalBytes(), 1000)
+      self.assertIsNotNone(cache.get('10.5065/19'))
+      totalBytes = cache.getTotalBytes()
+      cache.close()
+
+      cache = responsecache.ResponseCache(self.cacheDir.name, maxBytes=2000)
+      self.assertEqual(cache.getTotalBytes(), totalBytes)
+      cache.put('10.5065/b', '\u00e9' * 50)
+      self.assertEqual(cache.getTotalBytes(), totalBytes + 100)
+      cache.close()
+
+
+if __name__ == '__main__':
+   unittest.main()
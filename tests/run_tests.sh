@@ -8,7 +8,7 @@
 
 function NosetestSubstitute {
     
-    testFiles='xml.py iso19139.py'
+    testFiles='xml.py iso19139.py dset.py output.py batch.py manifest.py timing.py harvest.py responsecache.py ratelimit.py csw.py zenodo.py isofields.py isoindex.py isosummary.py harvest_mappings.py'
 
     for f in $testFiles; do
         echo 
@@ -33,7 +33,7 @@ function NosetestSubstitute {
 
 #COVER_MIN_PERCENTAGE=100
 COVER_MIN_PERCENTAGE=0
-COVER_PACKAGES="api.util.xml,api.util.iso19139"
+COVER_PACKAGES="api.util.xml,api.util.iso19139,api.translate.dset,api.output,api.batch,api.manifest,api.timing,api.harvest,api.responsecache,api.ratelimit,api.csw,api.zenodo,api.isofields,api.isoindex,api.isosummary,utils.harvest_mappings"
 
 which nosetests
 
@@ -0,0 +1,56 @@
+#
+#  To run these unit tests: type "./run_tests.sh" at a command prompt.
+#
+
+import unittest
+
+import api.timing as timing
+
+
+#
+# Unit tests
+#
+class Timing_Test(unittest.TestCase):
+
+   def tearDown(self):
+      timing._enabled = False
+      timing.reset()
+
+   def testDisabledTiming_RecordsNothing(self):
+      ''' Stages timed while timing is disabled should not be recorded.
+      '''
+      startTime = timing.startStage()
+      self.assertIsNone(timing.endStage('decode', startTime))
+      timing.endRecord('record', {}, startTime)
+      self.assertEqual(timing.getStatistics(), {'stages': {}, 'slowestRecords': []})
+
+   def testMergeSnapshot_CombinesStagesAndKeepsSlowestRecords(self):
+      ''' Merged worker timings should add to the stage counts, and only the slowest records should be kept.
+      '''
+      timing.enable(slowestCount=2)
+      shape = timing.getRecordShape({'author': [{}, {}], 'keywords': []}, 100)
+      for recordIndex in range(3):
+         startTime = timing.startStage()
+         timing.endStage('decode', startTime)
+         timing.endRecord('record %d' % recordIndex, shape, startTime)
+      snapshot = timing.getSnapshot()
+
+      timing.reset()
+      timing._slowestRecords.append((0.0, 'fast record', shape))
+      timing.mergeSnapshot(snapshot)
+
+      statistics = timing.getStatistics()
+      self.assertEqual(statistics['stages']['decode']['count'], 3)
+      self.assertEqual(len(statistics['slowestRecords']), 2)
+      self.assertNotIn('fast record', [slowRecord['record'] for slowRecord in statistics['slowestRecords']])
+      self.assertEqual(statistics['slowestRecords'][0]['shape'], {'authors': 2, 'keywords': 0, 'inputBytes': 100})
+
+   def testGetPercentile_UsesNearestRank(self):
+      sortedTimes = list(range(1, 101))
+      self.assertEqual(timing.getPercentile(sortedTimes, 50), 50)
+      self.assertEqual(timing.getPercentile(sortedTimes, 99), 99)
+      self.assertEqual(timing.getPercentile([7], 90), 7)
+
+
+if __name__ == '__main__':
+   unittest.main()
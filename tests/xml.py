@@ -4,6 +4,8 @@
 
 import unittest
 import json
+import os
+import tempfile
 from lxml.etree import Element
 from lxml import etree as ElementTree
 
@@ -52,4 +54,52 @@ class XML_Test(unittest.TestCase):
       foundElement = xml.getElement(xml_tree, 'Child')
       self.assertEqual(foundElement.text, '1')
 
+   def testGetTemplateCopy_ReturnsPrivateCopiesAndSeesEdits(self):
+      ''' Template copies should be independent of each other, and an edited template file should be re-parsed.
+      '''
+      with tempfile.TemporaryDirectory() as tempDir:
+         templatePath = os.path.join(tempDir, 'template.xml')
+         with open(templatePath, 'w') as templateFile:
+            templateFile.write('<Root><Child>1</Child></Root>')
+
+         firstCopy = xml.getTemplateCopy(templatePath)
+         xml.getElement(firstCopy, 'Child').text = 'changed'
+         secondCopy = xml.getTemplateCopy(templatePath)
+         self.assertEqual(xml.getElement(secondCopy, 'Child').text, '1')
+
+         with open(templatePath, 'w') as templateFile:
+            templateFile.write('<Root><Child>22</Child></Root>')
+         os.utime(templatePath, ns=(0, 0))
+         editedCopy = xml.getTemplateCopy(templatePath)
+         self.assertEqual(xml.getElement(editedCopy, 'Child').text, '22')
+
+   def testGetElement_AcceptsCompiledXPath(self):
+      ''' A compiled XPath object should find the same element as its XPath string.
+      '''
+      xml_tree = self.simpleTree
+      xml_tree = addXPathToXML(xml_tree, "Child", '1')
+
+      compiledXPath = xml.compileXPath('Child')
+      self.assertIs(compiledXPath, xml.compileXPath('Child'))
+      self.assertIs(xml.getElement(xml_tree, compiledXPath), xml.getElement(xml_tree, 'Child'))
+
+      # Registering a table only warms up the registry; its XPath strings are then looked up without compiling.
+      self.assertIsNone(xml.registerXPaths({'registered': 'Registered/Child'}))
+      registeredXPath = xml._compiledXPaths['Registered/Child']
+      self.assertIs(xml.compileXPath('Registered/Child'), registeredXPath)
+
+   def testCompileSlotPlan_ResolvesSlotsAndReportsMissingOnes(self):
+      ''' Slots resolved in a copy of the template should match the XPath search; missing slots should be reported.
+      '''
+      xml_tree = self.simpleTree
+      xml_tree = addXPathToXML(xml_tree, "Parent/Child", '1')
+      xml_tree = addXPathToXML(xml_tree, "Parent/Child", '2')
+
+      slotPlan = xml.compileSlotPlan(xml_tree, {'table': {'second': '/Root/Parent[2]/Child'}})
+      treeCopy = xml.copyElement(xml_tree)
+      slots = xml.resolveSlots(treeCopy, slotPlan)
+      self.assertIs(slots['table']['second'], xml.getElement(treeCopy, '/Root/Parent[2]/Child'))
 
+      with self.assertRaises(ValueError) as context:
+         xml.compileSlotPlan(xml_tree, {'table': {'second': '/Root/Parent[2]/Child', 'missing': '/Root/Missing'}})
+      self.assertIn('table.missing', str(context.exception))
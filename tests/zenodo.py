@@ -0,0 +1,226 @@
+#
+#  To run these unit tests: type "./run_tests.sh" at a command prompt.
+#
+
+import unittest
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from unittest import mock
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, unquote
+
+import api.zenodo as zenodo
+
+
+#
+# Unit test Setup/Helper functions
+#
+
+class BucketHandler(BaseHTTPRequestHandler):
+   ''' A stand-in Zenodo bucket.  Uploaded files are kept in server.files, and the next upload of each file
+       named in server.failures is answered with an error.
+   '''
+   protocol_version = 'HTTP/1.1'
+
+   def do_PUT(self):
+      fileName = unquote(urlparse(self.path).path).split('/')[-1]
+      content = self.rfile.read(int(self.headers['Content-Length']))
+      with self.server.lock:
+         self.server.uploads.append(fileName)
+         failed = fileName in self.server.failures
+         self.server.failures.discard(fileName)
+         if not failed:
+            self.server.files[fileName] = content
+      if failed:
+         self.sendJSON(500, {'message': 'upload failed'})
+      else:
+         self.sendJSON(201, {'key': fileName, 'size': len(content),
+                             'checksum': 'md5:' + hashlib.md5(content).hexdigest()})
+
+   def do_GET(self):
+      with self.server.lock:
+         contents = [{'key': fileName, 'size': len(content), 'checksum': 'md5:' + hashlib.md5(content).hexdigest()}
+                     for fileName, content in self.server.files.items()]
+      self.sendJSON(200, {'contents': contents})
+
+   def sendJSON(self, status, data):
+      body = json.dumps(data).encode('utf-8')
+      self.send_response(status)
+      self.send_header('Content-Type', 'application/json')
+      self.send_header('Content-Length', str(len(body)))
+      self.end_headers()
+      self.wfile.write(body)
+
+   def log_message(self, format, *args):
+      pass
+
+
+#
+# Unit tests
+#
+class Zenodo_Test(unittest.TestCase):
+
+   def setUp(self):
+      self.server = ThreadingHTTPServer(('127.0.0.1', 0), BucketHandler)
+      self.server.files = {}
+      self.server.uploads = []
+      self.server.failures = set()
+      self.server.lock = threading.Lock()
+      threading.Thread(target=self.server.serve_forever, daemon=True).start()
+      self.bucketURL = 'http://127.0.0.1:%d/api/files/bucket-1' % self.server.server_port
+
+      self.tempDir = tempfile.TemporaryDirectory()
+      self.uploadFolder = os.path.join(self.tempDir.name, 'upload')
+      os.mkdir(self.uploadFolder)
+      self.journalPath = zenodo.getJournalPath(self.uploadFolder)
+      self.fileInfo = []
+      for i in range(6):
+         fileName = 'file %d.bin' % i
+         filePath = os.path.join(self.uploadFolder, fileName)
+         with open(filePath, 'wb') as fileObject:
+            fileObject.write(os.urandom(1000 + i * zenodo.HASH_BLOCK_SIZE // 2))
+         self.fileInfo.append((fileName, filePath))
+      self.session = zenodo.getZenodoSession('token', poolSize=3)
+
+   def tearDown(self):
+      self.server.shutdown()
+      self.server.server_close()
+      self.tempDir.cleanup()
+
+   def upload(self, fileInfo):
+      ''' Hash the upload folder, as the script does, and upload the given files. '''
+      manifest = zenodo.hashFolder(self.fileInfo, zenodo.getManifestPath(self.uploadFolder))
+      return list(zenodo.uploadFiles(self.session, self.bucketURL, fileInfo, manifest['files'], jobs=3))
+
+   def resume(self):
+      ''' Return the files a resumed upload would send, as the script does. '''
+      manifest = zenodo.hashFolder(self.fileInfo, zenodo.getManifestPath(self.uploadFolder))
+      remoteChecksums = zenodo.getBucketChecksums(self.session, zenodo.readJournal(self.journalPath))
+      filesToUpload, skippedFiles = zenodo.getFilesToUpload(self.fileInfo, manifest['files'], remoteChecksums)
+      return filesToUpload
+
+   def testUploadFiles_UploadsEachFileOnce(self):
+      ''' Every file should be uploaded once, with Zenodo's checksum matching the manifest's MD5.
+      '''
+      results = self.upload(self.fileInfo)
+      self.assertEqual([errorMessage for fileName, uploaded, errorMessage in results], [None] * 6)
+      self.assertEqual(sorted(self.server.uploads), sorted(fileName for fileName, filePath in self.fileInfo))
+      for fileName, uploaded, errorMessage in results:
+         self.assertEqual(uploaded['checksum'], 'md5:' + zenodo.getFileMD5(dict(self.fileInfo)[fileName]))
+
+   def testResume_UploadsOnlyFailedAndChangedFiles(self):
+      ''' A resumed upload should skip files already in the bucket with matching checksums.
+      '''
+      zenodo.startJournal(self.journalPath, self.bucketURL)
+      self.server.failures = {'file 2.bin'}
+      results = self.upload(self.fileInfo)
+      self.assertEqual([fileName for fileName, uploaded, errorMessage in results if errorMessage], ['file 2.bin'])
+      self.assertEqual(self.resume(), [self.fileInfo[2]])
+
+      with open(self.fileInfo[4][1], 'ab') as fileObject:
+         fileObject.write(b'changed')
+      self.assertEqual(self.resume(), [self.fileInfo[2], self.fileInfo[4]])
+
+      self.upload(self.resume())
+      self.assertEqual(self.resume(), [])
+      with open(self.fileInfo[4][1], 'rb') as fileObject:
+         self.assertEqual(self.server.files['file 4.bin'], fileObject.read())
+
+   def addCopies(self):
+      ''' Add a copy of file 1 under another name, and a hard link to file 3.  Return the extended file list. '''
+      copyPath = os.path.join(self.uploadFolder, 'copy.bin')
+      with open(self.fileInfo[1][1], 'rb') as source, open(copyPath, 'wb') as copy:
+         copy.write(source.read())
+      linkPath = os.path.join(self.uploadFolder, 'link.bin')
+      os.link(self.fileInfo[3][1], linkPath)
+      return self.fileInfo + [('copy.bin', copyPath), ('link.bin', linkPath)]
+
+   def testHashFolder_ReportsDuplicatesAndTotalSize(self):
+      ''' The manifest should hold every file's MD5, the total size, and groups of files with identical contents.
+      '''
+      fileInfo = self.addCopies()
+      manifestPath = zenodo.getManifestPath(self.uploadFolder)
+      manifest = zenodo.hashFolder(fileInfo, manifestPath, jobs=3)
+
+      self.assertEqual(manifest['duplicates'], [['copy.bin', 'file 1.bin'], ['file 3.bin', 'link.bin']])
+      self.assertEqual(manifest['totalSize'], sum(os.path.getsize(filePath) for fileName, filePath in fileInfo))
+      for fileName, filePath in fileInfo:
+         self.assertEqual(manifest['files'][fileName]['md5'], hashlib.md5(open(filePath, 'rb').read()).hexdigest())
+      self.assertEqual(zenodo.readManifest(manifestPath), manifest)
+
+   def testHashFolder_NeverHashesAFileTwice(self):
+      ''' Hard links should be hashed once, and unchanged files should not be hashed again by a later run.
+      '''
+      fileInfo = self.addCopies()
+      manifestPath = zenodo.getManifestPath(self.uploadFolder)
+      with mock.patch.object(zenodo, 'getFileMD5', wraps=zenodo.getFileMD5) as getFileMD5:
+         zenodo.hashFolder(fileInfo, manifestPath)
+         self.assertEqual(getFileMD5.call_count, len(fileInfo) - 1)
+
+         getFileMD5.reset_mock()
+         with open(self.fileInfo[0][1], 'ab') as fileObject:
+            fileObject.write(b'changed')
+         manifest = zenodo.hashFolder(fileInfo, manifestPath)
+         self.assertEqual(getFileMD5.call_args_list, [mock.call(self.fileInfo[0][1])])
+
+         # A resumed upload compares the bucket with the manifest's MD5s without hashing anything.
+         getFileMD5.reset_mock()
+         self.upload(self.fileInfo)
+         remoteChecksums = zenodo.getBucketChecksums(self.session, self.bucketURL)
+         self.assertEqual(zenodo.getFilesToUpload(self.fileInfo, manifest['files'], remoteChecksums)[0], [])
+         self.assertEqual(getFileMD5.call_count, 0)
+
+   def testVerifyBucket_ListsMissingAndDifferentFiles(self):
+      ''' Files missing from the bucket, or whose bucket checksum differs from the manifest, should be listed.
+      '''
+      manifest = zenodo.hashFolder(self.fileInfo, zenodo.getManifestPath(self.uploadFolder))
+      self.upload(self.fileInfo[1:])
+      self.server.files['file 5.bin'] = b'corrupted'
+      remoteChecksums = zenodo.getBucketChecksums(self.session, self.bucketURL)
+      self.assertEqual(zenodo.verifyBucket(manifest, remoteChecksums), ['file 0.bin', 'file 5.bin'])
+
+   def testUploadFile_ChecksZenodoChecksumAgainstTheManifest(self):
+      ''' An upload should be checked against the manifest's MD5 without reading the file again, and a file that
+          changed after it was hashed should fail, both before and after it is sent.
+      '''
+      fileName, filePath = self.fileInfo[1]
+      manifest = zenodo.hashFolder(self.fileInfo, zenodo.getManifestPath(self.uploadFolder))
+      entry = manifest['files'][fileName]
+      self.assertEqual(zenodo.uploadFile(self.session, self.bucketURL, fileName, entry)['checksum'],
+                       'md5:' + entry['md5'])
+
+      with self.assertRaisesRegex(OSError, 'does not match local MD5 0+$'):
+         zenodo.uploadFile(self.session, self.bucketURL, fileName, dict(entry, md5='0' * 32))
+
+      with open(filePath, 'ab') as fileObject:
+         fileObject.write(b'changed')
+      with self.assertRaisesRegex(OSError, 'changed after it was hashed'):
+         zenodo.uploadFile(self.session, self.bucketURL, fileName, entry)
+      self.assertEqual(self.server.uploads, [fileName, fileName])
+
+      # A file that changes while it is being sent is caught by the check after the upload.
+      entry = zenodo.hashFolder(self.fileInfo, zenodo.getManifestPath(self.uploadFolder))['files'][fileName]
+      sendFile = self.session.put
+      def changeWhileSending(*args, **kwargs):
+         response = sendFile(*args, **kwargs)
+         os.utime(filePath, ns=(0, 0))
+         return response
+      with mock.patch.object(self.session, 'put', side_effect=changeWhileSending):
+         with self.assertRaisesRegex(OSError, 'changed after it was hashed'):
+            zenodo.uploadFile(self.session, self.bucketURL, fileName, entry)
+
+   def testReadJournal_IgnoresAnInterruptedLastLine(self):
+      ''' The latest bucket should be read from the journal, ignoring a partly written last line.
+      '''
+      self.assertIsNone(zenodo.readJournal(self.journalPath))
+      zenodo.startJournal(self.journalPath, 'old')
+      zenodo.startJournal(self.journalPath, 'new')
+      with open(self.journalPath, 'a') as journalFile:
+         journalFile.write('{"bucket": "ne')
+      self.assertEqual(zenodo.readJournal(self.journalPath), 'new')
+
+if __name__ == '__main__':
+   unittest.main()
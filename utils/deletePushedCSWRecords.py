@@ -1,85 +1,84 @@
-# Python script:  
+# Python script:
 # Delete DataCite records pushed to GeoNetwork
-
-from lxml import etree as ElementTree       # ISO XML parser
-import requests                             # Allows simple POST requests
-from requests.auth import HTTPBasicAuth     # Allows POST basic authentication
-
-# We need XML namespace mappings in order to search the ISO element tree
-XML_NAMESPACE_MAP = {'ogc': 'http://www.opengis.net/ogc',
-	'csw': 'http://www.opengis.net/cat/csw/2.0.2',
-    'apiso': 'http://www.opengis.net/cat/csw/apiso/1.0'}
-
-
-# Return first item in a list if list is nonempty (returns None otherwise).
-def getFirst(someList): 
-    if someList:
-        return someList[0]
-
-
-# Search XML element tree and return the first matching element
-def getElement(baseElement, elementPath):
-	elements = baseElement.xpath(elementPath, namespaces=XML_NAMESPACE_MAP)
-	return getFirst(elements)
-
-
-def getDeleteRecord(recordID, templateFileISO):
-
-	# Load the XML template file as an element tree
-	tree = ElementTree.parse(templateFileISO)
-	root = tree.getroot()
-
-	# Put record ID in element
-	elemID = getElement(root, './/ogc:Literal')
-	elemID.text = recordID
-
-    # Return record as XML 
-	recordAsXML = ElementTree.tostring(root, pretty_print=True)
-	return recordAsXML
-
+#
+# Run from the top-level directory:  python -m utils.deletePushedCSWRecords [options]
+#
+# Record IDs are read from the ID file written by push_csw.py.  Each Transaction deletes a batch of records
+# with an ogc:Or filter over their identifiers.  IDs are appended to a progress file as their batches are deleted,
+# so an interrupted run can be restarted and skips them.  At the end, the ID file is rewritten to hold only
+# the IDs that could not be deleted, and the progress file is removed.
+
+import argparse
+import os
+import sys
+
+import api.csw as csw
+
+
+def readIDs(idFilePath):
+    """ Return the non-blank lines of an ID file, or an empty list if the file does not exist. """
+    if not os.path.isfile(idFilePath):
+        return []
+    with open(idFilePath, 'r') as idFile:
+        return [line.strip() for line in idFile if line.strip()]
+
+
+parser = argparse.ArgumentParser(description='Delete records pushed to a CSW server, such as GeoNetwork.  '
+                                             'The CSW password is read from the CSW_PASSWORD environment variable.')
+parser.add_argument('--idFile', nargs=1, default=['pushedRecordIDs.txt'],
+                    help="file listing the IDs of records to delete, one per line.  Default: pushedRecordIDs.txt")
+parser.add_argument('--url', nargs=1, default=[csw.DEFAULT_CSW_URL], help="CSW publication endpoint")
+parser.add_argument('--user', nargs=1, default=['admin'], help="CSW user name.  Default: admin")
+parser.add_argument('--batchSize', nargs=1, type=int, default=[csw.DEFAULT_BATCH_SIZE],
+                    help="number of records deleted by each Transaction; 1 deletes records one at a time.  "
+                         "Default: %d" % csw.DEFAULT_BATCH_SIZE)
+parser.add_argument('--jobs', nargs=1, type=int, default=[4], help="number of Transactions sent at the same time.  Default: 4")
+parser.add_argument('--template', nargs=1, default=[csw.DELETE_TEMPLATE], help="CSW Delete Transaction template")
+args = parser.parse_args()
+
+if args.batchSize[0] < 1 or args.jobs[0] < 1:
+    parser.error('--batchSize and --jobs must be at least 1')
 
 ###
 ### START OF MAIN PROGRAM
 ###
 
-recordIDFile = '../pushedRecordIDs.txt'
-deleteISOTemplate = './templates_ISO19139/deleteCSW.xml'
+recordIDFile = args.idFile[0]
+progressFile = recordIDFile + '.deleted'
 
-# Read pushed record IDs and put in a list
-with open(recordIDFile,"r") as infile:
-	listOfIDs = infile.read().splitlines()
+# Read pushed record IDs and put in a list, skipping those deleted by an interrupted earlier run.
+deletedIDs = set(readIDs(progressFile))
+listOfIDs = [recordID for recordID in dict.fromkeys(readIDs(recordIDFile)) if recordID not in deletedIDs]
 
 print("##", file=sys.stderr)
 print("## Deleting " + str(len(listOfIDs)) + " Records...", file=sys.stderr)
+if deletedIDs:
+    print("## (skipping " + str(len(deletedIDs)) + " records deleted by an earlier run)", file=sys.stderr)
 print("##", file=sys.stderr)
 
-# Loop over IDs to delete
-for id in listOfIDs:
-
-	deleteRecord = getDeleteRecord(id, deleteISOTemplate)
-
-	XML_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n'
-	xmlOutput = XML_HEADER + deleteRecord
-
-	# Post the resulting XML to GeoNetwork CSW service.  
-	POST_RESULT = True
-	if POST_RESULT:
-		#GeoNetworkBaseURL = 'http://localhost:8080'
-		GeoNetworkBaseURL = 'https://geonetwork.prototype.ucar.edu'
-		url = GeoNetworkBaseURL + '/geonetwork/srv/eng/csw-publication?SERVICE=CSW&VERSION=2.0.2&REQUEST=DELETE'
-		header = {'Content-Type': 'text/xml'}
-
-		try:
-			response = requests.post(url, auth=HTTPBasicAuth('admin', 'admin'), headers=header, data=xmlOutput)
-			print(response.text, file=sys.stderr)
-		except requests.ConnectionError:
-			print('ConnectionError: failed to connect: ' + url, file=sys.stderr)
-
-		if response.status_code != 200:
-			raise OSError("Response " + str(response.status_code) + ": " + response.content)
-		print(response.status_code, file=sys.stderr)
-
-print('...Finished deleting records.', file=sys.stderr)
-
-
-
+session = csw.getCSWSession(args.user[0], os.environ.get('CSW_PASSWORD', 'admin'), args.jobs[0])
+failedIDs = set()
+deletedCount = 0
+with open(progressFile, 'a') as progress:
+    for batch, batchDeletedCount, errorMessage in csw.deleteRecordIDs(listOfIDs, args.url[0], session, args.batchSize[0],
+                                                                     args.jobs[0], args.template[0]):
+        if errorMessage:
+            print("  Failed to delete batch starting with " + batch[0] + ": " + errorMessage, file=sys.stderr)
+            failedIDs.update(batch)
+            continue
+        for recordID in batch:
+            progress.write(recordID + '\n')
+        progress.flush()
+        deletedCount += batchDeletedCount
+        print("  Deleted " + str(deletedCount) + " Records.", file=sys.stderr)
+
+# Keep only the IDs that still need deleting.
+with open(recordIDFile, 'w') as idFile:
+    for recordID in listOfIDs:
+        if recordID in failedIDs:
+            idFile.write(recordID + '\n')
+os.remove(progressFile)
+
+print('...Finished deleting records; ' + str(len(failedIDs)) + ' records failed.', file=sys.stderr)
+if failedIDs:
+    sys.exit(1)
@@ -5,11 +5,18 @@
 #
 #      * If the original Resource Format string is empty or missing, return "UNDEFINED FORMAT"
 #      * Convert the original Resource Format string to lower case
-#      * Loop over keys in the mapping dictionary:
-#          - If the current key is found within the converted string, return the corresponding standardized value
+#      * Find the keys of the mapping dictionary that occur within the converted string:
+#          - Return the standardized value of the key that comes first in the mapping dictionary
 #      * If none of the keys are found within the converted string, return "OTHER"
+#
+#    The keys are compiled, in mapping order, into a single regular expression whose first matching alternative is
+#    the winning key, so one search standardizes a string.  The expression is rebuilt whenever the mapping dictionary
+#    changes, and the standardized formats of recently seen strings are remembered for each version of the mapping.
 ###
 
+import re
+from functools import lru_cache
+
 MISSING_FORMAT_STRING = "UNDEFINED FORMAT"
 OTHER_FORMAT_STRING = "OTHER"
 
@@ -45,17 +52,55 @@ RESOURCE_FORMAT_MAPPING = {
 }
 
 
+# Number of distinct format strings whose standardized format is remembered.
+FORMAT_MEMO_SIZE = 65536
+
+
+@lru_cache(maxsize=1)
+def getFormatMatcher(mapping_items):
+    """
+    Return (pattern, values) for a tuple of the (key, value) items of a resource format mapping.
+
+    The pattern is anchored at the start of the string, with one lookahead per key in mapping order.  Alternatives
+    are tried in order, so the first key in the mapping that occurs anywhere in the string matches, and the
+    number of its capturing group gives its position in values.
+    """
+    pattern = re.compile(r'\A(?:%s)' % '|'.join(r'(?=.*?(%s))' % re.escape(key) for key, value in mapping_items),
+                         re.DOTALL)
+    return pattern, tuple(value for key, value in mapping_items)
+
+
 def getStandardResourceFormat(format_string):
     """
     Given a non-empty ResourceFormat string, return the standardized version
     of that resource format, or 'OTHER' if there is no match.
     If there is no format string, return 'UNDEFINED FORMAT'
     """
+    return getMatchedResourceFormat(format_string, getFormatMatcher(tuple(RESOURCE_FORMAT_MAPPING.items())))
+
+
+@lru_cache(maxsize=FORMAT_MEMO_SIZE)
+def getMatchedResourceFormat(format_string, matcher):
+    """
+    Return the standardized version of a ResourceFormat string, using a matcher from getFormatMatcher.
+    """
     if not format_string:
         return MISSING_FORMAT_STRING
 
-    test_string = format_string.lower()
-    for key, value in RESOURCE_FORMAT_MAPPING.items():
-        if key in test_string:
-            return value
-    return OTHER_FORMAT_STRING
+    pattern, values = matcher
+    match = pattern.match(format_string.lower())
+    if match is None:
+        return OTHER_FORMAT_STRING
+    return values[match.lastindex - 1]
+
+
+def getStandardResourceFormats(format_strings):
+    """
+    Return a list of the standardized versions of a list of ResourceFormat strings.
+    Each distinct string is standardized once.
+    """
+    matcher = getFormatMatcher(tuple(RESOURCE_FORMAT_MAPPING.items()))
+    standard_formats = {format_string: getMatchedResourceFormat(format_string, matcher)
+                        for format_string in set(format_strings)}
+    return [standard_formats[format_string] for format_string in format_strings]
+
@@ -1,8 +1,16 @@
 import argparse
+import csv
+import io
+import itertools
+import json
+import multiprocessing
 import sys
-from lxml import etree as ElementTree  # ISO XML parser
+from concurrent.futures import ThreadPoolExecutor
 
-from utils.harvest_mappings import getStandardResourceFormat
+import api.isofields as isofields
+from api.isoindex import FieldIndex
+from api.isosummary import FieldSummary
+from utils.harvest_mappings import getStandardResourceFormats
 
 import os.path
 from pathlib import Path
@@ -12,30 +20,33 @@ __version__ = '-'.join(__version_info__)
 
 PROGRAM_DESCRIPTION = '''
     A utility for reporting existence of xml elements, or extracting element values, from a file or directory of files.
+
+    Directories can be scanned by several worker processes with --jobs; output keeps the order of a serial scan.
+    On network filesystems, where reading files is slower than parsing them, --ioThreads reads files concurrently.
+    With --engine stream, records are read incrementally and only until the reported values are found, which
+    uses much less memory on large records.
+
+    With --index, reports are answered from an SQLite index of the records' fields.  If --inputDir is also given,
+    the index is first updated, parsing only files that are new or changed since the last update.  The
+    duplicateIdentifier report, which lists file identifiers shared by several files, needs an index.
+
+    Several --type values can be given at once, with --output csv or jsonl: each record is then read once, and
+    one row is written per file, with a column for each report.  With --output summary, only counts of the
+    reported values are written: histograms of publishers and formats, and the share of records with each extent,
+    over all records and for each resource type.  Worker processes count their own files, and their counts are merged.
  '''
 
-xpaths = {"resourceType": ('/gmd:MD_Metadata/gmd:identificationInfo/gmd:MD_DataIdentification/gmd:descriptiveKeywords' +
-                           '/gmd:MD_Keywords/gmd:thesaurusName/gmd:CI_Citation/gmd:title/gco:CharacterString'),
-          "geoExtent": ('/gmd:MD_Metadata/gmd:identificationInfo/gmd:MD_DataIdentification/gmd:extent' +
-                        '/gmd:EX_Extent/gmd:geographicElement/gmd:EX_GeographicBoundingBox'),
-          "timeExtent": ('/gmd:MD_Metadata/gmd:identificationInfo/gmd:MD_DataIdentification/gmd:extent' +
-                         '/gmd:EX_Extent/gmd:temporalElement/gmd:EX_TemporalExtent'),
-          "resourceFormat": '/gmd:MD_Metadata/gmd:identificationInfo/gmd:MD_DataIdentification/gmd:resourceFormat',
-          }
-
-childXPaths = {
-    'individual': 'gmd:individualName/gco:CharacterString',
-    'organisation': 'gmd:organisationName/gco:CharacterString',
-    'roleCode': 'gmd:role/gmd:CI_RoleCode',
-    'keyword': 'gmd:keyword/gco:CharacterString',
-    'formatName': 'gmd:MD_Format/gmd:name/gco:CharacterString'
-}
-
-# We need XML namespace mappings in order to search the ISO element tree
-ISO_NAMESPACES = {'gmd': 'http://www.isotc211.org/2005/gmd',
-                  'xlink': 'http://www.w3.org/1999/xlink',
-                  'gco': 'http://www.isotc211.org/2005/gco',
-                  'gml': 'http://www.opengis.net/gml'}
+# Number of files handed to a worker process at a time.
+FILES_PER_CHUNK = 64
+
+# Fields extracted from each record for each report type.
+REPORT_FIELDS = {'publisher': ['publisher'],
+                 'resourceFormat': ['resourceFormats'],
+                 'standardResourceFormat': ['resourceFormats'],
+                 'geoExtent': ['geoExtent'],
+                 'timeExtent': ['timeExtent']}
+
+OUTPUT_FORMATS = ['text', 'csv', 'jsonl', 'summary']
 
 
 def checkDirectoryExistence(directoryPath, directoryDescription):
@@ -53,151 +64,73 @@ class PrintHelpOnErrorParser(argparse.ArgumentParser):
 
 
 #
-# Tree-wide operations
+# Report output
 #
-def getXMLTree(source):
-    try:
-        etree = ElementTree.parse(source)
-        root = etree.getroot()
-    except Exception:
-        print(f"Unable to parse {source}")
-        root = None
-    return root
-
-
-def getElementsMatchingRole(roleString, contactXPath, roleCodeXPath, xml_tree):
-    """ Get all XML contact elements matching a specific role for the given contact XPath.
-    """
-    matchingContactElements = []
-    contactElements = xml_tree.xpath(contactXPath, namespaces=ISO_NAMESPACES)
-
-    for contactElement in contactElements:
-        roleCodeElements = contactElement.xpath(roleCodeXPath, namespaces=ISO_NAMESPACES)
-
-        if roleCodeElements and roleCodeElements[0].get('codeListValue') == roleString:
-            matchingContactElements.append(contactElement)
-
-    return matchingContactElements
-
-
-def getFirstChildTextForRole(roleString, contactXPath, childXPath, roleCodeXPath, xml_tree):
-    """ Get child string from the first matching role found at the given contact XPath.
-    """
-    foundTextValue = ''
-
-    matchingContactElements = getElementsMatchingRole(roleString, contactXPath, roleCodeXPath, xml_tree)
-
-    if matchingContactElements:
-        foundText = matchingContactElements[0].findtext(childXPath, namespaces=ISO_NAMESPACES)
-
-        if foundText:
-            foundTextValue = foundText
+def readFileBytes(filePath):
+    """ Return the contents of a file as bytes. """
+    with open(filePath, 'rb') as fileObject:
+        return fileObject.read()
 
-    return foundTextValue
 
+def isDatasetRecord(fields):
+    return fields['resourceType'] == 'dataset'
 
-def printPublisher(file, checkNonDatasets=True):
-    citedContact = '/gmd:MD_Metadata/gmd:identificationInfo/gmd:MD_DataIdentification/gmd:citation/gmd:CI_Citation' \
-                   '/gmd:citedResponsibleParty/gmd:CI_ResponsibleParty'
-    elementsToSearch = [childXPaths['individual'], childXPaths['organisation']]
-    publisher_text = []
 
-    tree = getXMLTree(file)
+def getPublisherLines(file, fields, checkNonDatasets=True):
+    """ Return the output lines reporting the publisher of a record, given its extracted fields. """
+    lines = []
 
     # Return early if this file is not parsed, or it is not a dataset and checkNonDatasets is False.
-    notParsed = tree is None
-    skipNonDataset = (not checkNonDatasets) and (not isDatasetRecord(tree))
+    notParsed = fields is None
+    skipNonDataset = notParsed or ((not checkNonDatasets) and (not isDatasetRecord(fields)))
     if notParsed or skipNonDataset:
-        return
+        return lines
 
-    for element in elementsToSearch:
-        publisher_text = getFirstChildTextForRole('publisher', citedContact, element, childXPaths['roleCode'], tree)
-        if publisher_text:
-            print(str(publisher_text), file=sys.stdout)
-            break
-    if len(publisher_text) == 0:
-        print(f"Warning: publisher string not found for {file}")
-
-
-def getChildTextList(parentXPath, childXPath, xml_tree):
-    """ Loop over children of a parent XPath and return the text associated with all child elements.
-        If no children are found or no child element has text, return the empty list.
-    """
-    childTextList = []
-    parentElements = xml_tree.xpath(parentXPath, namespaces=ISO_NAMESPACES)
-
-    for parentElement in parentElements:
-        childElements = parentElement.xpath(childXPath, namespaces=ISO_NAMESPACES)
+    if fields['publisher']:
+        lines.append(str(fields['publisher']))
+    else:
+        lines.append(f"Warning: publisher string not found for {file}")
+    return lines
 
-        for childElement in childElements:
-            if childElement.text:
-                childTextList.append(childElement.text)
 
-    return childTextList
+def getStandardFormats(fields):
+    """ Return the standardized resource formats of a record, given its extracted fields. """
+    # Formats read from an index come with their standardized names.
+    return fields.get('standardResourceFormats') or getStandardResourceFormats(fields['resourceFormats'])
 
 
-def printResourceFormats(filePath, checkNonDatasets, useFormatMapping):
-    tree = getXMLTree(filePath)
+def getResourceFormatLines(filePath, fields, checkNonDatasets, useFormatMapping):
+    """ Return the output lines listing the resource formats of a record, given its extracted fields. """
+    lines = []
 
     # Return early if this file is not XML, or we are ignoring non-dataset records and this is a non-dataset record.
-    isIsoFile = tree is not None
-    skipFile = not isIsoFile or not (checkNonDatasets or isDatasetRecord(tree))
+    isIsoFile = fields is not None
+    skipFile = not isIsoFile or not (checkNonDatasets or isDatasetRecord(fields))
     if not skipFile:
-        formats = getChildTextList(xpaths["resourceFormat"], childXPaths["formatName"], tree)
-        for fmt in formats:
-            if useFormatMapping:
-                standardFormatName = getStandardResourceFormat(fmt)
-                print(f"{standardFormatName} | {fmt}", file=sys.stdout)
-            else:
-                print(fmt, file=sys.stdout)
+        formats = fields['resourceFormats']
+        if useFormatMapping:
+            for fmt, standardFormatName in zip(formats, getStandardFormats(fields)):
+                lines.append(f"{standardFormatName} | {fmt}")
+        else:
+            lines += formats
         # Indicate that the file is missing format information
         if not formats:
-            print(f"UNDEFINED FORMAT in {filePath}", file=sys.stdout)
-
-
-
-def getDataCiteResourceType(thesaurusXPath, keywordXPath, xml_tree):
-    """ Get the first resource type keyword by searching thesaurus titles containing "Resource Type".
-        Strip whitespace and return lowercase version of string.
-    """
-    resourceType = ''
-    for thesaurus in xml_tree.xpath(thesaurusXPath, namespaces=ISO_NAMESPACES):
-        if "Resource Type" in thesaurus.text:
-            keywordElement = thesaurus.getparent().getparent().getparent().getparent()
-
-            for keyword in keywordElement.xpath(keywordXPath, namespaces=ISO_NAMESPACES):
-                if keyword.text:
-                    resourceType = keyword.text.strip().lower()
-                    # Substitute ambiguous keywords with more understandable versions.
-                    if resourceType == 'text':
-                        resourceType = 'publication'
-
-                    # Return the first match found.
-                    return resourceType
-
-    return resourceType
-
+            lines.append(f"UNDEFINED FORMAT in {filePath}")
+    return lines
 
-def isDatasetRecord(tree):
-    resourceType = getDataCiteResourceType(xpaths["resourceType"], childXPaths["keyword"], tree)
-    return resourceType.lower() == 'dataset'
 
-
-def printXPathExists(file, xpath_list, checkNonDatasets=True):
-    tree = getXMLTree(file)
-    isIsoRecord = tree is not None
-    isDataset = isIsoRecord and isDatasetRecord(tree)
+def getXPathExistsLines(file, fields, fieldNames, checkNonDatasets=True):
+    """ Return the output line reporting whether all elements named by fieldNames exist in a record. """
+    isIsoRecord = fields is not None
+    # The resource type is only extracted when non-dataset records are skipped.
+    isDataset = isIsoRecord and not checkNonDatasets and isDatasetRecord(fields)
 
     if not isIsoRecord:
         message = "not_a_iso_record"
     elif not (isDataset or checkNonDatasets):
         message = "not_a_dataset_record"
     elif isDataset or checkNonDatasets:
-        exists = True
-        for xpath in xpath_list:
-            xmlElement = tree.xpath(xpath, namespaces=ISO_NAMESPACES)
-            if not xmlElement:
-                exists = False
+        exists = all(fields[fieldName] for fieldName in fieldNames)
         if exists:
             message = "xpath_exists"
         else:
@@ -207,7 +140,24 @@ def printXPathExists(file, xpath_list, checkNonDatasets=True):
         assert False
 
     # print out the XML file name as a something that could be stripped off later.
-    print(f'{message}  {file}', file=sys.stdout)
+    return [f'{message}  {file}']
+
+
+def getCSVValue(value):
+    """ Return a column value as written to CSV output: lists as JSON arrays, and None as an empty string. """
+    if isinstance(value, list):
+        return json.dumps(value)
+    return '' if value is None else value
+
+
+def getRowsText(rows, outputFormat):
+    """ Return the output text for a list of rows, each a dictionary of column values, in CSV or JSONL format. """
+    if outputFormat == 'jsonl':
+        return ''.join(json.dumps(row) + '\n' for row in rows)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerows([getCSVValue(value) for value in row.values()] for row in rows)
+    return buffer.getvalue()
 
 
 #
@@ -219,48 +169,217 @@ parser = PrintHelpOnErrorParser(description=programHelp, formatter_class=argpars
 parser.add_argument('--inputDir', nargs=1, help="base dir for XML files")
 parser.add_argument('--file', nargs=1, help="XML file to search")
 parser.add_argument('--datasetsOnly', action='store_true', help="Limit output to records with resource type 'Dataset'")
+parser.add_argument('--jobs', nargs=1, type=int, default=[1], help="number of worker processes scanning files, default is 1")
+parser.add_argument('--ioThreads', nargs=1, type=int, default=[0], help="number of threads reading files ahead of parsing in each\n"
+                                                                        "process, for network filesystems; default is 0 (no read-ahead)")
+parser.add_argument('--engine', nargs=1, default=['tree'], choices=isofields.ENGINES,
+                    help="how records are read: 'tree' parses whole records, 'stream' reads them incrementally\n"
+                         "and stops once the reported values are found; default is 'tree'")
+parser.add_argument('--index', nargs=1, help="SQLite index file to answer the report from; it is updated first from\n"
+                                             "--inputDir, if given, and created if it does not exist")
+parser.add_argument('--output', nargs=1, default=['text'], choices=OUTPUT_FORMATS,
+                    help="output format: 'text' lines, one 'csv' or 'jsonl' row per file with a column for each\n"
+                         "report type, or a 'summary' of counts of the reported values; default is 'text'")
 parser.add_argument('--version', action='version', version="%(prog)s (" + __version__ + ")")
 
 requiredArgs = parser.add_argument_group('required arguments')
-typeChoices = ['publisher', 'resourceFormat', 'standardResourceFormat', 'geoExtent', 'timeExtent']
-requiredArgs.add_argument('--type', nargs=1, required=True, choices=typeChoices, help=f"Type of XML element")
+typeChoices = list(REPORT_FIELDS) + ['duplicateIdentifier']
+requiredArgs.add_argument('--type', nargs='+', required=True, choices=typeChoices,
+                          help=f"Type of XML element; several types can be given with --output csv, jsonl or summary")
 
 args = parser.parse_args()
+reportTypes = list(dict.fromkeys(args.type))
+
+if args.jobs[0] < 1:
+    parser.error('--jobs must be at least 1')
+if args.ioThreads[0] < 0:
+    parser.error('--ioThreads cannot be negative')
+if args.index and args.file:
+    parser.error('--index cannot be used with --file')
+if 'duplicateIdentifier' in reportTypes and not args.index:
+    parser.error('the duplicateIdentifier report needs --index')
+if 'duplicateIdentifier' in reportTypes and (len(reportTypes) > 1 or args.output[0] != 'text'):
+    parser.error('the duplicateIdentifier report is only written alone, as text')
+if len(reportTypes) > 1 and args.output[0] == 'text':
+    parser.error('several --type values need --output csv, jsonl or summary')
+if not (args.index or args.file or args.inputDir):
+    parser.error('one of --inputDir, --file or --index is required')
+if args.jobs[0] > 1 and 'fork' not in multiprocessing.get_all_start_methods():
+    parser.error('--jobs is not supported on this platform')
 
 
 ###
 ### START OF MAIN PROGRAM
 ###
 
-def performOperation(file):
-    """ Chooses which action to perform based on command-line options.
-    """
+def getFieldNames():
+    """ Return the fields the chosen reports need from each record. """
+    fieldNames = [fieldName for reportType in reportTypes for fieldName in REPORT_FIELDS[reportType]]
+    # Rows report whether each record is a dataset, and summaries count values by resource type.
+    if args.datasetsOnly or args.output[0] != 'text':
+        fieldNames.append('resourceType')
+    return list(dict.fromkeys(fieldNames))
+
+
+def getColumnNames():
+    """ Return the column names of csv and jsonl output rows. """
+    return ['file', 'parsed', 'dataset'] + reportTypes
+
+
+def getReportLines(file, fields):
+    """ Return the output lines for one file, given its extracted fields, which are None if it could not be parsed. """
     # Decide whether to limit output to dataset records only
     checkNonDatasets = not args.datasetsOnly
 
-    if args.type[0] == 'publisher':
-        printPublisher(file, checkNonDatasets)
-    elif args.type[0] == 'resourceFormat':
-        printResourceFormats(file, checkNonDatasets, useFormatMapping=False)
-    elif args.type[0] == 'standardResourceFormat':
-        printResourceFormats(file, checkNonDatasets, useFormatMapping=True)
-    elif args.type[0] == 'geoExtent':
-        printXPathExists(file, [xpaths['geoExtent']], checkNonDatasets)         # check geographical extent existence
-    elif args.type[0] == 'timeExtent':
-        printXPathExists(file, [xpaths['timeExtent']], checkNonDatasets)      # check temporal extent existence
+    lines = []
+    if fields is None:
+        lines.append(f"Unable to parse {file}")
+
+    reportType = reportTypes[0]
+    if reportType == 'publisher':
+        lines += getPublisherLines(file, fields, checkNonDatasets)
+    elif reportType == 'resourceFormat':
+        lines += getResourceFormatLines(file, fields, checkNonDatasets, useFormatMapping=False)
+    elif reportType == 'standardResourceFormat':
+        lines += getResourceFormatLines(file, fields, checkNonDatasets, useFormatMapping=True)
+    elif reportType in ('geoExtent', 'timeExtent'):
+        lines += getXPathExistsLines(file, fields, [reportType], checkNonDatasets)    # check extent existence
+    return lines
+
+
+def getReportRow(file, fields):
+    """ Return the output row for one file as a dictionary of column values, with a column for each report type,
+        or None if the file is left out because it is not a dataset record.
+    """
+    row = dict.fromkeys(getColumnNames())
+    row['file'] = file
+    row['parsed'] = fields is not None
+    if fields is None:
+        return row
+
+    # Dataset detection is done once per record, for all reports.
+    row['dataset'] = isDatasetRecord(fields)
+    if args.datasetsOnly and not row['dataset']:
+        return None
+    for reportType in reportTypes:
+        row[reportType] = getReportValue(fields, reportType)
+    return row
+
+
+def getReportValue(fields, reportType):
+    """ Return the value of one report type for a record, given its extracted fields. """
+    if reportType == 'standardResourceFormat':
+        return getStandardFormats(fields)
+    return fields[REPORT_FIELDS[reportType][0]]
+
+
+def getSummary(fileFields):
+    """ Return a FieldSummary counting the reported values of a list of (file, fields). """
+    summary = FieldSummary(reportTypes)
+    for file, fields in fileFields:
+        if fields is None:
+            summary.addUnparsed()
+        elif not args.datasetsOnly or isDatasetRecord(fields):
+            summary.add(fields['resourceType'], {reportType: getReportValue(fields, reportType)
+                                                 for reportType in reportTypes})
+    return summary
+
+
+def getOutput(fileFields):
+    """ Return the output text for a list of (file, fields), in the chosen output format, or with --output summary,
+        a FieldSummary of their values.
+    """
+    if args.output[0] == 'summary':
+        return getSummary(fileFields)
+    if args.output[0] == 'text':
+        return ''.join(line + '\n' for file, fields in fileFields for line in getReportLines(file, fields))
+    rows = [getReportRow(file, fields) for file, fields in fileFields]
+    return getRowsText([row for row in rows if row is not None], args.output[0])
+
+
+def performOperation(file, content=None):
+    """ Return the fields of one file needed by the chosen reports, or None if it cannot be parsed.
+        If content is given, it holds the file's bytes, already read.
+    """
+    return isofields.getFields(file if content is None else content, getFieldNames(), args.engine[0])
+
+
+# Threads reading files ahead of parsing, created in each process that scans files.
+_readers = None
+
+
+def performOperationOnChunk(files):
+    """ Return the output for a list of files, in order, reading each file once for all reports.  With --ioThreads,
+        the files are read concurrently, and each file is parsed as soon as it and the files before it have been read.
+    """
+    global _readers
+    if args.ioThreads[0] > 0:
+        if _readers is None:
+            _readers = ThreadPoolExecutor(max_workers=args.ioThreads[0])
+        contents = _readers.map(readFileBytes, files)
+    else:
+        contents = itertools.repeat(None)
+    return getOutput([(file, performOperation(file, content)) for file, content in zip(files, contents)])
+
+
+def getChunks(items, chunkSize):
+    """ Yield successive lists of up to chunkSize items. """
+    iterator = iter(items)
+    chunk = list(itertools.islice(iterator, chunkSize))
+    while chunk:
+        yield chunk
+        chunk = list(itertools.islice(iterator, chunkSize))
+
+
+def reportFromIndex(indexPath):
+    """ Write the report from an index, after updating the index from --inputDir if it was given. """
+    index = FieldIndex(indexPath)
+    if args.inputDir:
+        checkDirectoryExistence(args.inputDir[0], 'Input directory')
+        parsedCount, removedCount = index.update(args.inputDir[0], args.jobs[0], args.engine[0])
+        print(f'Index updated: {parsedCount} files parsed, {removedCount} files removed', file=sys.stderr)
+
+    if reportTypes == ['duplicateIdentifier']:
+        for fileIdentifier, files in index.getDuplicateIdentifiers():
+            sys.stdout.write(''.join(f'{fileIdentifier}  {file}\n' for file in files))
+    else:
+        writeOutput(map(getOutput, getChunks(index.getFields(getFieldNames()), FILES_PER_CHUNK)))
+    index.close()
+
+
+def writeOutput(outputs):
+    """ Write the outputs of successive chunks of files.  Summaries are merged, and only the total is written. """
+    if args.output[0] == 'summary':
+        summary = FieldSummary(reportTypes)
+        for chunkSummary in outputs:
+            summary.merge(chunkSummary)
+        sys.stdout.write(''.join(line + '\n' for line in summary.getLines()))
+    else:
+        for text in outputs:
+            sys.stdout.write(text)
 
-    # printXPathExists(file, [xpaths['resourceFormat']], checkNonDatasets)  # check resource format existence
-    # check spatio-temporal extent existence
-    #printXPathExists(file, [xpaths['timeExtent'], xpaths['geoExtent']], checkNonDatasets)
 
+if args.output[0] == 'csv':
+    sys.stdout.write(getRowsText([dict(zip(getColumnNames(), getColumnNames()))], 'csv'))
+
+if args.index:
+    reportFromIndex(args.index[0])
+    sys.exit(0)
 
 # readSTDIN = (args.inputDir == None)
 # if readSTDIN:
 #     tree = getXMLTree(sys.stdin)
 readFile = (args.file is not None)
 if readFile:
-    performOperation(args.file[0])
+    files = [args.file[0]]
 else:
     checkDirectoryExistence(args.inputDir[0], 'Input directory')
-    for path in Path(args.inputDir[0]).rglob('*.xml'):
-        performOperation(path.as_posix())
+    files = (path.as_posix() for path in Path(args.inputDir[0]).rglob('*.xml'))
+
+chunks = getChunks(files, FILES_PER_CHUNK)
+if args.jobs[0] > 1:
+    # Workers are forked, so they share the parsed command-line options.  imap returns results in input order.
+    with multiprocessing.get_context('fork').Pool(args.jobs[0]) as pool:
+        writeOutput(pool.imap(performOperationOnChunk, chunks))
+else:
+    writeOutput(map(performOperationOnChunk, chunks))
@@ -4,6 +4,8 @@ import requests
 import argparse
 import os
 
+import api.zenodo as zenodo
+
 PROGRAM_DESCRIPTION = '''
 
 A program for uploading files to Zenodo.  
@@ -22,7 +24,15 @@ Example usage:
 Optional arguments:
 
        --test                 Upload to Zenodo's sandbox server instead; requires a separate API TOKEN
-       --resume <bucket_url>  Resume uploading to a specific bucket URL
+       --resume [bucket_url]  Resume uploading to a specific bucket URL, or to the bucket in the upload journal.
+                              Files already in the bucket with a matching MD5 checksum are skipped.
+       --jobs <N>             Number of files uploaded at the same time.  Default: 4
+       --journal <file>       Upload journal recording the bucket URL of each upload, used by --resume.
+                              Default: <local_folder_with_files>.zenodo_journal.jsonl, next to the folder
+       --manifest <file>      Manifest of every file's size and MD5, written before uploading and reused by
+                              later runs.  Default: <local_folder_with_files>.zenodo_manifest.json
+       --hashJobs <N>         Number of files hashed at the same time.  Default: number of CPU cores
+       --hashOnly             Hash the folder, write the manifest and report duplicate files, without uploading
        --version              Print the program version and exit.
        --help                 Print the program description and exit.
 
@@ -40,7 +50,13 @@ __version__ = '-'.join(__version_info__)
 programHelp = PROGRAM_DESCRIPTION + __version__
 parser = argparse.ArgumentParser(description=programHelp)
 parser.add_argument("--test", help="Upload to Zenodo Sandbox server", action='store_const', const=True)
-parser.add_argument("--resume", nargs=1, help="Resume uploading to bucket URL", default=['None'])
+parser.add_argument("--resume", nargs='?', const='journal', default='None',
+                    help="Resume uploading to bucket URL, or to the bucket in the upload journal if no URL is given")
+parser.add_argument("--jobs", nargs=1, type=int, default=[4], help="Number of files uploaded at the same time")
+parser.add_argument("--journal", nargs=1, help="Path to the upload journal", default=['None'])
+parser.add_argument("--manifest", nargs=1, help="Path to the file checksum manifest", default=['None'])
+parser.add_argument("--hashJobs", nargs=1, type=int, help="Number of files hashed at the same time", default=[os.cpu_count()])
+parser.add_argument("--hashOnly", help="Only hash the folder and write the manifest", action='store_const', const=True)
 parser.add_argument("--iso_file", nargs=1, help="Path to ISO XML Metadata file", default=['None'])
 parser.add_argument('--version', action='version', version="%(prog)s (" + __version__ + ")")
 
@@ -51,19 +67,35 @@ args = parser.parse_args()
 
 upload_folder = args.folder[0]
 iso_file = args.iso_file[0]
-bucket_url = args.resume[0]
+bucket_url = args.resume
 TEST_UPLOAD = args.test
+jobs = args.jobs[0]
+journal_path = args.journal[0]
+if journal_path == 'None':
+    journal_path = zenodo.getJournalPath(upload_folder)
+manifest_path = args.manifest[0]
+if manifest_path == 'None':
+    manifest_path = zenodo.getManifestPath(upload_folder)
 
 # Check validity of upload path, iso_file path
 assert(os.path.isdir(upload_folder))
 
 if iso_file != 'None':
     assert(os.path.isfile(iso_file))
+assert(jobs >= 1)
+assert(args.hashJobs[0] >= 1)
 
 if TEST_UPLOAD:
-    upload_url = 'https://sandbox.zenodo.org/api/deposit/depositions'
+    upload_url = zenodo.ZENODO_SANDBOX_URL
 else:
-    upload_url = 'https://zenodo.org/api/deposit/depositions'
+    upload_url = zenodo.ZENODO_URL
+
+# Take the bucket URL from the upload journal when resuming without one.
+if bucket_url == 'journal':
+    bucket_url = zenodo.readJournal(journal_path)
+    if bucket_url is None:
+        print(f'\n  ERROR: no bucket URL found in upload journal {journal_path}.  Aborting...', file=sys.stderr)
+        exit(2)
 
 #
 # Get the environment variable 'ZENODO_TOKEN'
@@ -75,6 +107,8 @@ params = {'access_token': api_token}
 print(f'upload_url == {upload_url}')
 print(f'TEST_UPLOAD == {TEST_UPLOAD}')
 print(f'bucket_url == {bucket_url}')
+print(f'journal_path == "{journal_path}"')
+print(f'manifest_path == "{manifest_path}"')
 print(f'api_token == "{api_token}"')
 print(f'upload_folder == "{upload_folder}"\n\n')
 
@@ -98,6 +132,16 @@ if len(file_names) != len(set(file_names)):
     print('\n  ERROR: file names are not unique.  Aborting...', file=sys.stderr)
     exit(2)
 
+#
+#  Hash every file once, in parallel, and report the total size and files with identical contents.
+#
+manifest = zenodo.hashFolder(file_info, manifest_path, args.hashJobs[0])
+print(f'\nTotal size: {manifest["totalSize"]} bytes in {len(file_info)} files')
+for duplicate_names in manifest['duplicates']:
+    print(f'  WARNING: files with identical contents: {", ".join(duplicate_names)}', file=sys.stderr)
+
+if args.hashOnly:
+    exit(0)
 
 #
 #  Create a new dataset on Zenodo if no bucket URL is provided.
@@ -112,19 +156,40 @@ if bucket_url == 'None':
         exit(r.status_code)
 
     bucket_url = r.json()["links"]["bucket"]
+    zenodo.startJournal(journal_path, bucket_url)
 
 print(f'\n\n  UPLOAD BUCKET_URL = {bucket_url}\n\n')
 
+session = zenodo.getZenodoSession(api_token, poolSize=jobs)
+
+#
+#  When resuming, skip files already in the bucket with a matching checksum.
+#
+if args.resume != 'None':
+    remote_checksums = zenodo.getBucketChecksums(session, bucket_url)
+    file_info, skipped_files = zenodo.getFilesToUpload(file_info, manifest['files'], remote_checksums)
+    print(f'Skipping {len(skipped_files)} files already uploaded.\n')
+
+#
+#  Upload files, several at a time.
+#
+failed_files = []
+for (file_name, uploaded, error_message) in zenodo.uploadFiles(session, bucket_url, file_info, manifest['files'], jobs):
+    if error_message:
+        print(f'{file_name}:  FAILED: {error_message}', file=sys.stderr)
+        failed_files.append(file_name)
+        continue
+    print(f'{file_name}:  checksum={uploaded["checksum"]}, size={uploaded["size"]}')
+
+if failed_files:
+    print(f'\n  {len(failed_files)} files failed to upload; rerun with --resume to upload them.', file=sys.stderr)
+    exit(1)
+
 #
-#  Upload files.
+#  Verify the bucket's checksums against the manifest.
 #
-for (file_name, file_path) in file_info:
-    with open(file_path, "rb") as fp:
-        r = requests.put(
-            "%s/%s" % (bucket_url, file_name),
-            data=fp,
-            params=params,
-        )
-        checksum = r.json()['checksum']
-        size =  r.json()['size']
-        print(f'{file_name}:  checksum={checksum}, size={size}')
\ No newline at end of file
+mismatched_files = zenodo.verifyBucket(manifest, zenodo.getBucketChecksums(session, bucket_url))
+if mismatched_files:
+    print(f'\n  ERROR: bucket checksums differ from the manifest for: {", ".join(mismatched_files)}', file=sys.stderr)
+    exit(1)
+print('\nAll bucket checksums match the manifest.')
\ No newline at end of file